@@ -0,0 +1,145 @@
+"""Generador reproducible de bases de datos sintéticas de clientes
+
+    python -m benchmarks.generar_datos benchmarks/datos/clientes_100k.db --clientes 100000
+
+La misma semilla produce siempre los mismos clientes: nombres de empresa y
+de contacto en español (con tildes y eñes), correos únicos y teléfonos en
+formatos variados, repartidos entre ``--categorias`` categorías.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import unicodedata
+
+from conexion import abrir_conexion
+from migraciones import preparar_base_datos
+from normalizacion import columnas_normalizadas, normalizar
+
+
+NOMBRES = [
+    "Juan", "María", "José", "Lucía", "Martín", "Sofía", "Nicolás", "Valentina",
+    "Joaquín", "Camila", "Tomás", "Agustina", "Matías", "Florencia", "Sebastián",
+    "Julieta", "Ramón", "Inés", "Andrés", "Mónica", "Íñigo", "Belén", "Germán", "Noemí",
+]
+APELLIDOS = [
+    "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez",
+    "Pérez", "Gómez", "Díaz", "Muñoz", "Núñez", "Ibáñez", "Álvarez", "Romero",
+    "Suárez", "Peña", "Ordóñez", "Castaño", "Benítez", "Giménez", "Acuña", "Ortiz",
+]
+RUBROS = [
+    "Distribuidora", "Comercial", "Talleres", "Ferretería", "Autopartes", "Lubricentro",
+    "Transportes", "Repuestos", "Neumáticos", "Electricidad del Automotor", "Agropecuaria",
+]
+SOCIEDADES = ["S.A.", "S.R.L.", "S.A.S.", "e Hijos", "Hnos.", ""]
+CIUDADES = ["Rosario", "Córdoba", "Mendoza", "Paraná", "Santa Fe", "Neuquén", "Tucumán"]
+DOMINIOS = ["gmail.com", "hotmail.com", "yahoo.com.ar", "outlook.com", "empresa.com.ar"]
+CATEGORIAS_BASE = [
+    "Talleres", "Concesionarios", "Flotas", "Mayoristas", "Minoristas", "Agro",
+    "Transporte", "Gobierno", "Seguros", "Proveedores",
+]
+
+TAMANO_LOTE = 10000
+INSERTAR_CLIENTE = (
+    "INSERT INTO clientes (nombre, correo, telefono, contacto, categoria_id, "
+    "texto_normalizado, nombre_orden, contacto_orden) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def ascii_minusculas(texto):
+    """"Muñoz Peña" -> "munozpena" para construir correos"""
+    sin_tildes = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return "".join(c for c in sin_tildes.lower() if c.isalnum())
+
+
+def telefono_aleatorio(azar):
+    """Teléfono en uno de varios formatos habituales en las exportaciones"""
+    area = azar.choice(["341", "351", "261", "343", "342", "11"])
+    numero = f"{azar.randrange(1000000, 9999999)}"
+    formato = azar.randrange(4)
+    if formato == 0:
+        return f"+54 9 {area} {numero[:3]}-{numero[3:]}"
+    if formato == 1:
+        return f"({area}) {numero[:3]}-{numero[3:]}"
+    if formato == 2:
+        return f"0{area}15{numero}"
+    return f"{area}{numero}"
+
+
+def nombres_categorias(cantidad):
+    """Categoría 1 es la por defecto; el resto se toma de la lista y se numera si falta"""
+    nombres = []
+    for i in range(cantidad - 1):
+        base = CATEGORIAS_BASE[i % len(CATEGORIAS_BASE)]
+        nombres.append(base if i < len(CATEGORIAS_BASE) else f"{base} {i // len(CATEGORIAS_BASE) + 1}")
+    return nombres
+
+
+def generar_clientes(cantidad, categoria_ids, semilla=0):
+    """Generar tuplas (nombre, correo, telefono, contacto, categoria_id, *columnas_normalizadas)"""
+    azar = random.Random(semilla)
+    for i in range(cantidad):
+        nombre_contacto = azar.choice(NOMBRES)
+        apellido = azar.choice(APELLIDOS)
+        rubro = azar.choice(RUBROS)
+        if azar.random() < 0.5:
+            empresa = f"{rubro} {apellido} {azar.choice(SOCIEDADES)}".strip()
+        else:
+            empresa = f"{rubro} {azar.choice(CIUDADES)} {azar.choice(SOCIEDADES)}".strip()
+        usuario = f"{ascii_minusculas(nombre_contacto)}.{ascii_minusculas(apellido)}{i}"
+        correo = f"{usuario}@{azar.choice(DOMINIOS)}"
+        contacto = f"{nombre_contacto} {azar.choice(APELLIDOS)}"
+        # Distribución desigual: las primeras categorías concentran más clientes
+        categoria_id = categoria_ids[min(int(azar.expovariate(1.5) * len(categoria_ids) / 3),
+                                         len(categoria_ids) - 1)]
+        telefono = telefono_aleatorio(azar)
+        yield (empresa, correo, telefono, contacto, categoria_id,
+               *columnas_normalizadas(empresa, contacto, correo, telefono))
+
+
+def generar_base_datos(ruta, clientes, categorias=10, semilla=0):
+    """Crear ``ruta`` desde cero con el esquema actual y los datos sintéticos"""
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+    conn = abrir_conexion(ruta)
+    try:
+        preparar_base_datos(conn)
+        conn.executemany("INSERT INTO categorias (nombre, nombre_normalizado) VALUES (?, ?)",
+                         [(nombre, normalizar(nombre)) for nombre in nombres_categorias(categorias)])
+        categoria_ids = [fila[0] for fila in conn.execute("SELECT id FROM categorias ORDER BY id")]
+        lote = []
+        for cliente in generar_clientes(clientes, categoria_ids, semilla):
+            lote.append(cliente)
+            if len(lote) >= TAMANO_LOTE:
+                conn.executemany(INSERTAR_CLIENTE, lote)
+                lote = []
+        if lote:
+            conn.executemany(INSERTAR_CLIENTE, lote)
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generar una base de datos sintética de clientes")
+    parser.add_argument('ruta', help="Archivo SQLite a crear (se sobrescribe)")
+    parser.add_argument('--clientes', type=int, default=10000)
+    parser.add_argument('--categorias', type=int, default=10)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    directorio = os.path.dirname(args.ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+    generar_base_datos(args.ruta, args.clientes, args.categorias, args.semilla)
+    print(f"{args.clientes} clientes generados en {time.perf_counter() - inicio:.1f} s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
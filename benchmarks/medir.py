@@ -0,0 +1,285 @@
+"""Medición de latencia y memoria de las operaciones sobre clientes
+
+    python -m benchmarks.medir --tamanos 10000 100000 1000000
+    xvfb-run python -m benchmarks.medir --gui --comparar benchmarks/resultados/anterior.json
+
+Cada tamaño se mide en un proceso aparte, sobre una copia de la base de
+datos sintética (que se genera la primera vez en ``benchmarks/datos``), para
+que el pico de memoria (RSS) sea el de ese tamaño y las operaciones que
+escriben no alteren la base original. El resultado es un JSON con p50/p95
+por operación que puede compararse con el de otro commit mediante
+``--comparar``.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+
+from benchmarks.generar_datos import generar_base_datos
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_DATOS = os.path.join(DIRECTORIO, 'datos')
+DIRECTORIO_RESULTADOS = os.path.join(DIRECTORIO, 'resultados')
+
+TAMANOS = (10000, 100000, 1000000)
+BUSQUEDAS = {
+    'buscar_todo': ('', ''),
+    'buscar_corto': ('ga', ''),
+    'buscar_texto': ('garc', ''),
+    'buscar_categoria': ('', 'tall'),
+    'buscar_texto_y_categoria': ('rosario', 'flot'),
+}
+
+
+def percentil(valores, fraccion):
+    """Percentil por el método del rango más cercano"""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(fraccion * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def medir(funcion, repeticiones, preparar=None):
+    """Tiempos en milisegundos de ``repeticiones`` llamadas a ``funcion``
+
+    ``preparar(i)`` se ejecuta antes de cada llamada sin contar en el tiempo
+    y su resultado se pasa a ``funcion``.
+    """
+    tiempos = []
+    for i in range(repeticiones):
+        argumentos = (preparar(i),) if preparar else ()
+        inicio = time.perf_counter()
+        funcion(*argumentos)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def resumen(operacion, modo, clientes, tiempos):
+    return {
+        'operacion': operacion,
+        'modo': modo,
+        'clientes': clientes,
+        'repeticiones': len(tiempos),
+        'p50_ms': round(percentil(tiempos, 0.50), 3),
+        'p95_ms': round(percentil(tiempos, 0.95), 3),
+        'max_ms': round(max(tiempos), 3),
+    }
+
+
+def rss_maximo_kb():
+    """Pico de memoria residente del proceso, o None si la plataforma no lo da"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS lo devuelve en bytes, Linux en KiB
+    return maximo // 1024 if sys.platform == 'darwin' else maximo
+
+
+def ruta_datos(clientes, categorias, semilla):
+    return os.path.join(DIRECTORIO_DATOS, f"clientes_{clientes}_{categorias}_{semilla}.db")
+
+
+def medir_headless(repositorio, clientes, repeticiones):
+    """Operaciones de la aplicación a través de ClientRepository"""
+    resultados = []
+    for operacion, terminos in BUSQUEDAS.items():
+        tiempos = medir(lambda: repositorio.buscar(*terminos), repeticiones)
+        resultados.append(resumen(operacion, 'headless', clientes, tiempos))
+
+    filtro = repositorio.filtro()
+    medio = clientes // 2
+    tiempos = medir(lambda: repositorio.pagina(filtro, 200, despues_de_id=medio), repeticiones)
+    resultados.append(resumen('pagina_siguiente', 'headless', clientes, tiempos))
+    tiempos = medir(lambda: repositorio.pagina(filtro, 200, posicion=medio), repeticiones)
+    resultados.append(resumen('pagina_salto', 'headless', clientes, tiempos))
+    orden = (('categoria', False), ('nombre', True))
+    tiempos = medir(lambda: repositorio.pagina(filtro, 200, despues_de_id=medio, orden=orden),
+                    repeticiones)
+    resultados.append(resumen('pagina_siguiente_ordenada', 'headless', clientes, tiempos))
+    tiempos = medir(lambda: repositorio.pagina(filtro, 200, posicion=medio, orden=orden), repeticiones)
+    resultados.append(resumen('pagina_salto_ordenada', 'headless', clientes, tiempos))
+
+    tiempos = medir(
+        lambda i: repositorio.agregar_cliente(
+            f"Benchmark {i}", f"benchmark{i}@ejemplo.com", "341 000-0000", "Benchmark", "Clientes"),
+        repeticiones, preparar=lambda i: i)
+    resultados.append(resumen('agregar_cliente', 'headless', clientes, tiempos))
+
+    mayor = repositorio.conn.execute("""
+        SELECT cat.nombre FROM clientes c JOIN categorias cat ON c.categoria_id = cat.id
+        GROUP BY cat.id ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()[0]
+    tiempos = medir(lambda: repositorio.correos_categoria(mayor), repeticiones)
+    resultados.append(resumen('correos_categoria', 'headless', clientes, tiempos))
+
+    def preparar_eliminacion(i):
+        # Categoría nueva con el 1 % de los clientes, fuera de la medición
+        nombre = f"Benchmark {i}"
+        categoria_id = repositorio.agregar_categoria(nombre)
+        repositorio.conn.execute(
+            "UPDATE clientes SET categoria_id = ? WHERE id % 100 = ?", (categoria_id, i % 100))
+        repositorio.conn.commit()
+        return nombre
+
+    tiempos = medir(repositorio.eliminar_categoria, repeticiones, preparar=preparar_eliminacion)
+    resultados.append(resumen('eliminar_categoria', 'headless', clientes, tiempos))
+    return resultados
+
+
+def medir_gui(ruta, clientes, repeticiones):
+    """Pintado de resultados en el Treeview (requiere pantalla, p. ej. xvfb-run)"""
+    import tkinter as tk
+    from cartronic_database import ClientDatabaseApp
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Medición de la interfaz omitida: {e}", file=sys.stderr)
+        return []
+
+    resultados = []
+    try:
+        app = ClientDatabaseApp(root, ruta)
+        root.update()
+        for operacion, terminos in BUSQUEDAS.items():
+            resultado = app.repositorio.buscar(*terminos, seleccion_id=app.seleccion_id)
+
+            def pintar(_):
+                app.mostrar_resultados(resultado)
+                root.update_idletasks()
+
+            # Tabla vacía antes de cada pintado: coste de poblarla desde cero
+            def vaciar(i):
+                app.pintar_filas([])
+                app.tabla_virtual.desactivar()
+                root.update_idletasks()
+
+            tiempos = medir(pintar, repeticiones, preparar=vaciar)
+            resultados.append(resumen(operacion, 'gui', clientes, tiempos))
+
+            # Repetir el mismo resultado: sólo cuesta la reconciliación
+            tiempos = medir(lambda: (app.mostrar_resultados(resultado), root.update_idletasks()),
+                            repeticiones)
+            resultados.append(resumen(operacion + '_repintado', 'gui', clientes, tiempos))
+        app.programador_busqueda.detener()
+    finally:
+        root.destroy()
+    return resultados
+
+
+def medir_tamano(clientes, categorias, semilla, repeticiones, gui):
+    """Medir un tamaño concreto (se ejecuta en su propio proceso)"""
+    from repositorio import ClientRepository
+
+    origen = ruta_datos(clientes, categorias, semilla)
+    if not os.path.exists(origen):
+        os.makedirs(DIRECTORIO_DATOS, exist_ok=True)
+        print(f"Generando {clientes} clientes en {origen}...", file=sys.stderr)
+        generar_base_datos(origen, clientes, categorias, semilla)
+
+    trabajo = origen.replace('.db', '.trabajo.db')
+    shutil.copyfile(origen, trabajo)
+    try:
+        repositorio = ClientRepository.abrir(trabajo)
+        try:
+            resultados = medir_headless(repositorio, clientes, repeticiones)
+        finally:
+            repositorio.cerrar()
+        if gui:
+            shutil.copyfile(origen, trabajo)
+            resultados += medir_gui(trabajo, clientes, repeticiones)
+    finally:
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(trabajo + sufijo):
+                os.remove(trabajo + sufijo)
+    return {'resultados': resultados, 'rss_max_kb': rss_maximo_kb()}
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=DIRECTORIO).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior):
+    """Imprimir la variación del p50 de cada operación respecto a otra ejecución"""
+    previos = {(r['operacion'], r['modo'], r['clientes']): r for r in anterior['resultados']}
+    print(f"Comparación con {anterior.get('commit') or 'ejecución anterior'}:")
+    for r in actual['resultados']:
+        previo = previos.get((r['operacion'], r['modo'], r['clientes']))
+        if previo is None:
+            continue
+        variacion = (r['p50_ms'] - previo['p50_ms']) / previo['p50_ms'] * 100 if previo['p50_ms'] else 0
+        print(f"  {r['clientes']:>8} {r['modo']:<8} {r['operacion']:<32} "
+              f"{previo['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f} ms ({variacion:+.0f} %)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Medir las operaciones sobre clientes")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=list(TAMANOS))
+    parser.add_argument('--categorias', type=int, default=10)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--gui', action='store_true',
+                        help="Medir también el Treeview (necesita pantalla, p. ej. xvfb-run)")
+    parser.add_argument('--salida', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', help="JSON de otra ejecución para comparar")
+    parser.add_argument('--interno', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.interno:
+        datos = medir_tamano(args.interno, args.categorias, args.semilla, args.repeticiones, args.gui)
+        json.dump(datos, sys.stdout)
+        return
+
+    informe = {
+        'commit': commit_actual(),
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'categorias': args.categorias,
+        'semilla': args.semilla,
+        'resultados': [],
+        'rss_max_kb': {},
+    }
+    for clientes in args.tamanos:
+        comando = [sys.executable, '-m', 'benchmarks.medir', '--interno', str(clientes),
+                   '--categorias', str(args.categorias), '--semilla', str(args.semilla),
+                   '--repeticiones', str(args.repeticiones)]
+        if args.gui:
+            comando.append('--gui')
+        salida = subprocess.run(comando, capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(DIRECTORIO))
+        sys.stderr.write(salida.stderr)
+        datos = json.loads(salida.stdout)
+        informe['resultados'].extend(datos['resultados'])
+        informe['rss_max_kb'][str(clientes)] = datos['rss_max_kb']
+        for r in datos['resultados']:
+            print(f"{clientes:>8} {r['modo']:<8} {r['operacion']:<32} "
+                  f"p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms", file=sys.stderr)
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS, f"{informe['commit'] or informe['fecha'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as archivo:
+        json.dump(informe, archivo, ensure_ascii=False, indent=2)
+    print(f"Resultados en {salida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            comparar(informe, json.load(archivo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,533 @@
+import json
+import queue
+import sqlite3
+import threading
+from collections import namedtuple
+
+from conexion import abrir_conexion
+from normalizacion import normalizar, similitud, trigramas
+
+
+SELECCION_CLIENTES = """
+    SELECT c.id, c.nombre, c.contacto, c.telefono, c.correo, cat.nombre
+"""
+
+# Columna añadida con ``seleccion_id``: si el cliente está en esa selección
+COLUMNA_MARCA = """,
+        EXISTS (SELECT 1 FROM selecciones_clientes s
+                WHERE s.seleccion_id = ? AND s.cliente_id = c.id)
+"""
+
+ORIGEN_CLIENTES = """
+    FROM clientes c
+    JOIN categorias cat ON c.categoria_id = cat.id
+"""
+
+ORIGEN_CLIENTES_FTS = """
+    FROM clientes_fts f
+    JOIN clientes c ON c.id = f.rowid
+    JOIN categorias cat ON c.categoria_id = cat.id
+"""
+
+# El tokenizador trigram no puede buscar términos de menos de 3 caracteres
+LONGITUD_MINIMA_FTS = 3
+
+# Resultados mayores se muestran en modo virtual, paginados por clave
+LIMITE_CARGA_COMPLETA = 1000
+TAMANO_PAGINA = 200
+
+# Columnas por las que se puede ordenar el resultado -> expresiones SQL. Los
+# textos se ordenan por sus claves normalizadas (sin tildes ni mayúsculas) y
+# cada una tiene un índice (migración 9), así que ORDER BY recorre el índice
+# en lugar de ordenar todo el resultado. La categoría se ordena recorriendo
+# categorias por nombre normalizado y, dentro de cada una, sus clientes por
+# id; cat.id desempata dos nombres que se normalizan igual ("Óptica" y
+# "optica") sin que SQLite tenga que reordenar los clientes de cada categoría
+COLUMNAS_ORDEN = {
+    'nombre': ("c.nombre_orden",),
+    'contacto': ("c.contacto_orden",),
+    'telefono': ("c.telefono",),
+    'correo': ("c.correo",),
+    'categoria': ("cat.nombre_normalizado", "cat.id"),
+}
+
+# Máximo de parámetros por consulta en versiones antiguas de SQLite
+MAXIMO_PARAMETROS = 900
+
+# Búsqueda aproximada: candidatos leídos, candidatos que se comparan con
+# Levenshtein (los que más trigramas comparten) y parecido mínimo para mostrarlos
+CANDIDATOS_DIFUSOS = 2000
+CANDIDATOS_PUNTUADOS = 300
+SIMILITUD_MINIMA = 0.6
+
+
+class ResultadoBusqueda(namedtuple(
+        'ResultadoBusqueda', ['termino_nombre', 'termino_categoria', 'filas', 'total', 'difusa', 'orden'],
+        defaults=(False, ()))):
+    """Resultado de una búsqueda; ``total`` es None si ``filas`` está completo
+
+    Con ``difusa`` las filas vienen ordenadas de más a menos parecidas, salvo
+    que se pida un ``orden`` (ver ``clausula_orden``).
+    """
+    __slots__ = ()
+
+
+class Filtro(namedtuple('Filtro', ['origen', 'condiciones', 'params', 'usa_fts'])):
+    """Cláusulas FROM/WHERE de una búsqueda de clientes"""
+    __slots__ = ()
+
+    def sql(self, *condiciones_extra):
+        """Componer FROM ... WHERE con condiciones adicionales"""
+        condiciones = list(self.condiciones) + list(condiciones_extra)
+        if not condiciones:
+            return self.origen
+        return self.origen + " WHERE " + " AND ".join(condiciones)
+
+
+def fts_disponible(conn):
+    """Comprobar si el índice FTS5 de clientes existe y se puede consultar"""
+    try:
+        conn.execute("SELECT 1 FROM clientes_fts LIMIT 0")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def expresion_fts(termino):
+    """Convertir un término libre en una frase FTS5 literal"""
+    return '"' + termino.replace('"', '""') + '"'
+
+
+def construir_filtro(termino_nombre, termino_categoria, usar_fts=False):
+    """Traducir los términos de búsqueda a un Filtro
+
+    Los términos se normalizan igual que las columnas ``texto_normalizado`` y
+    ``nombre_normalizado``, así que no se distinguen mayúsculas ni tildes. Con
+    ``usar_fts`` el término se resuelve con MATCH sobre ``clientes_fts``; si
+    no, o si el término es demasiado corto, con LIKE. Los términos vacíos no
+    añaden condición.
+    """
+    termino_nombre = normalizar(termino_nombre)
+    termino_categoria = normalizar(termino_categoria)
+    condiciones, params = [], []
+    origen = ORIGEN_CLIENTES
+    usa_fts = False
+    if usar_fts and len(termino_nombre) >= LONGITUD_MINIMA_FTS:
+        origen = ORIGEN_CLIENTES_FTS
+        usa_fts = True
+        condiciones.append("clientes_fts MATCH ?")
+        params.append(expresion_fts(termino_nombre))
+    elif termino_nombre:
+        condiciones.append("c.texto_normalizado LIKE ?")
+        params.append(f"%{termino_nombre}%")
+    if termino_categoria:
+        condiciones.append("cat.nombre_normalizado LIKE ?")
+        params.append(f"%{termino_categoria}%")
+    return Filtro(origen, tuple(condiciones), tuple(params), usa_fts)
+
+
+def filtro_categoria(nombre_categoria):
+    """Filtro con todos los clientes de una categoría concreta"""
+    return Filtro(ORIGEN_CLIENTES, ("cat.nombre = ?",), (nombre_categoria,), False)
+
+
+def filtro_ids(cliente_ids):
+    """Filtro con una lista fija de clientes, pasada como un único parámetro JSON"""
+    return Filtro(ORIGEN_CLIENTES, ("c.id IN (SELECT value FROM json_each(?))",),
+                  (json.dumps(list(cliente_ids)),), False)
+
+
+def filtro_seleccion(seleccion_id):
+    """Filtro con todos los clientes de una selección guardada"""
+    return Filtro(ORIGEN_CLIENTES, (
+        "EXISTS (SELECT 1 FROM selecciones_clientes s "
+        "WHERE s.seleccion_id = ? AND s.cliente_id = c.id)",), (seleccion_id,), False)
+
+
+def claves_orden(orden):
+    """Pares (expresión SQL, descendente) de ``orden``, desempatados por c.id
+
+    ``orden`` es una secuencia de pares (columna de ``COLUMNAS_ORDEN``,
+    descendente); el id final va en el sentido de la última columna para que
+    un orden de una sola columna coincida con su índice.
+    """
+    claves = []
+    for columna, descendente in orden:
+        if columna not in COLUMNAS_ORDEN:
+            raise ValueError(f"No se puede ordenar por '{columna}'")
+        claves.extend((expresion, bool(descendente)) for expresion in COLUMNAS_ORDEN[columna])
+    return claves + [("c.id", claves[-1][1] if claves else False)]
+
+
+def interpretar_orden(texto):
+    """Orden escrito como "categoria,-nombre" ("-" = descendente) en pares"""
+    orden = []
+    for parte in texto.split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        columna = parte.lstrip('-')
+        if columna not in COLUMNAS_ORDEN:
+            raise ValueError(f"No se puede ordenar por '{columna}': use "
+                             + ", ".join(COLUMNAS_ORDEN))
+        orden.append((columna, parte.startswith('-')))
+    return tuple(orden)
+
+
+def clausula_orden(orden, invertir=False):
+    """ORDER BY para ``orden``; con ``invertir``, en sentido contrario"""
+    return " ORDER BY " + ", ".join(
+        f"{expresion} {'DESC' if descendente != invertir else 'ASC'}"
+        for expresion, descendente in claves_orden(orden))
+
+
+def condicion_clave(orden, valores, invertir=False):
+    """Condición "fila posterior a ``valores`` en ``orden``" y sus parámetros
+
+    ``valores`` son los de las expresiones de ``claves_orden`` para la fila
+    de referencia. La comparación se expande columna a columna porque cada
+    una puede ir en un sentido distinto; la primera se repite como rango
+    (``>=`` / ``<=``) para que SQLite pueda saltar por el índice.
+    """
+    claves = claves_orden(orden)
+    operadores = ['<' if descendente != invertir else '>' for _, descendente in claves]
+    alternativas, params = [], []
+    for i, (expresion, _) in enumerate(claves):
+        iguales = [f"{anterior} = ?" for anterior, _ in claves[:i]]
+        alternativas.append("(" + " AND ".join(iguales + [f"{expresion} {operadores[i]} ?"]) + ")")
+        params.extend(valores[:i + 1])
+    condicion = f"{claves[0][0]} {operadores[0]}= ? AND ({' OR '.join(alternativas)})"
+    return condicion, [valores[0], *params]
+
+
+def seleccion_clientes(seleccion_id=None):
+    """SELECT de las columnas de la tabla y sus parámetros
+
+    Con ``seleccion_id`` cada fila lleva una séptima columna, 1 si el cliente
+    está en esa selección y 0 si no, leída en la misma consulta.
+    """
+    if seleccion_id is None:
+        return SELECCION_CLIENTES, ()
+    return SELECCION_CLIENTES.rstrip() + COLUMNA_MARCA, (seleccion_id,)
+
+
+def consultar_clientes(conn, filtro, limite=None, orden=(), seleccion_id=None):
+    """Ejecutar la búsqueda completa, en ``orden`` o por bm25 cuando usa FTS5"""
+    seleccion, params = seleccion_clientes(seleccion_id)
+    query = seleccion + filtro.sql()
+    params = [*params, *filtro.params]
+    if orden:
+        query += clausula_orden(orden)
+    elif filtro.usa_fts:
+        query += " ORDER BY bm25(clientes_fts)"
+    if limite is not None:
+        query += " LIMIT ?"
+        params.append(limite)
+    return conn.execute(query, params).fetchall()
+
+
+def contar_clientes(conn, filtro):
+    """Contar los clientes que cumplen el filtro"""
+    return conn.execute("SELECT COUNT(*) " + filtro.sql(), filtro.params).fetchone()[0]
+
+
+def consultar_cliente(conn, filtro, cliente_id):
+    """Leer un cliente concreto si cumple el filtro; None en caso contrario"""
+    query = SELECCION_CLIENTES + filtro.sql("c.id = ?")
+    return conn.execute(query, (*filtro.params, cliente_id)).fetchone()
+
+
+def consultar_clientes_por_id(conn, filtro, cliente_ids, seleccion_id=None):
+    """Leer, por bloques de ids, los clientes indicados que cumplen el filtro"""
+    seleccion, params = seleccion_clientes(seleccion_id)
+    filas = []
+    cliente_ids = list(cliente_ids)
+    for i in range(0, len(cliente_ids), MAXIMO_PARAMETROS):
+        parte = cliente_ids[i:i + MAXIMO_PARAMETROS]
+        marcadores = ", ".join("?" * len(parte))
+        query = seleccion + filtro.sql(f"c.id IN ({marcadores})")
+        filas.extend(conn.execute(query, (*params, *filtro.params, *parte)).fetchall())
+    return filas
+
+
+def consultar_pagina(conn, filtro, limite, despues_de_id=None, antes_de_id=None, posicion=0,
+                     orden=(), seleccion_id=None):
+    """Leer una página ordenada por c.id o, si se indica, por ``orden``
+
+    Con ``despues_de_id`` o ``antes_de_id`` se pagina por clave (``c.id > ?`` /
+    ``c.id < ?``); sin ninguno se salta directamente a ``posicion``, lo que
+    sólo ocurre al arrastrar la barra de desplazamiento. Con ``seleccion_id``
+    cada fila indica además si está en esa selección (ver ``seleccion_clientes``).
+    """
+    if orden:
+        return _consultar_pagina_ordenada(conn, filtro, limite, despues_de_id, antes_de_id,
+                                          posicion, orden, seleccion_id)
+    seleccion, params = seleccion_clientes(seleccion_id)
+    params = [*params, *filtro.params]
+    if despues_de_id is not None:
+        query = seleccion + filtro.sql("c.id > ?") + " ORDER BY c.id LIMIT ?"
+        params.extend([despues_de_id, limite])
+    elif antes_de_id is not None:
+        query = seleccion + filtro.sql("c.id < ?") + " ORDER BY c.id DESC LIMIT ?"
+        params.extend([antes_de_id, limite])
+        return conn.execute(query, params).fetchall()[::-1]
+    else:
+        query = seleccion + filtro.sql() + " ORDER BY c.id LIMIT ? OFFSET ?"
+        params.extend([limite, posicion])
+    return conn.execute(query, params).fetchall()
+
+
+def _usa_categorias(filtro, orden):
+    """Si el filtro o el orden necesitan la tabla categorias"""
+    return (filtro.origen != ORIGEN_CLIENTES
+            or any("cat." in condicion for condicion in filtro.condiciones)
+            or any(expresion.startswith("cat.") for columna, _ in orden
+                   for expresion in COLUMNAS_ORDEN.get(columna, ())))
+
+
+def _consultar_pagina_ordenada(conn, filtro, limite, despues_de_id, antes_de_id, posicion, orden,
+                               seleccion_id=None):
+    """``consultar_pagina`` con ORDER BY por columnas
+
+    La clave de la fila de referencia (sus valores en cada columna del
+    orden) se lee primero por id; si esa fila ya no existe se devuelve una
+    página vacía y la tabla virtual se reposiciona al recargar.
+    """
+    referencia = despues_de_id if despues_de_id is not None else antes_de_id
+    if referencia is None and posicion and not _usa_categorias(filtro, orden):
+        # Salto: OFFSET sobre el índice del orden sin leer las categorías de
+        # cada fila saltada; desde la fila anterior se sigue por clave
+        query = ("SELECT c.id FROM clientes c" + filtro._replace(origen=" ").sql()
+                 + clausula_orden(orden) + " LIMIT 1 OFFSET ?")
+        fila = conn.execute(query, (*filtro.params, posicion - 1)).fetchone()
+        if fila is None:
+            return []
+        referencia = despues_de_id = fila[0]
+    seleccion, marca = seleccion_clientes(seleccion_id)
+    if referencia is None:
+        query = seleccion + filtro.sql() + clausula_orden(orden) + " LIMIT ? OFFSET ?"
+        return conn.execute(query, (*marca, *filtro.params, limite, posicion)).fetchall()
+
+    expresiones = ", ".join(expresion for expresion, _ in claves_orden(orden))
+    valores = conn.execute(f"SELECT {expresiones}" + ORIGEN_CLIENTES + " WHERE c.id = ?",
+                           (referencia,)).fetchone()
+    if valores is None:
+        return []
+    invertir = despues_de_id is None
+    condicion, params = condicion_clave(orden, valores, invertir)
+    query = seleccion + filtro.sql(condicion) + clausula_orden(orden, invertir) + " LIMIT ?"
+    filas = conn.execute(query, (*marca, *filtro.params, *params, limite)).fetchall()
+    return filas[::-1] if invertir else filas
+
+
+def buscar_difuso(conn, termino_nombre, termino_categoria, usar_fts=False,
+                  limite=LIMITE_CARGA_COMPLETA, seleccion_id=None):
+    """Clientes parecidos al término aunque tenga errores, del más al menos parecido
+
+    Con FTS5 los candidatos son los que comparten algún trigrama con el
+    término (los ``CANDIDATOS_DIFUSOS`` mejores según bm25); sin FTS5, todos
+    los de la categoría. De ellos sólo los ``CANDIDATOS_PUNTUADOS`` con más
+    trigramas en común se comparan con Levenshtein, en Python, sobre
+    ``texto_normalizado`` (ya guardado sin tildes).
+    """
+    termino = normalizar(termino_nombre)
+    filtro = construir_filtro('', termino_categoria, usar_fts)
+    params = list(filtro.params)
+    if usar_fts and len(termino) >= LONGITUD_MINIMA_FTS:
+        expresion = " OR ".join(expresion_fts(trigrama) for trigrama in sorted(trigramas(termino)))
+        filtro = Filtro(ORIGEN_CLIENTES_FTS, ("clientes_fts MATCH ?",) + filtro.condiciones,
+                        (expresion,) + filtro.params, True)
+        query = ("SELECT c.id, c.texto_normalizado " + filtro.sql()
+                 + " ORDER BY bm25(clientes_fts) LIMIT ?")
+        params = [*filtro.params, CANDIDATOS_DIFUSOS]
+    else:
+        query = "SELECT c.id, c.texto_normalizado " + filtro.sql()
+
+    trigramas_termino = trigramas(termino)
+    candidatos = sorted(conn.execute(query, params).fetchall(),
+                        key=lambda fila: -len(trigramas_termino & trigramas(fila[1])))
+    puntuados = []
+    for cliente_id, texto in candidatos[:CANDIDATOS_PUNTUADOS]:
+        puntuacion = similitud(termino, texto, SIMILITUD_MINIMA)
+        if puntuacion >= SIMILITUD_MINIMA:
+            puntuados.append((-puntuacion, cliente_id))
+    puntuados.sort()
+    orden = [cliente_id for _, cliente_id in puntuados[:limite]]
+
+    todos = Filtro(ORIGEN_CLIENTES, (), (), False)
+    filas = {fila[0]: fila for fila in consultar_clientes_por_id(conn, todos, orden, seleccion_id)}
+    return [filas[cliente_id] for cliente_id in orden if cliente_id in filas]
+
+
+def buscar(conn, termino_nombre, termino_categoria, usar_fts=False, difusa=False, orden=(),
+           seleccion_id=None):
+    """Resolver una búsqueda completa o, si es muy grande, su primera página
+
+    Con ``difusa`` (y un término de al menos tres caracteres) se hace una
+    búsqueda aproximada, que siempre devuelve el resultado completo. Con
+    ``orden`` las filas se ordenan en SQLite (ver ``clausula_orden``) y con
+    ``seleccion_id`` llevan la marca de esa selección (ver ``seleccion_clientes``).
+    """
+    orden = tuple(orden)
+    if difusa and len(normalizar(termino_nombre)) >= LONGITUD_MINIMA_FTS:
+        filas = buscar_difuso(conn, termino_nombre, termino_categoria, usar_fts,
+                              seleccion_id=seleccion_id)
+        if orden:
+            filas = consultar_clientes(conn, filtro_ids(fila[0] for fila in filas), orden=orden,
+                                       seleccion_id=seleccion_id)
+        return ResultadoBusqueda(termino_nombre, termino_categoria, filas, None, True, orden)
+    filtro = construir_filtro(termino_nombre, termino_categoria, usar_fts)
+    filas = consultar_clientes(conn, filtro, LIMITE_CARGA_COMPLETA + 1, orden, seleccion_id)
+    if len(filas) <= LIMITE_CARGA_COMPLETA:
+        return ResultadoBusqueda(termino_nombre, termino_categoria, filas, None, False, orden)
+    total = contar_clientes(conn, filtro)
+    filas = consultar_pagina(conn, filtro, TAMANO_PAGINA, orden=orden, seleccion_id=seleccion_id)
+    return ResultadoBusqueda(termino_nombre, termino_categoria, filas, total, False, orden)
+
+
+class ProgramadorBusqueda:
+    """Agrupar pulsaciones y ejecutar las búsquedas en un hilo de trabajo
+
+    Cada búsqueda se retrasa ``retardo_ms`` desde la última pulsación. El hilo
+    de trabajo usa su propia conexión SQLite; cuando llega una búsqueda nueva
+    la consulta en curso se interrumpe con ``Connection.interrupt`` y sólo el
+    resultado de la búsqueda más reciente se entrega al hilo de Tk. Con
+    ``cache`` (una ``CacheBusquedas``) las búsquedas pasan por la caché.
+    """
+
+    def __init__(self, root, ruta_bd, al_terminar, al_fallar,
+                 retardo_ms=250, intervalo_sondeo_ms=30, cache=None):
+        self.root = root
+        self.ruta_bd = ruta_bd
+        self.cache = cache
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.retardo_ms = retardo_ms
+        self.intervalo_sondeo_ms = intervalo_sondeo_ms
+
+        self._after_pendiente = None
+        self._after_sondeo = None
+        self._generacion = 0
+        self._generacion_entregada = 0
+        self._peticion = None
+        self._en_curso = None
+        self._detenido = False
+        self._condicion = threading.Condition()
+        self._resultados = queue.Queue()
+        self._conn = None
+
+        self._hilo = threading.Thread(target=self._trabajar, daemon=True)
+        self._hilo.start()
+
+    def programar(self, termino_nombre, termino_categoria, inmediato=False, difusa=False, orden=(),
+                  seleccion_id=None):
+        """Programar una búsqueda, descartando la que estuviera pendiente"""
+        if self._after_pendiente is not None:
+            self.root.after_cancel(self._after_pendiente)
+            self._after_pendiente = None
+
+        if inmediato:
+            self._lanzar(termino_nombre, termino_categoria, difusa, orden, seleccion_id)
+        else:
+            self._after_pendiente = self.root.after(
+                self.retardo_ms, self._lanzar, termino_nombre, termino_categoria, difusa, orden,
+                seleccion_id)
+
+    def detener(self, espera=1.0):
+        """Detener el hilo de trabajo y cerrar su conexión (hilo de Tk)
+
+        Cancela también las llamadas ``after`` pendientes para que no se
+        ejecuten contra una ventana ya destruida, y espera hasta ``espera``
+        segundos a que el hilo cierre su conexión.
+        """
+        for pendiente in (self._after_pendiente, self._after_sondeo):
+            if pendiente is not None:
+                self.root.after_cancel(pendiente)
+        self._after_pendiente = self._after_sondeo = None
+        with self._condicion:
+            self._detenido = True
+            if self._en_curso is not None and self._conn is not None:
+                self._conn.interrupt()
+            self._condicion.notify()
+        self._hilo.join(espera)
+
+    def _lanzar(self, termino_nombre, termino_categoria, difusa, orden, seleccion_id):
+        """Enviar la búsqueda al hilo de trabajo (hilo de Tk)"""
+        self._after_pendiente = None
+        with self._condicion:
+            self._generacion += 1
+            self._peticion = (self._generacion, termino_nombre, termino_categoria, difusa, orden,
+                              seleccion_id)
+            # Abortar la consulta que quedó obsoleta
+            if self._en_curso is not None and self._conn is not None:
+                self._conn.interrupt()
+            self._condicion.notify()
+
+        if self._after_sondeo is None:
+            self._after_sondeo = self.root.after(self.intervalo_sondeo_ms, self._sondear)
+
+    def _sondear(self):
+        """Recoger resultados del hilo de trabajo y entregar sólo el último"""
+        self._after_sondeo = None
+        ultimo = None
+        while True:
+            try:
+                resultado = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            if resultado[0] == self._generacion:
+                ultimo = resultado
+
+        if ultimo is not None:
+            generacion, resultado, error = ultimo
+            self._generacion_entregada = generacion
+            if error is not None:
+                self.al_fallar(error)
+            else:
+                self.al_terminar(resultado)
+
+        if self._generacion_entregada < self._generacion:
+            self._after_sondeo = self.root.after(self.intervalo_sondeo_ms, self._sondear)
+
+    def _trabajar(self):
+        """Bucle del hilo de trabajo"""
+        self._conn = abrir_conexion(self.ruta_bd, check_same_thread=False)
+        usar_fts = fts_disponible(self._conn)
+        buscar_clientes = self.cache.buscar if self.cache is not None else buscar
+        try:
+            while True:
+                with self._condicion:
+                    while self._peticion is None and not self._detenido:
+                        self._condicion.wait()
+                    if self._detenido:
+                        return
+                    (generacion, termino_nombre, termino_categoria, difusa, orden,
+                     seleccion_id) = self._peticion
+                    self._peticion = None
+                    self._en_curso = generacion
+
+                resultado, error = None, None
+                while True:
+                    try:
+                        resultado = buscar_clientes(
+                            self._conn, termino_nombre, termino_categoria, usar_fts, difusa, orden,
+                            seleccion_id)
+                    except sqlite3.OperationalError as e:
+                        with self._condicion:
+                            vigente = generacion == self._generacion and not self._detenido
+                        # Una interrupción dirigida a una búsqueda anterior puede
+                        # alcanzar a la vigente: en ese caso se reintenta
+                        if vigente and str(e) == "interrupted":
+                            continue
+                        error = e
+                    except Exception as e:
+                        error = e
+                    break
+
+                with self._condicion:
+                    self._en_curso = None
+                    vigente = generacion == self._generacion
+                if vigente:
+                    self._resultados.put((generacion, resultado, error))
+        finally:
+            self._conn.close()
@@ -0,0 +1,155 @@
+"""Caché en memoria de los resultados de búsqueda
+
+Al escribir "gar", "garc", "garci" cada pulsación lanzaba una consulta
+completa aunque cada resultado es un subconjunto del anterior.
+``CacheBusquedas`` guarda los resultados recientes (LRU, con un límite
+aproximado de memoria) por sus términos normalizados. Si el término nuevo
+contiene a uno ya guardado cuyo resultado está completo y con el mismo orden,
+las filas se filtran en memoria sin consultar SQLite; el filtrado conserva el
+orden del resultado original. Las búsquedas FTS5 sin orden explícito no se
+refinan: van ordenadas por el bm25 de su propio término, que no es el del
+resultado guardado.
+
+Toda la caché se invalida al cambiar ``generacion``, que incrementan los
+métodos de ``ClientRepository`` que escriben. Las escrituras de otras
+conexiones o procesos (importaciones, la línea de comandos) se detectan con
+``PRAGMA data_version``.
+"""
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+from busqueda import LONGITUD_MINIMA_FTS, buscar
+from normalizacion import normalizar, texto_cliente
+
+
+LIMITE_BYTES = 32 * 1024 * 1024
+
+
+def tamano_resultado(resultado):
+    """Tamaño aproximado en bytes de las filas de un resultado"""
+    return sys.getsizeof(resultado.filas) + sum(
+        sys.getsizeof(fila) + sum(sys.getsizeof(valor) for valor in fila)
+        for fila in resultado.filas)
+
+
+class CacheBusquedas:
+    """Resultados de búsqueda recientes, compartidos entre hilos"""
+
+    def __init__(self, limite_bytes=LIMITE_BYTES):
+        self.limite_bytes = limite_bytes
+        self.generacion = 0
+        self.aciertos = 0
+        self.refinados = 0
+        self.fallos = 0
+        # (nombre, categoria, difusa, orden, seleccion_id) normalizados
+        # -> [resultado, textos, tamaño]
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        # Conexión -> último PRAGMA data_version leído. Con referencias débiles
+        # una conexión cerrada no deja su versión a otra que reutilice su id()
+        self._versiones = weakref.WeakKeyDictionary()
+        self._versiones_sin_weakref = {}  # id -> (conexión, versión), si no admite weakref
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        """Descartar todos los resultados (tras escribir en la base de datos)"""
+        with self._lock:
+            self._vaciar()
+
+    def _vaciar(self):
+        """Descartar todos los resultados; se llama con ``_lock`` tomado"""
+        self.generacion += 1
+        self._entradas.clear()
+        self._bytes = 0
+
+    def _comprobar_version(self, conn):
+        """Invalidar si otra conexión ha escrito desde la última consulta de ``conn``"""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            try:
+                anterior = self._versiones.get(conn)
+                self._versiones[conn] = version
+            except TypeError:
+                # sqlite3.Connection sin subclase: se guarda la propia conexión
+                # para que su id() no pueda reutilizarse mientras tanto
+                anterior = self._versiones_sin_weakref.get(id(conn), (None, None))[1]
+                self._versiones_sin_weakref[id(conn)] = (conn, version)
+            if anterior is not None and anterior != version:
+                self._vaciar()
+
+    def buscar(self, conn, termino_nombre, termino_categoria, usar_fts=False, difusa=False, orden=(),
+               seleccion_id=None):
+        """Como ``busqueda.buscar``, pero reutilizando los resultados guardados"""
+        self._comprobar_version(conn)
+        nombre, categoria = normalizar(termino_nombre), normalizar(termino_categoria)
+        orden = tuple(tuple(clave) for clave in orden)
+        clave = (nombre, categoria, difusa, orden, seleccion_id)
+        with self._lock:
+            generacion = self.generacion
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[0]._replace(termino_nombre=termino_nombre,
+                                           termino_categoria=termino_categoria)
+            por_rango = usar_fts and not orden and len(nombre) >= LONGITUD_MINIMA_FTS
+            base = (None if difusa or por_rango
+                    else self._base_para(nombre, categoria, orden, seleccion_id))
+
+        if base is None:
+            resultado = buscar(conn, termino_nombre, termino_categoria, usar_fts, difusa, orden,
+                               seleccion_id)
+        else:
+            filas = [fila for fila, (texto, texto_categoria) in zip(base[0].filas, base[1])
+                     if nombre in texto and categoria in texto_categoria]
+            resultado = base[0]._replace(termino_nombre=termino_nombre,
+                                         termino_categoria=termino_categoria, filas=filas)
+        with self._lock:
+            if base is None:
+                self.fallos += 1
+            else:
+                self.refinados += 1
+        self._guardar(clave, resultado, generacion)
+        return resultado
+
+    def _base_para(self, nombre, categoria, orden, seleccion_id):
+        """Resultado completo más pequeño del que se puede filtrar la búsqueda
+
+        Devuelve (resultado, textos normalizados de cada fila) o None. Con
+        comodines de LIKE en el término no se refina: la subcadena no equivale.
+        """
+        if any(comodin in nombre + categoria for comodin in '%_'):
+            return None
+        mejor = None
+        for (nombre_base, categoria_base, difusa, orden_base,
+             seleccion_base), entrada in self._entradas.items():
+            if (difusa or entrada[0].total is not None or orden_base != orden
+                    or seleccion_base != seleccion_id
+                    or nombre_base not in nombre or categoria_base not in categoria):
+                continue
+            if mejor is None or len(entrada[0].filas) < len(mejor[0].filas):
+                mejor = entrada
+        if mejor is None:
+            return None
+        if mejor[1] is None:
+            # Textos calculados sólo la primera vez que se refina desde esta entrada
+            mejor[1] = [(texto_cliente(fila[1], fila[2], fila[4], fila[3]), normalizar(fila[5]))
+                        for fila in mejor[0].filas]
+        return mejor[0], mejor[1]
+
+    def _guardar(self, clave, resultado, generacion):
+        """Guardar un resultado salvo que la base de datos haya cambiado mientras tanto"""
+        tamano = tamano_resultado(resultado)
+        with self._lock:
+            if generacion != self.generacion or tamano > self.limite_bytes:
+                return
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._entradas[clave] = [resultado, None, tamano]
+            self._bytes += tamano
+            while self._bytes > self.limite_bytes:
+                _, descartada = self._entradas.popitem(last=False)
+                self._bytes -= descartada[2]
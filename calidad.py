@@ -0,0 +1,246 @@
+"""Análisis de calidad de datos y detección de posibles duplicados
+
+La restricción ``correo UNIQUE`` sólo evita el mismo correo escrito igual.
+Este análisis normaliza teléfonos, correos y nombres de empresa en claves de
+bloqueo (``calidad_claves``) y propone como duplicados los clientes que
+comparten alguna clave (``calidad_duplicados``), sin comparar cada cliente
+con todos los demás. También anota problemas sueltos, como correos mal
+formados o teléfonos incompletos.
+
+Es incremental: los triggers de la migración 6 anotan en
+``calidad_pendientes`` los clientes nuevos o modificados y cada ejecución
+analiza sólo esos. Los candidatos descartados en la revisión no se vuelven a
+proponer.
+
+    python -m cartronic calidad [--bd clientes.db] [--listar N] [--json]
+"""
+import argparse
+import json
+import re
+import sys
+from collections import namedtuple
+
+from conexion import RUTA_BD, abrir_conexion
+from migraciones import preparar_base_datos
+from normalizacion import normalizar
+
+
+PENDIENTE = 'pendiente'
+DESCARTADO = 'descartado'
+
+# Columna de calidad_claves -> descripción del motivo
+MOTIVOS = {
+    'telefono': "mismo teléfono",
+    'correo': "mismo correo",
+    'empresa': "misma empresa",
+}
+
+TAMANO_LOTE = 5000
+# Una clave compartida por más clientes (p. ej. un teléfono de relleno) no
+# distingue duplicados y generaría demasiados pares
+MAXIMO_GRUPO = 10
+DIGITOS_TELEFONO = 10
+MINIMO_DIGITOS_TELEFONO = 6
+SUFIJOS_EMPRESA = {'sa', 'srl', 'sas', 'sau', 'sh', 'sc', 'ltda', 'inc', 'llc', 'cia'}
+DOMINIOS_GMAIL = {'gmail.com', 'googlemail.com'}
+PATRON_CORREO = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class ResumenCalidad(namedtuple(
+        'ResumenCalidad', ['analizados', 'candidatos', 'problemas', 'cancelado'])):
+    """Resultado de un análisis de calidad"""
+    __slots__ = ()
+
+
+def normalizar_telefono(telefono):
+    """Últimos 10 dígitos del teléfono, sin prefijos ni separadores
+
+    "+54 9 341 555-1234" y "(341) 555 1234" dan la misma clave. Con menos de
+    6 dígitos devuelve una cadena vacía (sin clave).
+    """
+    digitos = re.sub(r"\D", "", str(telefono or ''))
+    if len(digitos) < MINIMO_DIGITOS_TELEFONO:
+        return ''
+    return digitos[-DIGITOS_TELEFONO:]
+
+
+def normalizar_correo(correo):
+    """Correo en minúsculas y sin etiqueta "+algo"; en Gmail, también sin puntos"""
+    correo = str(correo or '').strip().casefold()
+    if not PATRON_CORREO.match(correo):
+        return ''
+    usuario, dominio = correo.rsplit('@', 1)
+    usuario = usuario.split('+', 1)[0]
+    if dominio in DOMINIOS_GMAIL:
+        usuario, dominio = usuario.replace('.', ''), 'gmail.com'
+    return f"{usuario}@{dominio}"
+
+
+def clave_empresa(nombre):
+    """Nombre de empresa sin tildes, puntuación ni forma jurídica ("S.R.L.")"""
+    texto = re.sub(r"[^\w\s]", "", normalizar(nombre).replace('.', ''))
+    palabras = [p for p in texto.replace('_', ' ').split() if p not in SUFIJOS_EMPRESA]
+    return " ".join(palabras)
+
+
+def problemas_cliente(nombre, correo, telefono):
+    """Lista de problemas de calidad de un cliente, para mostrar"""
+    problemas = []
+    if not str(nombre or '').strip():
+        problemas.append("nombre vacío")
+    if not PATRON_CORREO.match(str(correo or '').strip()):
+        problemas.append("correo mal formado")
+    elif correo != correo.strip().lower():
+        problemas.append("correo con mayúsculas o espacios")
+    if not normalizar_telefono(telefono):
+        problemas.append("teléfono incompleto")
+    return problemas
+
+
+def analizar_lote(cursor, cliente_ids):
+    """Recalcular claves y candidatos de un lote de clientes pendientes"""
+    lista = json.dumps(cliente_ids)
+    cursor.execute("""
+        SELECT id, nombre, correo, telefono FROM clientes
+        WHERE id IN (SELECT value FROM json_each(?))
+    """, (lista,))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO calidad_claves (cliente_id, telefono, correo, empresa, problemas)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(cliente_id, normalizar_telefono(telefono), normalizar_correo(correo),
+           clave_empresa(nombre), ", ".join(problemas_cliente(nombre, correo, telefono)))
+          for cliente_id, nombre, correo, telefono in cursor.fetchall()])
+
+    # Los candidatos sin revisar de estos clientes se recalculan desde cero;
+    # los descartados se conservan para no volver a proponerlos
+    cursor.execute("""
+        DELETE FROM calidad_duplicados
+        WHERE estado = ? AND (cliente_a IN (SELECT value FROM json_each(?))
+                              OR cliente_b IN (SELECT value FROM json_each(?)))
+    """, (PENDIENTE, lista, lista))
+    for clave in MOTIVOS:
+        # Bloqueo: sólo se emparejan clientes con la misma clave, vía índice
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO calidad_duplicados (cliente_a, cliente_b, motivo)
+            SELECT MIN(k.cliente_id, otro.cliente_id), MAX(k.cliente_id, otro.cliente_id), ?
+            FROM calidad_claves k
+            JOIN calidad_claves otro ON otro.{clave} = k.{clave} AND otro.cliente_id != k.cliente_id
+            WHERE k.cliente_id IN (SELECT value FROM json_each(?)) AND k.{clave} != ''
+              AND (SELECT COUNT(*) FROM calidad_claves g WHERE g.{clave} = k.{clave}) <= ?
+        """, (clave, lista, MAXIMO_GRUPO))
+    cursor.execute("DELETE FROM calidad_pendientes WHERE cliente_id IN (SELECT value FROM json_each(?))",
+                   (lista,))
+
+
+def analizar_calidad(conn, tamano_lote=TAMANO_LOTE, progreso=None, cancelacion=None):
+    """Analizar los clientes nuevos o modificados desde el último análisis
+
+    Cada lote se confirma por separado, así que un análisis cancelado
+    continúa donde quedó. ``progreso(analizados, fraccion)`` se llama tras
+    cada lote.
+    """
+    total = conn.execute("SELECT COUNT(*) FROM calidad_pendientes").fetchone()[0]
+    analizados = 0
+    cancelado = False
+    cursor = conn.cursor()
+    while True:
+        if cancelacion is not None and cancelacion.is_set():
+            cancelado = True
+            break
+        cursor.execute("SELECT cliente_id FROM calidad_pendientes ORDER BY cliente_id LIMIT ?",
+                       (tamano_lote,))
+        cliente_ids = [fila[0] for fila in cursor.fetchall()]
+        if not cliente_ids:
+            break
+        try:
+            analizar_lote(cursor, cliente_ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        analizados += len(cliente_ids)
+        if progreso is not None:
+            progreso(analizados, min(1.0, analizados / total) if total else None)
+
+    candidatos = conn.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM calidad_duplicados WHERE estado = ? GROUP BY cliente_a, cliente_b)
+    """, (PENDIENTE,)).fetchone()[0]
+    problemas = conn.execute("SELECT COUNT(*) FROM calidad_claves WHERE problemas != ''").fetchone()[0]
+    return ResumenCalidad(analizados, candidatos, problemas, cancelado)
+
+
+def candidatos_duplicados(conn, limite=500):
+    """Pares sin revisar: (id_a, id_b, motivos, nombre, correo y teléfono de cada uno)
+
+    Primero los pares que coinciden en más claves.
+    """
+    filas = conn.execute("""
+        SELECT d.cliente_a, d.cliente_b, GROUP_CONCAT(d.motivo, ','),
+               a.nombre, a.correo, a.telefono, b.nombre, b.correo, b.telefono
+        FROM calidad_duplicados d
+        JOIN clientes a ON a.id = d.cliente_a
+        JOIN clientes b ON b.id = d.cliente_b
+        WHERE d.estado = ?
+        GROUP BY d.cliente_a, d.cliente_b
+        ORDER BY COUNT(*) DESC, d.cliente_a, d.cliente_b
+        LIMIT ?
+    """, (PENDIENTE, limite)).fetchall()
+    return [(a, b, ", ".join(MOTIVOS[m] for m in motivos.split(',')), *resto)
+            for a, b, motivos, *resto in filas]
+
+
+def descartar_duplicado(conn, cliente_a, cliente_b):
+    """Marcar un par como revisado (no son duplicados)"""
+    cliente_a, cliente_b = sorted((cliente_a, cliente_b))
+    with conn:
+        conn.execute("""
+            UPDATE calidad_duplicados SET estado = ? WHERE cliente_a = ? AND cliente_b = ?
+        """, (DESCARTADO, cliente_a, cliente_b))
+
+
+def problemas_calidad(conn, limite=500):
+    """Clientes con problemas de calidad: (id, nombre, correo, teléfono, problemas)"""
+    return conn.execute("""
+        SELECT c.id, c.nombre, c.correo, c.telefono, k.problemas
+        FROM calidad_claves k JOIN clientes c ON c.id = k.cliente_id
+        WHERE k.problemas != ''
+        ORDER BY c.id
+        LIMIT ?
+    """, (limite,)).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analizar la calidad de datos y los duplicados")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    parser.add_argument('--listar', type=int, default=0, metavar='N',
+                        help="Mostrar los N primeros candidatos a duplicado")
+    parser.add_argument('--json', action='store_true', help="Candidatos como líneas JSON")
+    args = parser.parse_args(argv)
+
+    def mostrar_progreso(analizados, fraccion):
+        porcentaje = f" ({fraccion:.0%})" if fraccion is not None else ""
+        print(f"\r{analizados} clientes analizados{porcentaje}", end="", file=sys.stderr)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        preparar_base_datos(conn)
+        resumen = analizar_calidad(conn, progreso=mostrar_progreso)
+        candidatos = candidatos_duplicados(conn, args.listar) if args.listar else []
+    finally:
+        conn.close()
+
+    print(file=sys.stderr)
+    print(f"{resumen.analizados} clientes analizados, {resumen.candidatos} posibles duplicados, "
+          f"{resumen.problemas} clientes con problemas")
+    columnas = ('id_a', 'id_b', 'motivos', 'nombre_a', 'correo_a', 'telefono_a',
+                'nombre_b', 'correo_b', 'telefono_b')
+    for candidato in candidatos:
+        if args.json:
+            print(json.dumps(dict(zip(columnas, candidato)), ensure_ascii=False))
+        else:
+            print("\t".join(str(valor) for valor in candidato))
+
+
+if __name__ == "__main__":
+    main()
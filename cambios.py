@@ -0,0 +1,110 @@
+"""Lectura incremental del registro de cambios de clientes y categorías
+
+Los triggers de la migración 7 anotan cada inserción, modificación y borrado
+en la tabla ``cambios`` con una secuencia creciente. Un sistema externo se
+sincroniza guardando la última secuencia que procesó y pidiendo sólo los
+cambios posteriores, en lugar de volver a exportar todos los clientes. Para
+empezar basta una exportación completa y la ``ultima_secuencia`` leída
+antes de hacerla.
+
+    python -m cartronic cambios [--desde N] [--tabla clientes] [--seguir]
+    python -m cartronic cambios --purgar N
+"""
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+
+from conexion import RUTA_BD, abrir_conexion
+from migraciones import preparar_base_datos
+
+
+TAMANO_LOTE = 1000
+INTERVALO_SEGUIR = 1.0
+
+
+class Cambio(namedtuple(
+        'Cambio', ['secuencia', 'tabla', 'operacion', 'fila_id', 'anterior', 'nuevo', 'momento'])):
+    """Un cambio registrado; ``anterior`` y ``nuevo`` son diccionarios o None"""
+    __slots__ = ()
+
+
+def ultima_secuencia(conn):
+    """Secuencia del último cambio registrado (0 si no hay ninguno)"""
+    return conn.execute("SELECT COALESCE(MAX(secuencia), 0) FROM cambios").fetchone()[0]
+
+
+def leer_cambios(conn, desde=0, tabla=None, tamano_lote=TAMANO_LOTE):
+    """Generar los cambios con secuencia mayor que ``desde``, en orden
+
+    Se leen por lotes de ``tamano_lote`` por secuencia, así que la memoria no
+    depende de cuántos cambios haya pendientes.
+    """
+    condicion, parametros = "", ()
+    if tabla:
+        condicion, parametros = "AND tabla = ?", (tabla,)
+    while True:
+        filas = conn.execute(f"""
+            SELECT secuencia, tabla, operacion, fila_id, anterior, nuevo, momento
+            FROM cambios WHERE secuencia > ? {condicion}
+            ORDER BY secuencia LIMIT ?
+        """, (desde, *parametros, tamano_lote)).fetchall()
+        for secuencia, tabla_cambio, operacion, fila_id, anterior, nuevo, momento in filas:
+            yield Cambio(secuencia, tabla_cambio, operacion, fila_id,
+                         json.loads(anterior) if anterior else None,
+                         json.loads(nuevo) if nuevo else None, momento)
+        if len(filas) < tamano_lote:
+            return
+        desde = filas[-1][0]
+
+
+def purgar_cambios(conn, hasta):
+    """Borrar los cambios con secuencia menor o igual que ``hasta``
+
+    Para cuando todos los consumidores ya los han procesado; las secuencias
+    nuevas siguen creciendo a partir de la última asignada.
+    """
+    with conn:
+        return conn.execute("DELETE FROM cambios WHERE secuencia <= ?", (hasta,)).rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Leer el registro de cambios como JSON Lines")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    parser.add_argument('--desde', type=int, default=0,
+                        help="Última secuencia ya procesada (se muestran las posteriores)")
+    parser.add_argument('--tabla', choices=('clientes', 'categorias'))
+    parser.add_argument('--seguir', action='store_true',
+                        help="Seguir esperando cambios nuevos (Ctrl+C para terminar)")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO_SEGUIR,
+                        help="Segundos entre consultas con --seguir")
+    parser.add_argument('--purgar', type=int, metavar='N',
+                        help="Borrar los cambios hasta la secuencia N inclusive")
+    args = parser.parse_args(argv)
+
+    conn = abrir_conexion(args.bd)
+    desde = args.desde
+    try:
+        preparar_base_datos(conn)
+        if args.purgar is not None:
+            print(f"{purgar_cambios(conn, args.purgar)} cambios borrados", file=sys.stderr)
+            return
+
+        while True:
+            for cambio in leer_cambios(conn, desde, args.tabla):
+                print(json.dumps(cambio._asdict(), ensure_ascii=False), flush=True)
+                desde = cambio.secuencia
+            if not args.seguir:
+                break
+            time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+    # Para guardarla y pasarla como --desde en la siguiente sincronización
+    print(f"Última secuencia: {desde}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
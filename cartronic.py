@@ -0,0 +1,143 @@
+"""Línea de comandos del sistema de gestión de clientes
+
+    python -m cartronic buscar TEXTO [--categoria TEXTO] [--orden categoria,-nombre] [--limite N] [--json]
+    python -m cartronic estadisticas [--json]
+    python -m cartronic importar archivo.csv [--rechazos rechazos.csv]
+    python -m cartronic exportar salida.csv [--buscar TEXTO] [--categoria NOMBRE]
+    python -m cartronic correo estado|reanudar ENVIO_ID
+    python -m cartronic lotes --categoria NOMBRE|--seleccion ID [--tamano 500] [--directorio lotes/]
+    python -m cartronic calidad [--listar N] [--json]
+    python -m cartronic cambios [--desde N] [--tabla clientes] [--seguir]
+    python -m cartronic mantenimiento respaldar|integridad|compactar|programado
+    python -m cartronic servidor [--puerto 8765] [--lectores 4]
+    python -m cartronic migrar | conexion
+    python -m cartronic gui
+
+Sólo el subcomando ``gui`` carga tkinter; el resto usa ``ClientRepository``
+y los módulos sin interfaz, que se importan bajo demanda. Con ``--tiempos``
+se informa por stderr del tiempo de arranque y de ejecución.
+"""
+import time
+_INICIO = time.perf_counter()
+
+import argparse
+import importlib
+import json
+import sys
+
+from conexion import RUTA_BD
+
+
+# Subcomandos que delegan en el main() de otro módulo con el resto de argumentos
+DELEGADOS = {
+    'importar': 'importacion',
+    'exportar': 'exportacion',
+    'correo': 'correo_masivo',
+    'lotes': 'lotes_correos',
+    'calidad': 'calidad',
+    'cambios': 'cambios',
+    'mantenimiento': 'mantenimiento',
+    'servidor': 'servidor',
+    'migrar': 'migraciones',
+    'conexion': 'conexion',
+}
+
+
+def comando_buscar(args):
+    from busqueda import interpretar_orden
+    from repositorio import ClientRepository
+
+    try:
+        orden = interpretar_orden(args.orden)
+    except ValueError as e:
+        sys.exit(str(e))
+    repositorio = ClientRepository.abrir(args.bd)
+    try:
+        if args.aproximada:
+            filas = repositorio.buscar(args.texto, args.categoria, difusa=True,
+                                       orden=orden).filas[:args.limite]
+        else:
+            filas = repositorio.pagina(repositorio.filtro(args.texto, args.categoria), args.limite,
+                                       orden=orden)
+    finally:
+        repositorio.cerrar()
+
+    columnas = ('id', 'nombre', 'contacto', 'telefono', 'correo', 'categoria')
+    for fila in filas:
+        if args.json:
+            print(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False))
+        else:
+            print("\t".join(str(valor) for valor in fila))
+
+
+def comando_estadisticas(args):
+    from repositorio import ClientRepository
+
+    repositorio = ClientRepository.abrir(args.bd)
+    try:
+        estadisticas = repositorio.estadisticas()
+    finally:
+        repositorio.cerrar()
+
+    if args.json:
+        print(json.dumps(estadisticas, ensure_ascii=False, indent=2))
+        return
+    print(f"Clientes: {estadisticas['clientes']}")
+    print(f"Versión del esquema: {estadisticas['version_esquema']}")
+    print(f"Índice FTS5: {'sí' if estadisticas['fts5'] else 'no'}")
+    print(f"Tamaño: {estadisticas['tamano_bytes'] / 1024 / 1024:.1f} MiB")
+    for nombre, cantidad in estadisticas['categorias']:
+        print(f"  {nombre}: {cantidad}")
+
+
+def comando_gui(args):
+    import cartronic_database
+    cartronic_database.main(args.tiempos, args.bd)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    tiempos = '--tiempos' in argv
+    if tiempos:
+        argv.remove('--tiempos')
+
+    if argv and argv[0] in DELEGADOS:
+        modulo = importlib.import_module(DELEGADOS[argv[0]])
+        modulo.main(argv[1:])
+    else:
+        parser = argparse.ArgumentParser(
+            prog="python -m cartronic", description="Sistema de gestión de clientes",
+            epilog="Otros subcomandos: " + ", ".join(DELEGADOS) + " (usar --help tras ellos)")
+        subparsers = parser.add_subparsers(dest='comando', required=True)
+
+        buscar = subparsers.add_parser('buscar', help="Buscar clientes como en la aplicación")
+        buscar.add_argument('texto', nargs='?', default='')
+        buscar.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+        buscar.add_argument('--categoria', default='', help="Parte del nombre de la categoría")
+        buscar.add_argument('--orden', default='',
+                            help="Columnas separadas por comas; '-' delante para descendente")
+        buscar.add_argument('--limite', type=int, default=50)
+        buscar.add_argument('--aproximada', action='store_true',
+                            help="Tolerar errores de escritura; ordena por parecido")
+        buscar.add_argument('--json', action='store_true', help="Una línea JSON por cliente")
+        buscar.set_defaults(funcion=comando_buscar)
+
+        estadisticas = subparsers.add_parser('estadisticas', help="Resumen de la base de datos")
+        estadisticas.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+        estadisticas.add_argument('--json', action='store_true')
+        estadisticas.set_defaults(funcion=comando_estadisticas)
+
+        gui = subparsers.add_parser('gui', help="Abrir la interfaz gráfica")
+        gui.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+        gui.set_defaults(funcion=comando_gui)
+
+        args = parser.parse_args(argv)
+        args.tiempos = tiempos
+        args.funcion(args)
+
+    if tiempos:
+        print(f"Tiempo total: {(time.perf_counter() - _INICIO) * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
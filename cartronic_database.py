@@ -1,21 +1,60 @@
+import time
+_INICIO = time.perf_counter()
+
+import os
+import sys
+import webbrowser
 import tkinter as tk
-from tkinter import ttk, messagebox, font
+from tkinter import ttk, messagebox, font, filedialog, simpledialog
 import sqlite3
-import smtplib
-import pyperclip
-from email.mime.text import MIMEText
-from email.utils import formatdate
+import datetime
+
+import instrumentacion
+from busqueda import ProgramadorBusqueda, filtro_categoria, filtro_ids, filtro_seleccion
+from cache_busquedas import CacheBusquedas
+from calidad import analizar_calidad, candidatos_duplicados, descartar_duplicado, problemas_calidad
+from conexion import RUTA_BD, abrir_conexion, formatear_informe, informe_conexion
+from correo_masivo import (ConfiguracionSMTP, MotorCorreo, crear_envio, encolar_categoria,
+                           encolar_seleccion, estado_envios, leer_envio)
+from exportacion import exportar_clientes
+from importacion import importar_clientes
+from instrumentacion import instrumentar_ui
+from lotes_correos import (TAMANO_LOTE, DistribucionCorreos, contar_destinatarios, enlace_mailto,
+                           escribir_lotes, origen_categoria, origen_seleccion, texto_lote)
+from mantenimiento import (TAREAS_DESATENDIDAS, ejecutar_programadas, ejecutar_tarea, respaldar,
+                           ruta_respaldo)
+from migraciones import CATEGORIA_POR_DEFECTO, ID_SELECCION_POR_DEFECTO, preparar_base_datos
+from repositorio import ClientRepository
+from tabla_virtual import TablaVirtual
+from tareas import TareaSegundoPlano
+
+# Espera tras el arranque antes del mantenimiento programado (ANALYZE, PRAGMA optimize)
+RETARDO_MANTENIMIENTO_MS = 60000
+
+# Columnas de la tabla de clientes -> columna de ``busqueda.COLUMNAS_ORDEN``
+COLUMNAS_TABLA = {
+    'Nombre': 'nombre',
+    'Contacto': 'contacto',
+    'Teléfono': 'telefono',
+    'Correo': 'correo',
+    'Categoría': 'categoria',
+}
 
 class ClientDatabaseApp:
-    def __init__(self, root):
+    def __init__(self, root, ruta_bd=RUTA_BD):
         self.root = root
+        self.ruta_bd = ruta_bd
         self.root.title("Sistema de Gestión de Clientes")
         self.root.geometry("1200x800")
     
         
-        self.seleccion_persistente = set()  # Para almacenar selecciones persistentes
+        self.seleccion_id = ID_SELECCION_POR_DEFECTO  # Selección guardada activa
+        self.selecciones = []
         self.current_clients = []
         self.categories = []
+        self.resultado_actual = None
+        self.filas_tabla = {}  # iid (clientes.id) -> (valores, tags) pintados
+        self.orden = []  # [(columna, descendente)] pedidos al pulsar los encabezados
         
         # Configurar fuente predeterminada
         default_font = font.nametofont("TkDefaultFont")
@@ -23,8 +62,17 @@ class ClientDatabaseApp:
         self.root.option_add("*Font", default_font)
         
         # Configuración de la base de datos
-        self.conn = sqlite3.connect('clientes.db')
+        self.conn = abrir_conexion(self.ruta_bd)
+        self.informe_conexion = informe_conexion(self.conn)
         self.inicializar_base_datos()
+        # Caché de resultados compartida: el repositorio la invalida al escribir
+        self.cache_busquedas = CacheBusquedas()
+        self.repositorio = ClientRepository(self.conn, self.ruta_bd, self.cache_busquedas)
+        
+        # Búsquedas en segundo plano con su propia conexión
+        self.programador_busqueda = ProgramadorBusqueda(
+            self.root, self.ruta_bd, self.mostrar_resultados, self.mostrar_error_busqueda,
+            cache=self.cache_busquedas)
         
         # Configurar estilos
         self.style = ttk.Style()
@@ -34,45 +82,214 @@ class ClientDatabaseApp:
         self.style.configure('TLabel', font=('Arial', 11))
         
         # Crear interfaz
+        self.crear_menu()
         self.crear_componentes()
         self.cargar_categorias()
+        self.cargar_selecciones()
         
+        # Optimización programada, sin retrasar el arranque
+        self.root.after(RETARDO_MANTENIMIENTO_MS, self.mantenimiento_programado)
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        
+    def cerrar(self):
+        """Detener el hilo de búsqueda y cerrar las conexiones antes de salir"""
+        self.programador_busqueda.detener()
+        self.conn.close()
+        self.root.destroy()
+
     def inicializar_base_datos(self):
-        """Crear tablas y categoría predeterminada si es necesario"""
+        """Crear o actualizar el esquema de la base de datos si es necesario"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS categorias (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL UNIQUE
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS clientes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL,
-                    correo TEXT NOT NULL UNIQUE,
-                    telefono TEXT NOT NULL,
-                    contacto TEXT NOT NULL,
-                    categoria_id INTEGER DEFAULT 1,
-                    FOREIGN KEY(categoria_id) REFERENCES categorias(id)
-                )
-            """)
-            # Verificar columnas existentes
-            cursor.execute("PRAGMA table_info(clientes)")
-            columnas = [columna[1] for columna in cursor.fetchall()]
-            if 'contacto' not in columnas:
-                cursor.execute("ALTER TABLE clientes ADD COLUMN contacto TEXT NOT NULL DEFAULT ''")
-            if 'categoria_id' not in columnas:
-                cursor.execute("ALTER TABLE clientes ADD COLUMN categoria_id INTEGER DEFAULT 1")
-            
-            cursor.execute("""
-                INSERT OR IGNORE INTO categorias (id, nombre) VALUES (1, 'Clientes')
-            """)
-            self.conn.commit()
+            preparar_base_datos(self.conn)
         except Exception as e:
             messagebox.showerror("Error de Base de Datos", f"Inicialización fallida: {str(e)}")
 
+    def crear_menu(self):
+        """Crear la barra de menú"""
+        barra_menu = tk.Menu(self.root)
+        menu_archivo = tk.Menu(barra_menu, tearoff=0)
+        menu_archivo.add_command(label="Importar Clientes...", command=self.importar_archivo)
+        menu_archivo.add_separator()
+        menu_archivo.add_command(label="Exportar Resultados...", command=self.exportar_resultados)
+        menu_archivo.add_command(label="Exportar Categoría...", command=self.exportar_categoria)
+        menu_archivo.add_command(label="Exportar Selección...", command=self.exportar_seleccion)
+        barra_menu.add_cascade(label="Archivo", menu=menu_archivo)
+        
+        menu_clientes = tk.Menu(barra_menu, tearoff=0)
+        menu_clientes.add_command(label="Mover a Categoría...", command=self.mover_clientes_lote)
+        menu_clientes.add_command(label="Fusionar Duplicados...", command=self.fusionar_clientes_lote)
+        menu_clientes.add_command(label="Calidad de Datos...", command=self.abrir_calidad)
+        menu_clientes.add_separator()
+        menu_clientes.add_command(label="Eliminar Clientes...", command=self.eliminar_clientes_lote)
+        barra_menu.add_cascade(label="Clientes", menu=menu_clientes)
+        
+        menu_bd = tk.Menu(barra_menu, tearoff=0)
+        menu_bd.add_command(label="Configuración de Conexión", command=self.mostrar_informe_conexion)
+        menu_bd.add_command(label="Diagnóstico de Consultas...", command=self.abrir_diagnostico)
+        menu_bd.add_separator()
+        menu_bd.add_command(label="Crear Respaldo...", command=self.crear_respaldo)
+        menu_bd.add_command(label="Comprobar Integridad", command=self.comprobar_integridad)
+        menu_bd.add_command(label="Optimizar (ANALYZE)", command=self.optimizar_base_datos)
+        menu_bd.add_command(label="Compactar (VACUUM)", command=self.compactar_base_datos)
+        barra_menu.add_cascade(label="Base de Datos", menu=menu_bd)
+        
+        menu_correo = tk.Menu(barra_menu, tearoff=0)
+        menu_correo.add_command(label="Enviar a Selección...", command=self.enviar_correo_seleccion)
+        menu_correo.add_command(label="Enviar a Categoría...", command=self.enviar_correo_categoria)
+        menu_correo.add_command(label="Reanudar Envío Pendiente...", command=self.reanudar_envio)
+        menu_correo.add_separator()
+        menu_correo.add_command(label="Correos de Selección por Lotes...",
+                                command=lambda: self.abrir_lotes_correos(self.origen_seleccion_activa()))
+        menu_correo.add_command(label="Correos de Categoría por Lotes...",
+                                command=lambda: self.abrir_lotes_correos(self.origen_categoria_activa()))
+        barra_menu.add_cascade(label="Correo", menu=menu_correo)
+        self.root.config(menu=barra_menu)
+
+    def mostrar_informe_conexion(self):
+        """Mostrar los PRAGMA aplicados al abrir la base de datos"""
+        messagebox.showinfo("Configuración de Conexión",
+                            f"{self.ruta_bd}\n\n{formatear_informe(self.informe_conexion)}")
+
+    def mantenimiento_programado(self):
+        """Ejecutar en segundo plano las tareas de mantenimiento baratas que tocan
+
+        Sólo ``TAREAS_DESATENDIDAS`` (ANALYZE, PRAGMA optimize): el respaldo y
+        VACUUM se lanzan desde el menú Base de Datos o con ``mantenimiento
+        programado``. Sin nadie esperándolas, los fallos no abren diálogos.
+        """
+        def ejecutar(progreso, cancelacion):
+            return ejecutar_programadas(self.ruta_bd, TAREAS_DESATENDIDAS, cancelacion=cancelacion)
+        
+        def fallar(error):
+            print(f"Error en el mantenimiento programado: {error}", file=sys.stderr)
+        
+        TareaSegundoPlano(self.root, ejecutar, lambda *datos: None, lambda realizadas: None,
+                          fallar).iniciar()
+
+    def ejecutar_mantenimiento(self, titulo, tarea, mensaje):
+        """Ejecutar una tarea de ``mantenimiento`` con su propia conexión y barra de progreso"""
+        def ejecutar(progreso, cancelacion):
+            conn = abrir_conexion(self.ruta_bd)
+            try:
+                return ejecutar_tarea(conn, self.ruta_bd, tarea, progreso, cancelacion)
+            finally:
+                conn.close()
+        
+        self.ejecutar_con_progreso(
+            titulo, ejecutar, lambda resultado: messagebox.showinfo(titulo, mensaje(resultado)),
+            unidad="páginas")
+
+    def crear_respaldo(self):
+        """Copia en caliente de la base de datos a un archivo elegido"""
+        ruta = filedialog.asksaveasfilename(
+            title="Crear Respaldo", defaultextension=".db",
+            initialfile=os.path.basename(ruta_respaldo(self.ruta_bd)),
+            filetypes=[("Base de datos SQLite", "*.db")])
+        if not ruta:
+            return
+        
+        def ejecutar(progreso, cancelacion):
+            return respaldar(self.ruta_bd, ruta, progreso=progreso, cancelacion=cancelacion)
+        
+        def terminar(resumen):
+            if resumen.cancelado:
+                messagebox.showinfo("Respaldo", "Respaldo cancelado")
+            else:
+                messagebox.showinfo("Éxito", f"Respaldo guardado en {resumen.ruta}")
+        
+        self.ejecutar_con_progreso("Creando Respaldo", ejecutar, terminar, unidad="páginas")
+
+    def comprobar_integridad(self):
+        self.ejecutar_mantenimiento(
+            "Comprobar Integridad", 'integridad',
+            lambda resultado: "La base de datos está íntegra." if resultado == "ok" else
+            f"Se encontraron {resultado}.\nEjecute 'python -m cartronic mantenimiento "
+            "integridad' para ver el detalle.")
+
+    def optimizar_base_datos(self):
+        self.ejecutar_mantenimiento("Optimizar Base de Datos", 'analizar',
+                                    lambda resultado: "Estadísticas actualizadas.")
+
+    def compactar_base_datos(self):
+        if not messagebox.askyesno(
+                "Compactar Base de Datos",
+                "VACUUM reescribe todo el archivo y bloquea los cambios mientras dura.\n¿Continuar?"):
+            return
+        self.ejecutar_mantenimiento("Compactar Base de Datos", 'compactar',
+                                    lambda resultado: f"Base de datos compactada: {resultado}")
+
+    def abrir_diagnostico(self):
+        """Ventana con las últimas consultas y pasos de la interfaz medidos"""
+        registro = instrumentacion.activa()
+        if registro is None:
+            messagebox.showinfo(
+                "Diagnóstico de Consultas",
+                "La instrumentación está desactivada.\n\n"
+                "Actívela con \"instrumentacion\": true en conexion.json o con la "
+                "variable de entorno CARTRONIC_INSTRUMENTACION=1 y reinicie la aplicación.")
+            return
+        
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Diagnóstico de Consultas")
+        ventana.geometry("900x500")
+        
+        columnas = ('Hora', 'Tipo', 'Hilo', 'ms', 'Filas', 'Plan', 'Detalle')
+        tabla = ttk.Treeview(ventana, columns=columnas, show='headings', height=15)
+        anchos = (90, 50, 110, 70, 60, 90, 400)
+        for columna, ancho in zip(columnas, anchos):
+            tabla.heading(columna, text=columna)
+            tabla.column(columna, width=ancho, stretch=columna == 'Detalle')
+        tabla.tag_configure('lento', background='#f8d7da')
+        tabla.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        detalle = tk.Text(ventana, height=8)
+        detalle.pack(fill=tk.X, padx=5)
+        
+        solo_lentos = tk.BooleanVar(value=False)
+        registros = []
+        
+        def actualizar():
+            registros[:] = [r for r in reversed(registro.instantanea())
+                            if not solo_lentos.get() or r.get('escaneo_completo')
+                            or r['duracion_ms'] >= 100]
+            tabla.delete(*tabla.get_children())
+            for indice, r in enumerate(registros):
+                plan = "escaneo" if r.get('escaneo_completo') else ("índice" if r.get('plan') else "")
+                filas = r.get('filas', r.get('filas_afectadas'))
+                lento = r.get('escaneo_completo') or r['duracion_ms'] >= 100
+                tabla.insert('', tk.END, iid=str(indice), tags=('lento',) if lento else (), values=(
+                    datetime.datetime.fromtimestamp(r['momento']).strftime('%H:%M:%S.%f')[:-3],
+                    r['tipo'], r['hilo'], f"{r['duracion_ms']:.2f}",
+                    "" if filas is None or filas < 0 else filas, plan, r['etiqueta']))
+        
+        def mostrar_detalle(event):
+            seleccion = tabla.selection()
+            if not seleccion:
+                return
+            r = registros[int(seleccion[0])]
+            texto = r.get('sql') or r['etiqueta']
+            if r.get('plan'):
+                texto += "\n\nPlan:\n" + "\n".join(r['plan'])
+            if r.get('sentencias'):
+                texto += "\n\nSentencias ejecutadas:\n" + "\n".join(r['sentencias'])
+            if r.get('error'):
+                texto += f"\n\nError: {r['error']}"
+            detalle.delete("1.0", tk.END)
+            detalle.insert("1.0", texto)
+        
+        tabla.bind('<<TreeviewSelect>>', mostrar_detalle)
+        
+        botones = ttk.Frame(ventana)
+        botones.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Checkbutton(botones, text="Sólo escaneos completos y lentos (≥ 100 ms)",
+                        variable=solo_lentos, command=actualizar).pack(side=tk.LEFT)
+        ttk.Button(botones, text="Limpiar",
+                   command=lambda: (registro.limpiar(), actualizar())).pack(side=tk.RIGHT)
+        ttk.Button(botones, text="Actualizar", command=actualizar).pack(side=tk.RIGHT, padx=5)
+        if registro.ruta_registro:
+            ttk.Label(botones, text=f"Registro: {registro.ruta_registro}").pack(side=tk.RIGHT, padx=10)
+        actualizar()
+
     def crear_componentes(self):
         """Crear y organizar componentes de la interfaz"""
         marco_principal = ttk.Frame(self.root)
@@ -133,6 +350,9 @@ class ClientDatabaseApp:
         entrada_busqueda = ttk.Entry(marco_filtro_nombre, textvariable=self.variable_busqueda, width=40)
         entrada_busqueda.pack(side=tk.LEFT, padx=5)
         entrada_busqueda.bind("<KeyRelease>", self.buscar_clientes)
+        self.variable_difusa = tk.BooleanVar(value=False)
+        ttk.Checkbutton(marco_filtro_nombre, text="Búsqueda aproximada", variable=self.variable_difusa,
+                        command=self.buscar_clientes).pack(side=tk.LEFT, padx=5)
 
         # Filtro por categoría
         marco_filtro_categoria = ttk.Frame(marco_busqueda)
@@ -162,12 +382,31 @@ class ClientDatabaseApp:
         self.tabla_clientes.column('Categoría', width=100)
         
         self.tabla_clientes.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
+        # Ordenación en SQLite al pulsar un encabezado (Mayús+clic añade un criterio)
+        self.tabla_clientes.bind('<Button-1>', self.clic_encabezado, add='+')
         
         scrollbar = ttk.Scrollbar(marco_busqueda, orient="vertical", command=self.tabla_clientes.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.tabla_clientes.configure(yscrollcommand=scrollbar.set)
+        self.tabla_clientes.tag_configure('selected', background='#b0e0e6')
+        self.tabla_clientes.bind('<Delete>', lambda event: self.eliminar_clientes_lote())
+        
+        # Resultados grandes: sólo se materializan las filas visibles
+        self.tabla_virtual = TablaVirtual(
+            self.tabla_clientes, scrollbar, self.leer_pagina, self.pintar_filas)
 
         
+        # Selección guardada activa
+        marco_seleccion = ttk.Frame(panel_derecho)
+        marco_seleccion.pack(pady=(10, 0), fill=tk.X)
+        
+        ttk.Label(marco_seleccion, text="Selección:").pack(side=tk.LEFT, padx=5)
+        self.combo_selecciones = ttk.Combobox(marco_seleccion, state="readonly", width=35)
+        self.combo_selecciones.pack(side=tk.LEFT, padx=5)
+        self.combo_selecciones.bind("<<ComboboxSelected>>", self.cambiar_seleccion)
+        ttk.Button(marco_seleccion, text="Nueva Selección", command=self.nueva_seleccion).pack(side=tk.LEFT, padx=5)
+        ttk.Button(marco_seleccion, text="Eliminar Selección", command=self.eliminar_seleccion).pack(side=tk.LEFT, padx=5)
+        
         # Botones de acción modificados
         marco_botones = ttk.Frame(panel_derecho)
         marco_botones.pack(pady=10, fill=tk.X)
@@ -175,7 +414,7 @@ class ClientDatabaseApp:
         ttk.Button(marco_botones, text="Añadir a Selección", command=self.anadir_seleccion).pack(side=tk.LEFT, padx=5)
         ttk.Button(marco_botones, text="Copiar Correos", command=self.copiar_correos).pack(side=tk.LEFT, padx=5)
         ttk.Button(marco_botones, text="Limpiar Selección", command=self.limpiar_seleccion).pack(side=tk.LEFT, padx=5)
-        # ttk.Button(marco_botones, text="Enviar Correo", command=self.abrir_editor_correo).pack(side=tk.LEFT, padx=5)
+        ttk.Button(marco_botones, text="Enviar Correo", command=self.enviar_correo_seleccion).pack(side=tk.LEFT, padx=5)
         ttk.Button(marco_botones, text="Modificar Cliente", command=self.modificar_cliente).pack(side=tk.LEFT, padx=5)
         ttk.Button(marco_botones, text="Copiar Correos Categoría", 
                  command=self.copiar_correos_categoria).pack(side=tk.RIGHT, padx=5)
@@ -186,9 +425,7 @@ class ClientDatabaseApp:
     def cargar_categorias(self):
         """Cargar categorías desde la base de datos"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT id, nombre FROM categorias")
-            self.categorias = cursor.fetchall()
+            self.categorias = self.repositorio.listar_categorias()
             self.combo_categorias['values'] = [cat[1] for cat in self.categorias]
             if self.categorias:
                 self.combo_categorias.current(0)
@@ -230,7 +467,7 @@ class ClientDatabaseApp:
             return
             
         nombre_categoria = self.lista_categorias.get(seleccionado)
-        if nombre_categoria == "Clientes":
+        if nombre_categoria == CATEGORIA_POR_DEFECTO:
             messagebox.showerror("Error", "No se puede eliminar la categoría por defecto")
             return
             
@@ -243,19 +480,8 @@ class ClientDatabaseApp:
             return
             
         try:
-            cursor = self.conn.cursor()
-            
-            # Obtener ID de la categoría a eliminar
-            cursor.execute("SELECT id FROM categorias WHERE nombre = ?", (nombre_categoria,))
-            categoria_id = cursor.fetchone()[0]
-            
-            # Mover clientes a categoría por defecto
-            cursor.execute("UPDATE clientes SET categoria_id = 1 WHERE categoria_id = ?", (categoria_id,))
-            
-            # Eliminar categoría
-            cursor.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
-            
-            self.conn.commit()
+            # Los clientes pasan a la categoría por defecto
+            self.repositorio.eliminar_categoria(nombre_categoria)
             
             # Actualizar interfaz
             self.cargar_categorias()
@@ -265,7 +491,6 @@ class ClientDatabaseApp:
             messagebox.showinfo("Éxito", f"Categoría '{nombre_categoria}' eliminada correctamente")
             
         except Exception as e:
-            self.conn.rollback()
             messagebox.showerror("Error", f"No se pudo eliminar la categoría: {str(e)}")
         
     def agregar_categoria(self, nombre, dialogo):
@@ -275,9 +500,7 @@ class ClientDatabaseApp:
             return
             
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
-            self.conn.commit()
+            self.repositorio.agregar_categoria(nombre)
             self.cargar_categorias()
             dialogo.destroy()
             messagebox.showinfo("Éxito", "¡Categoría agregada correctamente!")
@@ -299,24 +522,133 @@ class ClientDatabaseApp:
             return
             
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT id FROM categorias WHERE nombre = ?", (categoria,))
-            categoria_id = cursor.fetchone()[0]
-            
-            cursor.execute(
-                """INSERT INTO clientes 
-                (nombre, correo, telefono, contacto, categoria_id) 
-                VALUES (?, ?, ?, ?, ?)""",
-                (nombre, correo, telefono, contacto, categoria_id))
-            self.conn.commit()
+            cliente_id = self.repositorio.agregar_cliente(nombre, correo, telefono, contacto, categoria)
             messagebox.showinfo("Éxito", "¡Cliente agregado correctamente!")
             self.limpiar_campos()
-            self.buscar_clientes()
+            self.refrescar_cliente(cliente_id)
         except sqlite3.IntegrityError:
             messagebox.showerror("Error", "¡El correo electrónico ya existe en la base de datos!")
         except Exception as e:
             messagebox.showerror("Error de Base de Datos", f"Error al agregar cliente: {e}")
 
+    def importar_archivo(self):
+        """Importar clientes desde un archivo CSV o XLSX en segundo plano"""
+        ruta = filedialog.askopenfilename(
+            title="Importar Clientes",
+            filetypes=[("CSV o Excel", "*.csv *.xlsx"), ("Todos los archivos", "*.*")])
+        if not ruta:
+            return
+        
+        def importar(progreso, cancelacion):
+            # Conexión propia: la tarea corre fuera del hilo de Tk
+            conn = abrir_conexion(self.ruta_bd)
+            try:
+                return importar_clientes(conn, ruta, progreso=progreso, cancelacion=cancelacion)
+            finally:
+                conn.close()
+        
+        def terminar(resumen):
+            # La importación escribe con otra conexión, fuera del repositorio
+            self.cache_busquedas.invalidar()
+            self.cargar_categorias()
+            self.buscar_clientes()
+            mensaje = f"{resumen.insertados} clientes importados, {resumen.rechazados} rechazados."
+            if resumen.cancelado:
+                mensaje = "Importación cancelada. " + mensaje
+            if resumen.ruta_rechazos:
+                mensaje += f"\nFilas rechazadas en {resumen.ruta_rechazos}"
+            messagebox.showinfo("Importación", mensaje)
+        
+        self.ejecutar_con_progreso("Importando Clientes", importar, terminar)
+
+    def exportar_resultados(self):
+        """Exportar los clientes que cumplen los filtros de búsqueda actuales"""
+        self.exportar(self.filtro_resultados(), "clientes")
+
+    def exportar_categoria(self):
+        """Exportar todos los clientes de la categoría seleccionada"""
+        categoria_seleccionada = self.combo_categorias.get()
+        if not categoria_seleccionada:
+            messagebox.showwarning("Advertencia", "¡Ninguna categoría seleccionada!")
+            return
+        self.exportar(filtro_categoria(categoria_seleccionada), categoria_seleccionada)
+
+    def exportar_seleccion(self):
+        """Exportar todos los clientes de la selección activa"""
+        if not self.repositorio.contar_seleccion(self.seleccion_id):
+            messagebox.showwarning("Advertencia", "La selección está vacía")
+            return
+        self.exportar(filtro_seleccion(self.seleccion_id), self.nombre_seleccion())
+
+    def exportar(self, filtro, nombre_sugerido):
+        """Pedir el archivo de destino y exportar en segundo plano"""
+        ruta = filedialog.asksaveasfilename(
+            title="Exportar Clientes", initialfile=f"{nombre_sugerido}.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet", "*.parquet")])
+        if not ruta:
+            return
+        
+        def exportar(progreso, cancelacion):
+            conn = abrir_conexion(self.ruta_bd)
+            try:
+                return exportar_clientes(conn, filtro, ruta, progreso=progreso,
+                                         cancelacion=cancelacion)
+            finally:
+                conn.close()
+        
+        def terminar(resumen):
+            if resumen.cancelado:
+                messagebox.showinfo("Exportación", "Exportación cancelada")
+            else:
+                messagebox.showinfo("Éxito", f"¡{resumen.exportadas} clientes exportados!")
+        
+        self.ejecutar_con_progreso("Exportando Clientes", exportar, terminar)
+
+    def ejecutar_con_progreso(self, titulo, funcion, al_terminar, unidad="filas"):
+        """Ejecutar una tarea larga en segundo plano con barra de progreso
+
+        ``funcion(progreso, cancelacion)`` informa con ``progreso(procesadas,
+        fraccion)``; si la fracción es None la barra queda indeterminada.
+        """
+        dialogo = tk.Toplevel(self.root)
+        dialogo.title(titulo)
+        dialogo.transient(self.root)
+        
+        etiqueta = ttk.Label(dialogo, text="Iniciando...")
+        etiqueta.pack(padx=20, pady=(20, 5))
+        barra = ttk.Progressbar(dialogo, length=320, maximum=100)
+        barra.pack(padx=20, pady=5)
+        boton_cancelar = ttk.Button(dialogo, text="Cancelar")
+        boton_cancelar.pack(pady=(5, 15))
+        
+        def progresar(procesadas, fraccion):
+            etiqueta.config(text=f"{procesadas} {unidad} procesadas")
+            if fraccion is None:
+                barra.config(mode="indeterminate")
+                barra.step(5)
+            else:
+                barra.config(mode="determinate", value=fraccion * 100)
+        
+        def terminar(resultado):
+            dialogo.destroy()
+            al_terminar(resultado)
+        
+        def fallar(error):
+            dialogo.destroy()
+            messagebox.showerror("Error", f"{titulo}: {error}")
+        
+        tarea = TareaSegundoPlano(self.root, funcion, progresar, terminar, fallar)
+        
+        def cancelar():
+            boton_cancelar.config(state="disabled")
+            etiqueta.config(text="Cancelando...")
+            tarea.cancelar()
+        
+        boton_cancelar.config(command=cancelar)
+        dialogo.protocol("WM_DELETE_WINDOW", cancelar)
+        tarea.iniciar()
+
     def limpiar_campos(self):
         """Limpiar campos de entrada"""
         self.entrada_nombre.delete(0, tk.END)
@@ -325,65 +657,280 @@ class ClientDatabaseApp:
         self.entrada_contacto.delete(0, tk.END)
 
 
+    def cargar_selecciones(self):
+        """Cargar las selecciones guardadas y marcar la activa"""
+        try:
+            self.selecciones = self.repositorio.listar_selecciones()
+        except Exception as e:
+            messagebox.showerror("Error de Base de Datos", f"Error al cargar selecciones: {e}")
+            return
+        self.combo_selecciones['values'] = [
+            f"{nombre} ({cantidad})" for _, nombre, cantidad in self.selecciones]
+        ids = [seleccion[0] for seleccion in self.selecciones]
+        if self.seleccion_id not in ids:
+            self.seleccion_id = ID_SELECCION_POR_DEFECTO
+        if self.seleccion_id in ids:
+            self.combo_selecciones.current(ids.index(self.seleccion_id))
+
+    def nombre_seleccion(self):
+        """Nombre de la selección activa"""
+        return next((nombre for seleccion_id, nombre, _ in self.selecciones
+                     if seleccion_id == self.seleccion_id), "")
+
+    def cambiar_seleccion(self, event=None):
+        """Activar la selección elegida en el desplegable"""
+        self.seleccion_id = self.selecciones[self.combo_selecciones.current()][0]
+        self.repintar_marcas()
+
+    def nueva_seleccion(self):
+        """Crear una selección vacía y activarla"""
+        nombre = simpledialog.askstring("Nueva Selección", "Nombre de la selección:", parent=self.root)
+        if not nombre or not nombre.strip():
+            return
+        try:
+            self.seleccion_id = self.repositorio.crear_seleccion(nombre.strip())
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", "¡Ya existe una selección con ese nombre!")
+            return
+        self.cargar_selecciones()
+        self.repintar_marcas()
+
+    def eliminar_seleccion(self):
+        """Eliminar la selección activa (los clientes no se eliminan)"""
+        nombre = self.nombre_seleccion()
+        if not messagebox.askyesno("Confirmar", f"¿Eliminar la selección '{nombre}'?"):
+            return
+        try:
+            self.repositorio.eliminar_seleccion(self.seleccion_id)
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+            return
+        self.seleccion_id = ID_SELECCION_POR_DEFECTO
+        self.cargar_selecciones()
+        self.repintar_marcas()
+
     def anadir_seleccion(self):
-        """Añadir clientes seleccionados a la selección persistente"""
-        correos_actuales = self.obtener_correos_seleccionados()
-        self.seleccion_persistente.update(correos_actuales)
-        messagebox.showinfo("Éxito", f"Se añadieron {len(correos_actuales)} correos a la selección")
+        """Añadir a la selección activa las filas marcadas o, si no hay, toda la búsqueda"""
+        seleccionados = self.tabla_clientes.selection()
+        try:
+            if seleccionados:
+                anadidos = self.repositorio.anadir_a_seleccion(
+                    self.seleccion_id, [int(iid) for iid in seleccionados])
+            elif self.resultado_actual is not None and messagebox.askyesno(
+                    "Añadir a Selección",
+                    "Ninguna fila seleccionada. ¿Añadir todos los resultados de la búsqueda?"):
+                anadidos = self.repositorio.anadir_filtro_a_seleccion(
+                    self.seleccion_id, self.filtro_resultados())
+            else:
+                return
+        except Exception as e:
+            messagebox.showerror("Error de Base de Datos", f"Error al añadir a la selección: {e}")
+            return
+        self.repintar_marcas()
+        self.cargar_selecciones()
+        messagebox.showinfo("Éxito", f"Se añadieron {anadidos} clientes a la selección")
 
     def limpiar_seleccion(self):
-        """Limpiar la selección persistente"""
-        self.seleccion_persistente.clear()
+        """Vaciar la selección activa"""
+        self.repositorio.vaciar_seleccion(self.seleccion_id)
+        self.repintar_marcas()
+        self.cargar_selecciones()
         messagebox.showinfo("Información", "Selección limpiada correctamente")
 
     def copiar_correos(self):
-        """Copiar correos de la selección persistente"""
-        if self.seleccion_persistente:
-            pyperclip.copy(", ".join(self.seleccion_persistente))
-            messagebox.showinfo("Éxito", f"¡{len(self.seleccion_persistente)} correos copiados!")
+        """Copiar correos de la selección activa (por lotes si son muchos)"""
+        if self.repositorio.contar_seleccion(self.seleccion_id) > TAMANO_LOTE:
+            self.abrir_lotes_correos(self.origen_seleccion_activa())
+            return
+        correos = self.repositorio.correos_seleccion(self.seleccion_id)
+        if correos:
+            import pyperclip
+            pyperclip.copy(", ".join(correos))
+            messagebox.showinfo("Éxito", f"¡{len(correos)} correos copiados!")
         else:
             messagebox.showwarning("Advertencia", "No hay correos seleccionados")
 
     def buscar_clientes(self, event=None):
-        """Buscar clientes con múltiples filtros"""
+        """Buscar clientes con múltiples filtros
+
+        Las pulsaciones de teclado (``event``) se agrupan antes de consultar;
+        las llamadas directas tras una modificación se lanzan de inmediato.
+        """
         termino_nombre = self.variable_busqueda.get().strip()
         termino_categoria = self.variable_categoria.get().strip()
+        self.programador_busqueda.programar(
+            termino_nombre, termino_categoria, inmediato=event is None,
+            difusa=self.variable_difusa.get(), orden=tuple(self.orden),
+            seleccion_id=self.seleccion_id)
+
+    def clic_encabezado(self, event):
+        """Ordenar por la columna cuyo encabezado se ha pulsado"""
+        if self.tabla_clientes.identify_region(event.x, event.y) != 'heading':
+            return
+        indice = int(self.tabla_clientes.identify_column(event.x)[1:]) - 1
+        columna = list(COLUMNAS_TABLA.values())[indice]
+        self.cambiar_orden(columna, anadir=bool(event.state & 0x0001))  # Mayús
+
+    def cambiar_orden(self, columna, anadir=False):
+        """Pasar ``columna`` a ascendente, descendente o sin orden, por turnos
+
+        Sin ``anadir`` la columna sustituye a los criterios anteriores; con
+        ``anadir`` se agrega (o cambia) como criterio secundario. La consulta
+        se repite con el nuevo ORDER BY en lugar de reordenar los items de Tk.
+        """
+        posicion = next((i for i, (clave, _) in enumerate(self.orden) if clave == columna), None)
+        if anadir:
+            orden = list(self.orden)
+        else:
+            orden = self.orden[:1] if posicion == 0 else []
+            posicion = 0 if posicion == 0 else None
+        if posicion is None:
+            orden.append((columna, False))
+        elif not orden[posicion][1]:
+            orden[posicion] = (columna, True)
+        else:
+            del orden[posicion]
+        self.orden = orden
+        self.actualizar_encabezados()
+        self.buscar_clientes()
+
+    def actualizar_encabezados(self):
+        """Marcar en los encabezados el sentido (y la prioridad) de cada criterio"""
+        for texto, columna in COLUMNAS_TABLA.items():
+            indicador = ""
+            for prioridad, (clave, descendente) in enumerate(self.orden, 1):
+                if clave == columna:
+                    indicador = " ▼" if descendente else " ▲"
+                    if len(self.orden) > 1:
+                        indicador += str(prioridad)
+            self.tabla_clientes.heading(texto, text=texto + indicador)
+
+    def filtro_resultados(self):
+        """Filtro que reproduce el resultado mostrado en la tabla
+
+        Una búsqueda aproximada no se puede expresar como condición SQL, así
+        que se usa la lista de ids que devolvió.
+        """
+        resultado = self.resultado_actual
+        if resultado is None:
+            return self.repositorio.filtro(self.variable_busqueda.get().strip(),
+                                           self.variable_categoria.get().strip())
+        if resultado.difusa:
+            return filtro_ids(fila[0] for fila in resultado.filas)
+        return self.repositorio.filtro(resultado.termino_nombre, resultado.termino_categoria)
+
+    @instrumentar_ui('mostrar_resultados')
+    def mostrar_resultados(self, resultado):
+        """Mostrar en la tabla el resultado de la búsqueda más reciente"""
+        self.resultado_actual = resultado
+        if resultado.total is None:
+            self.tabla_virtual.desactivar()
+            self.pintar_filas(resultado.filas)
+        else:
+            self.tabla_virtual.activar(resultado.total, resultado.filas)
+
+    @instrumentar_ui('pintar_filas')
+    def pintar_filas(self, clientes):
+        """Reconciliar la tabla con las filas indicadas
+
+        Los items se identifican por ``clientes.id``: sólo se eliminan,
+        insertan o actualizan los que difieren de lo que ya está pintado. La
+        última columna de cada fila indica si está en la selección activa.
+        """
+        nuevos = {str(cliente[0]) for cliente in clientes}
+        obsoletos = [iid for iid in self.tabla_clientes.get_children() if iid not in nuevos]
+        if obsoletos:
+            self.tabla_clientes.delete(*obsoletos)
+            for iid in obsoletos:
+                del self.filas_tabla[iid]
         
-        try:
-            cursor = self.conn.cursor()
-            query = """
-                SELECT c.nombre, c.contacto, c.telefono, c.correo, cat.nombre 
-                FROM clientes c
-                JOIN categorias cat ON c.categoria_id = cat.id
-                WHERE (c.nombre LIKE ? OR c.contacto LIKE ?)
-                AND cat.nombre LIKE ?
-            """
-            params = (
-                f"%{termino_nombre}%",
-                f"%{termino_nombre}%",
-                f"%{termino_categoria}%"
-            )
-            
-            cursor.execute(query, params)
-            
-            self.tabla_clientes.delete(*self.tabla_clientes.get_children())
-            
-            # Resaltar selecciones persistentes
-            for cliente in cursor.fetchall():
-                item = self.tabla_clientes.insert('', tk.END, values=cliente)
-                if cliente[3] in self.seleccion_persistente:
-                    self.tabla_clientes.item(item, tags=('selected',))
-            
-            self.tabla_clientes.tag_configure('selected', background='#b0e0e6')
-            
-        except Exception as e:
-            messagebox.showerror("Error de Base de Datos", f"Error en la búsqueda: {e}")
+        # Si los items que permanecen conservan su orden basta con insertar
+        permanecen = list(self.tabla_clientes.get_children())
+        mismo_orden = permanecen == [str(c[0]) for c in clientes if str(c[0]) in self.filas_tabla]
+        
+        # Resaltar selecciones persistentes
+        for indice, cliente in enumerate(clientes):
+            iid = str(cliente[0])
+            valores = cliente[1:6]
+            tags = ('selected',) if cliente[6] else ()
+            pintado = self.filas_tabla.get(iid)
+            if pintado is None:
+                self.tabla_clientes.insert('', indice, iid=iid, values=valores, tags=tags)
+            else:
+                if pintado != (valores, tags):
+                    self.tabla_clientes.item(iid, values=valores, tags=tags)
+                if not mismo_orden:
+                    self.tabla_clientes.move(iid, '', indice)
+            self.filas_tabla[iid] = (valores, tags)
 
-    
-    def obtener_correos_seleccionados(self):
-        """Obtener correos de clientes seleccionados"""
-        seleccionados = self.tabla_clientes.selection()
-        return [self.tabla_clientes.item(item)['values'][3] for item in seleccionados]
+    def refrescar_cliente(self, cliente_id):
+        """Reflejar en la tabla el alta o la modificación de un único cliente"""
+        self.refrescar_clientes([cliente_id])
+
+    @instrumentar_ui('refrescar_clientes')
+    def refrescar_clientes(self, cliente_ids):
+        """Reflejar en la tabla, con una sola consulta, los cambios de varios clientes"""
+        if self.resultado_actual is None:
+            self.buscar_clientes()
+            return
+        
+        filtro = self.filtro_resultados()
+        if self.tabla_virtual.activa:
+            self.tabla_virtual.recargar(self.repositorio.contar(filtro))
+            return
+        if self.resultado_actual.orden:
+            # Un cambio puede mover la fila de sitio: se repite la consulta ordenada
+            self.buscar_clientes()
+            return
+        
+        clientes = {cliente[0]: cliente for cliente in self.repositorio.clientes_en_filtro(
+            filtro, cliente_ids, seleccion_id=self.seleccion_id)}
+        fuera_de_filtro = [str(i) for i in cliente_ids
+                           if i not in clientes and str(i) in self.filas_tabla]
+        if fuera_de_filtro:
+            self.tabla_clientes.delete(*fuera_de_filtro)
+            for iid in fuera_de_filtro:
+                del self.filas_tabla[iid]
+        
+        for cliente_id, cliente in clientes.items():
+            iid = str(cliente_id)
+            valores = cliente[1:6]
+            tags = ('selected',) if cliente[6] else ()
+            if iid in self.filas_tabla:
+                self.tabla_clientes.item(iid, values=valores, tags=tags)
+            else:
+                self.tabla_clientes.insert('', tk.END, iid=iid, values=valores, tags=tags)
+            self.filas_tabla[iid] = (valores, tags)
+
+    def repintar_marcas(self):
+        """Actualizar el resaltado de las filas pintadas según la selección activa
+
+        Las filas se vuelven a leer con la marca de la selección; en modo
+        virtual se relee la ventana de precarga, cuyas marcas ya no valen.
+        """
+        if self.tabla_virtual.activa:
+            self.tabla_virtual.recargar(self.tabla_virtual.total)
+            return
+        for cliente in self.repositorio.clientes_en_filtro(
+                self.repositorio.filtro(), [int(iid) for iid in self.filas_tabla],
+                seleccion_id=self.seleccion_id):
+            iid = str(cliente[0])
+            valores, tags = self.filas_tabla[iid]
+            nuevos = ('selected',) if cliente[6] else ()
+            if nuevos != tags:
+                self.tabla_clientes.item(iid, tags=nuevos)
+                self.filas_tabla[iid] = (valores, nuevos)
+
+    def leer_pagina(self, limite, despues_de_id=None, antes_de_id=None, posicion=0):
+        """Leer una página del resultado actual, en su orden, para la tabla virtual"""
+        orden = self.resultado_actual.orden if self.resultado_actual is not None else ()
+        return self.repositorio.pagina(self.filtro_resultados(), limite, despues_de_id=despues_de_id,
+                                       antes_de_id=antes_de_id, posicion=posicion, orden=orden,
+                                       seleccion_id=self.seleccion_id)
+
+    def mostrar_error_busqueda(self, error):
+        """Informar de un error producido en el hilo de búsqueda"""
+        messagebox.showerror("Error de Base de Datos", f"Error en la búsqueda: {error}")
 
 
 
@@ -394,15 +941,246 @@ class ClientDatabaseApp:
             messagebox.showwarning("Advertencia", "Ningún cliente seleccionado")
             return
             
-        valores_cliente = self.tabla_clientes.item(seleccionado[0])['values']
-        cliente_id = self.obtener_id_cliente(valores_cliente[3])
-        self.abrir_dialogo_modificacion(cliente_id, valores_cliente)
+        valores_cliente = self.filas_tabla[seleccionado[0]][0]
+        self.abrir_dialogo_modificacion(int(seleccionado[0]), valores_cliente)
+
+    def clientes_para_accion(self):
+        """Ids sobre los que actúa una operación en lote y su descripción
+
+        Se usan las filas seleccionadas en la tabla o, si no hay ninguna, la
+        selección guardada activa. Devuelve None (tras avisar) si ambas están vacías.
+        """
+        seleccionados = self.tabla_clientes.selection()
+        if seleccionados:
+            return [int(iid) for iid in seleccionados], f"{len(seleccionados)} clientes seleccionados"
+        ids = self.repositorio.ids_seleccion(self.seleccion_id)
+        if ids:
+            return ids, f"{len(ids)} clientes de la selección {self.nombre_seleccion()}"
+        messagebox.showwarning("Advertencia", "Ningún cliente seleccionado")
+        return None
+
+    def mover_clientes_lote(self):
+        """Pasar los clientes seleccionados a otra categoría"""
+        objetivo = self.clientes_para_accion()
+        if objetivo is None:
+            return
+        cliente_ids, descripcion = objetivo
+        
+        dialogo = tk.Toplevel(self.root)
+        dialogo.title("Mover a Categoría")
+        ttk.Label(dialogo, text=f"Mover {descripcion} a:").grid(row=0, column=0, padx=10, pady=10)
+        combo_categorias = ttk.Combobox(
+            dialogo, values=[nombre for _, nombre in self.repositorio.listar_categorias()],
+            state="readonly")
+        combo_categorias.grid(row=0, column=1, padx=10, pady=10)
+        
+        def mover():
+            categoria = combo_categorias.get()
+            if not categoria:
+                messagebox.showwarning("Error de Entrada", "¡Seleccione una categoría!")
+                return
+            try:
+                movidos = self.repositorio.mover_clientes(cliente_ids, categoria)
+            except Exception as e:
+                messagebox.showerror("Error de Base de Datos", f"Error al mover clientes: {e}")
+                return
+            dialogo.destroy()
+            self.refrescar_clientes(cliente_ids)
+            messagebox.showinfo("Éxito", f"¡{movidos} clientes movidos a {categoria}!")
+        
+        ttk.Button(dialogo, text="Mover", command=mover).grid(row=1, column=1, pady=10, sticky="e")
+
+    def eliminar_clientes_lote(self):
+        """Eliminar los clientes seleccionados tras confirmarlo"""
+        objetivo = self.clientes_para_accion()
+        if objetivo is None:
+            return
+        cliente_ids, descripcion = objetivo
+        if not messagebox.askyesno("Confirmar", f"¿Eliminar {descripcion}?\n"
+                                   "Esta acción no se puede deshacer."):
+            return
+        try:
+            correos = self.repositorio.eliminar_clientes(cliente_ids)
+        except Exception as e:
+            messagebox.showerror("Error de Base de Datos", f"Error al eliminar clientes: {e}")
+            return
+        self.refrescar_clientes(cliente_ids)
+        self.cargar_selecciones()
+        messagebox.showinfo("Éxito", f"¡{len(correos)} clientes eliminados!")
 
-    def obtener_id_cliente(self, correo):
-        """Obtener ID del cliente desde su correo"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id FROM clientes WHERE correo = ?", (correo,))
-        return cursor.fetchone()[0]
+    def fusionar_clientes_lote(self):
+        """Fusionar los clientes seleccionados en uno solo, elegido por el usuario"""
+        objetivo = self.clientes_para_accion()
+        if objetivo is None:
+            return
+        cliente_ids, descripcion = objetivo
+        clientes = self.repositorio.clientes_en_filtro(self.repositorio.filtro(), cliente_ids)
+        if len(clientes) < 2:
+            messagebox.showwarning("Advertencia", "Seleccione al menos dos clientes para fusionar")
+            return
+        clientes.sort(key=lambda cliente: cliente[0])
+        
+        dialogo = tk.Toplevel(self.root)
+        dialogo.title("Fusionar Duplicados")
+        ttk.Label(dialogo, text=f"Fusionar {descripcion}. Cliente a conservar:").pack(
+            padx=10, pady=10, anchor="w")
+        lista = tk.Listbox(dialogo, height=min(len(clientes), 10), width=80)
+        lista.pack(padx=10, fill=tk.BOTH, expand=True)
+        for cliente in clientes:
+            lista.insert(tk.END, " | ".join(str(valor) for valor in cliente[1:]))
+        lista.selection_set(0)
+        
+        def fusionar():
+            seleccion = lista.curselection()
+            if not seleccion:
+                messagebox.showwarning("Advertencia", "Seleccione el cliente a conservar")
+                return
+            conservado = clientes[seleccion[0]][0]
+            try:
+                correos = self.repositorio.fusionar_clientes(
+                    conservado, [cliente[0] for cliente in clientes])
+            except Exception as e:
+                messagebox.showerror("Error de Base de Datos", f"Error al fusionar: {e}")
+                return
+            dialogo.destroy()
+            self.refrescar_clientes([cliente[0] for cliente in clientes])
+            self.cargar_selecciones()
+            messagebox.showinfo("Éxito", f"¡{len(correos)} duplicados fusionados!")
+        
+        ttk.Button(dialogo, text="Fusionar", command=fusionar).pack(pady=10, padx=10, anchor="e")
+
+    def abrir_calidad(self):
+        """Ventana de revisión de posibles duplicados y problemas de calidad
+
+        Al abrirse analiza en segundo plano los clientes cambiados desde el
+        último análisis y después muestra los resultados.
+        """
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Calidad de Datos")
+        ventana.geometry("1000x500")
+        
+        pestanas = ttk.Notebook(ventana)
+        pestanas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        marco_duplicados = ttk.Frame(pestanas)
+        pestanas.add(marco_duplicados, text="Posibles Duplicados")
+        columnas = ('Motivos', 'Nombre A', 'Correo A', 'Teléfono A', 'Nombre B', 'Correo B', 'Teléfono B')
+        tabla_duplicados = ttk.Treeview(marco_duplicados, columns=columnas, show='headings')
+        for columna in columnas:
+            tabla_duplicados.heading(columna, text=columna)
+            tabla_duplicados.column(columna, width=130)
+        tabla_duplicados.pack(fill=tk.BOTH, expand=True)
+        
+        marco_problemas = ttk.Frame(pestanas)
+        pestanas.add(marco_problemas, text="Problemas")
+        columnas = ('Nombre', 'Correo', 'Teléfono', 'Problemas')
+        tabla_problemas = ttk.Treeview(marco_problemas, columns=columnas, show='headings')
+        for columna in columnas:
+            tabla_problemas.heading(columna, text=columna)
+            tabla_problemas.column(columna, width=200)
+        tabla_problemas.pack(fill=tk.BOTH, expand=True)
+        
+        botones = ttk.Frame(ventana)
+        botones.pack(fill=tk.X, padx=5, pady=5)
+        estado = ttk.Label(botones, text="")
+        estado.pack(side=tk.LEFT)
+        
+        candidatos = {}
+        tarea = None
+        
+        def cargar():
+            candidatos.clear()
+            tabla_duplicados.delete(*tabla_duplicados.get_children())
+            for candidato in candidatos_duplicados(self.conn):
+                iid = f"{candidato[0]}-{candidato[1]}"
+                candidatos[iid] = candidato
+                tabla_duplicados.insert('', tk.END, iid=iid, values=candidato[2:])
+            tabla_problemas.delete(*tabla_problemas.get_children())
+            for problema in problemas_calidad(self.conn):
+                tabla_problemas.insert('', tk.END, iid=str(problema[0]), values=problema[1:])
+        
+        def analizar():
+            nonlocal tarea
+            if tarea is not None:
+                return
+            
+            def ejecutar(progreso, cancelacion):
+                conn = abrir_conexion(self.ruta_bd)
+                try:
+                    return analizar_calidad(conn, progreso=progreso, cancelacion=cancelacion)
+                finally:
+                    conn.close()
+            
+            def progresar(analizados, fraccion):
+                if ventana.winfo_exists():
+                    estado.config(text=f"Analizando... {analizados} clientes")
+            
+            def terminar(resumen):
+                nonlocal tarea
+                tarea = None
+                if ventana.winfo_exists():
+                    estado.config(text=f"{resumen.analizados} clientes analizados, "
+                                       f"{resumen.candidatos} posibles duplicados, "
+                                       f"{resumen.problemas} con problemas")
+                    cargar()
+            
+            def fallar(error):
+                nonlocal tarea
+                tarea = None
+                if ventana.winfo_exists():
+                    estado.config(text="")
+                    messagebox.showerror("Error", f"Error al analizar: {error}", parent=ventana)
+            
+            estado.config(text="Analizando cambios...")
+            tarea = TareaSegundoPlano(self.root, ejecutar, progresar, terminar, fallar)
+            tarea.iniciar()
+        
+        def par_seleccionado():
+            seleccion = tabla_duplicados.selection()
+            if not seleccion:
+                messagebox.showwarning("Advertencia", "Seleccione un posible duplicado", parent=ventana)
+                return None
+            return candidatos[seleccion[0]]
+        
+        def fusionar():
+            candidato = par_seleccionado()
+            if candidato is None:
+                return
+            respuesta = messagebox.askyesnocancel(
+                "Fusionar Duplicados",
+                f"¿Conservar \"{candidato[3]}\" ({candidato[4]})?\n\n"
+                f"Sí: conservar ese cliente. No: conservar \"{candidato[6]}\" ({candidato[7]}).",
+                parent=ventana)
+            if respuesta is None:
+                return
+            conservado, duplicado = candidato[:2] if respuesta else reversed(candidato[:2])
+            try:
+                self.repositorio.fusionar_clientes(conservado, [duplicado])
+            except Exception as e:
+                messagebox.showerror("Error de Base de Datos", f"Error al fusionar: {e}", parent=ventana)
+                return
+            self.refrescar_clientes(list(candidato[:2]))
+            self.cargar_selecciones()
+            analizar()
+        
+        def descartar():
+            candidato = par_seleccionado()
+            if candidato is None:
+                return
+            descartar_duplicado(self.conn, *candidato[:2])
+            tabla_duplicados.delete(f"{candidato[0]}-{candidato[1]}")
+        
+        def cerrar():
+            if tarea is not None:
+                tarea.cancelar()
+            ventana.destroy()
+        
+        ttk.Button(botones, text="Descartar", command=descartar).pack(side=tk.RIGHT)
+        ttk.Button(botones, text="Fusionar", command=fusionar).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(botones, text="Analizar Cambios", command=analizar).pack(side=tk.RIGHT)
+        ventana.protocol("WM_DELETE_WINDOW", cerrar)
+        cargar()
+        analizar()
 
     def abrir_dialogo_modificacion(self, cliente_id, valores_cliente):
         """Abrir diálogo de modificación de cliente"""
@@ -410,9 +1188,7 @@ class ClientDatabaseApp:
         dialogo.title("Modificar Cliente")
         
         # Obtener categorías actuales
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT nombre FROM categorias")
-        categorias = [fila[0] for fila in cursor.fetchall()]
+        categorias = [nombre for _, nombre in self.repositorio.listar_categorias()]
         
         ttk.Label(dialogo, text="Categoría:").grid(row=0, column=0, padx=10, pady=10)
         combo_categorias = ttk.Combobox(dialogo, values=categorias, state="readonly")
@@ -451,19 +1227,11 @@ class ClientDatabaseApp:
                 return
                 
             try:
-                cursor = self.conn.cursor()
-                cursor.execute("SELECT id FROM categorias WHERE nombre = ?", (nueva_categoria,))
-                categoria_id = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    UPDATE clientes 
-                    SET nombre=?, correo=?, telefono=?, contacto=?, categoria_id=?
-                    WHERE id=?
-                """, (nuevo_nombre, nuevo_correo, nuevo_telefono, nuevo_contacto, categoria_id, cliente_id))
-                self.conn.commit()
+                self.repositorio.actualizar_cliente(cliente_id, nuevo_nombre, nuevo_correo,
+                                                    nuevo_telefono, nuevo_contacto, nueva_categoria)
                 messagebox.showinfo("Éxito", "¡Cliente actualizado correctamente!")
                 dialogo.destroy()
-                self.buscar_clientes()
+                self.refrescar_cliente(cliente_id)
             except sqlite3.IntegrityError:
                 messagebox.showerror("Error", "¡El correo electrónico ya existe en la base de datos!")
             except Exception as e:
@@ -480,16 +1248,14 @@ class ClientDatabaseApp:
             return
             
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT correo FROM clientes 
-                WHERE categoria_id = (
-                    SELECT id FROM categorias WHERE nombre = ?
-                )
-            """, (categoria_seleccionada,))
-            correos = [fila[0] for fila in cursor.fetchall()]
+            origen = origen_categoria(categoria_seleccionada)
+            if contar_destinatarios(self.conn, origen) > TAMANO_LOTE:
+                self.abrir_lotes_correos(origen)
+                return
+            correos = self.repositorio.correos_categoria(categoria_seleccionada)
             
             if correos:
+                import pyperclip
                 pyperclip.copy(", ".join(correos))
                 messagebox.showinfo("Éxito", 
                     f"¡{len(correos)} correos copiados de {categoria_seleccionada}!")
@@ -498,65 +1264,271 @@ class ClientDatabaseApp:
         except Exception as e:
             messagebox.showerror("Error", f"Error al copiar correos: {e}")
 
-    def abrir_editor_correo(self):
-        """Abrir editor de correo electrónico"""
-        correos = self.obtener_correos_seleccionados()
-        if not correos:
-            messagebox.showwarning("Advertencia", "Ningún cliente seleccionado")
+    def origen_seleccion_activa(self):
+        return origen_seleccion(self.seleccion_id, self.nombre_seleccion())
+
+    def origen_categoria_activa(self):
+        """Origen de la categoría elegida, o None (con aviso) si no hay ninguna"""
+        categoria_seleccionada = self.combo_categorias.get()
+        if not categoria_seleccionada:
+            messagebox.showwarning("Advertencia", "¡Ninguna categoría seleccionada!")
+            return None
+        return origen_categoria(categoria_seleccionada)
+
+    def abrir_lotes_correos(self, origen):
+        """Ventana para repartir los correos de ``origen`` en lotes
+
+        Cada "Copiar Siguiente Lote" lee sólo ese lote y avanza el cursor, así
+        que una categoría de decenas de miles de correos se recorre por partes
+        sin cargarla entera ni pegar listas que el cliente de correo rechace.
+        """
+        if origen is None:
             return
-            
+        try:
+            distribucion = DistribucionCorreos(self.conn, origen)
+        except sqlite3.Error as e:
+            messagebox.showerror("Error de Base de Datos", f"Error al contar correos: {e}")
+            return
+        if not distribucion.total:
+            messagebox.showinfo("Información", f"No hay correos en {origen.descripcion}")
+            return
+        
+        ventana = tk.Toplevel(self.root)
+        ventana.title(f"Correos por Lotes - {origen.descripcion}")
+        ventana.resizable(False, False)
+        
+        marco = ttk.Frame(ventana, padding=10)
+        marco.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(marco, text=f"{origen.descripcion}: {distribucion.total} correos").grid(
+            row=0, column=0, columnspan=4, sticky=tk.W)
+        ttk.Label(marco, text="Correos por lote:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        variable_tamano = tk.IntVar(value=TAMANO_LOTE)
+        ttk.Spinbox(marco, from_=10, to=10000, increment=50, width=8,
+                    textvariable=variable_tamano).grid(row=1, column=1, sticky=tk.W, pady=5)
+        estado = ttk.Label(marco, text="")
+        estado.grid(row=2, column=0, columnspan=4, sticky=tk.W, pady=5)
+        
+        ultimo_lote = []
+        
+        def leer_tamano():
+            try:
+                tamano = variable_tamano.get()
+            except tk.TclError:
+                tamano = 0
+            if tamano <= 0:
+                messagebox.showwarning("Advertencia", "El tamaño del lote debe ser un número positivo",
+                                       parent=ventana)
+                return None
+            return tamano
+        
+        def actualizar_estado():
+            if not distribucion.lote:
+                texto = f"Lotes de {distribucion.tamano}: {distribucion.lotes_totales} en total"
+            else:
+                texto = (f"Lote {distribucion.lote} de {distribucion.lotes_totales} copiado "
+                         f"({distribucion.entregados} de {distribucion.total} correos)")
+            if distribucion.terminado:
+                texto += " - no quedan más lotes"
+            estado.config(text=texto)
+        
+        def copiar_siguiente():
+            if not distribucion.lote:
+                # El tamaño se puede cambiar hasta copiar el primer lote
+                tamano = leer_tamano()
+                if tamano is None:
+                    return
+                distribucion.tamano = tamano
+            try:
+                correos = distribucion.siguiente()
+            except sqlite3.Error as e:
+                messagebox.showerror("Error de Base de Datos", f"Error al leer el lote: {e}", parent=ventana)
+                return
+            if not correos:
+                messagebox.showinfo("Información", "Ya se copiaron todos los lotes", parent=ventana)
+                return
+            ultimo_lote[:] = correos
+            import pyperclip
+            pyperclip.copy(texto_lote(correos))
+            actualizar_estado()
+        
+        def abrir_mailto():
+            if not ultimo_lote:
+                messagebox.showwarning("Advertencia", "Primero copie un lote", parent=ventana)
+                return
+            webbrowser.open(enlace_mailto(ultimo_lote))
+        
+        def guardar_lotes():
+            tamano = leer_tamano()
+            if tamano is None:
+                return
+            directorio = filedialog.askdirectory(parent=ventana, title="Carpeta para los lotes")
+            if not directorio:
+                return
+            try:
+                archivos = escribir_lotes(self.conn, origen, directorio, tamano)
+            except (OSError, sqlite3.Error) as e:
+                messagebox.showerror("Error", f"Error al guardar los lotes: {e}", parent=ventana)
+                return
+            messagebox.showinfo("Éxito", f"{len(archivos)} lotes guardados en {directorio}\n"
+                                "(lote_mailto.html tiene un enlace mailto por lote)", parent=ventana)
+        
+        def reiniciar():
+            tamano = leer_tamano()
+            if tamano is None:
+                return
+            distribucion.tamano = tamano
+            distribucion.reiniciar()
+            ultimo_lote.clear()
+            actualizar_estado()
+        
+        ttk.Button(marco, text="Copiar Siguiente Lote", command=copiar_siguiente).grid(
+            row=3, column=0, padx=2, pady=5)
+        ttk.Button(marco, text="Abrir Lote en Correo", command=abrir_mailto).grid(
+            row=3, column=1, padx=2, pady=5)
+        ttk.Button(marco, text="Guardar Lotes...", command=guardar_lotes).grid(
+            row=3, column=2, padx=2, pady=5)
+        ttk.Button(marco, text="Reiniciar", command=reiniciar).grid(row=3, column=3, padx=2, pady=5)
+        actualizar_estado()
+
+    def enviar_correo_seleccion(self):
+        """Enviar un correo individual a cada cliente de la selección activa"""
+        cantidad = self.repositorio.contar_seleccion(self.seleccion_id)
+        if not cantidad:
+            messagebox.showwarning("Advertencia", "No hay correos seleccionados")
+            return
+        seleccion_id = self.seleccion_id
+        self.abrir_editor_correo(
+            f"{cantidad} clientes de la selección {self.nombre_seleccion()}",
+            lambda conn, envio_id: encolar_seleccion(conn, envio_id, seleccion_id))
+
+    def enviar_correo_categoria(self):
+        """Enviar un correo individual a cada cliente de la categoría seleccionada"""
+        categoria_seleccionada = self.combo_categorias.get()
+        if not categoria_seleccionada:
+            messagebox.showwarning("Advertencia", "¡Ninguna categoría seleccionada!")
+            return
+        self.abrir_editor_correo(
+            f"Categoría {categoria_seleccionada}",
+            lambda conn, envio_id: encolar_categoria(conn, envio_id, categoria_seleccionada))
+
+    def reanudar_envio(self):
+        """Reanudar el último envío que quedó con destinatarios pendientes"""
+        pendientes = estado_envios(self.conn, solo_pendientes=True)
+        if not pendientes:
+            messagebox.showinfo("Información", "No hay envíos pendientes")
+            return
+        envio_id, _, creado, restantes = pendientes[0][:4]
+        self.abrir_editor_correo(
+            f"Envío del {creado}: {restantes} pendientes", None,
+            envio=(envio_id,) + leer_envio(self.conn, envio_id))
+
+    def abrir_editor_correo(self, descripcion, encolar, envio=None):
+        """Abrir editor de correo electrónico
+
+        ``encolar(conn, envio_id)`` añade los destinatarios de un envío nuevo;
+        con ``envio`` se reanuda uno existente y sólo falta la contraseña.
+        """
         dialogo = tk.Toplevel(self.root)
         dialogo.title("Redactar Correo")
         
-        ttk.Label(dialogo, text="Servidor SMTP:").grid(row=0, column=0, padx=5, pady=5)
+        ttk.Label(dialogo, text="Destinatarios:").grid(row=0, column=0, padx=5, pady=5)
+        ttk.Label(dialogo, text=descripcion).grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        
+        ttk.Label(dialogo, text="Servidor SMTP:").grid(row=1, column=0, padx=5, pady=5)
         entrada_servidor = ttk.Entry(dialogo)
-        entrada_servidor.grid(row=0, column=1, padx=5, pady=5)
-        entrada_servidor.insert(0, "smtp.gmail.com")
+        entrada_servidor.grid(row=1, column=1, padx=5, pady=5)
         
-        ttk.Label(dialogo, text="Puerto SMTP:").grid(row=1, column=0, padx=5, pady=5)
+        ttk.Label(dialogo, text="Puerto SMTP:").grid(row=2, column=0, padx=5, pady=5)
         entrada_puerto = ttk.Entry(dialogo)
-        entrada_puerto.grid(row=1, column=1, padx=5, pady=5)
-        entrada_puerto.insert(0, "587")
+        entrada_puerto.grid(row=2, column=1, padx=5, pady=5)
         
-        ttk.Label(dialogo, text="Tu Correo:").grid(row=2, column=0, padx=5, pady=5)
+        variable_tls = tk.BooleanVar(value=True)
+        ttk.Checkbutton(dialogo, text="Usar STARTTLS", variable=variable_tls).grid(
+            row=3, column=1, padx=5, pady=5, sticky="w")
+        
+        ttk.Label(dialogo, text="Tu Correo:").grid(row=4, column=0, padx=5, pady=5)
         entrada_emisor = ttk.Entry(dialogo)
-        entrada_emisor.grid(row=2, column=1, padx=5, pady=5)
+        entrada_emisor.grid(row=4, column=1, padx=5, pady=5)
         
-        ttk.Label(dialogo, text="Contraseña:").grid(row=3, column=0, padx=5, pady=5)
+        ttk.Label(dialogo, text="Contraseña:").grid(row=5, column=0, padx=5, pady=5)
         entrada_password = ttk.Entry(dialogo, show="*")
-        entrada_password.grid(row=3, column=1, padx=5, pady=5)
+        entrada_password.grid(row=5, column=1, padx=5, pady=5)
         
-        ttk.Label(dialogo, text="Asunto:").grid(row=4, column=0, padx=5, pady=5)
+        ttk.Label(dialogo, text="Asunto:").grid(row=6, column=0, padx=5, pady=5)
         entrada_asunto = ttk.Entry(dialogo)
-        entrada_asunto.grid(row=4, column=1, padx=5, pady=5)
+        entrada_asunto.grid(row=6, column=1, padx=5, pady=5)
         
-        ttk.Label(dialogo, text="Mensaje:").grid(row=5, column=0, padx=5, pady=5)
+        ttk.Label(dialogo, text="Mensaje:").grid(row=7, column=0, padx=5, pady=5)
         cuerpo = tk.Text(dialogo, height=10, width=40)
-        cuerpo.grid(row=5, column=1, padx=5, pady=5)
+        cuerpo.grid(row=7, column=1, padx=5, pady=5)
+        
+        if envio is None:
+            entrada_servidor.insert(0, "smtp.gmail.com")
+            entrada_puerto.insert(0, "587")
+        else:
+            envio_id, remitente, asunto, texto, configuracion = envio
+            entrada_servidor.insert(0, configuracion.servidor)
+            entrada_puerto.insert(0, str(configuracion.puerto))
+            variable_tls.set(configuracion.starttls)
+            entrada_emisor.insert(0, remitente)
+            entrada_asunto.insert(0, asunto)
+            cuerpo.insert("1.0", texto)
+            for campo in (entrada_servidor, entrada_puerto, entrada_emisor, entrada_asunto):
+                campo.config(state="readonly")
+            cuerpo.config(state="disabled")
         
         def enviar_correos():
             try:
-                mensaje = MIMEText(cuerpo.get("1.0", tk.END))
-                mensaje['Subject'] = entrada_asunto.get()
-                mensaje['From'] = entrada_emisor.get()
-                mensaje['To'] = ", ".join(correos)
-                mensaje['Date'] = formatdate(localtime=True)
-                
-                with smtplib.SMTP(entrada_servidor.get(), int(entrada_puerto.get())) as servidor:
-                    servidor.starttls()
-                    servidor.login(entrada_emisor.get(), entrada_password.get())
-                    servidor.sendmail(entrada_emisor.get(), correos, mensaje.as_string())
-                
-                messagebox.showinfo("Éxito", "¡Correos enviados correctamente!")
-                dialogo.destroy()
-            except Exception as e:
-                messagebox.showerror("Error de Correo", f"Error al enviar correos: {e}")
+                puerto = int(entrada_puerto.get())
+            except ValueError:
+                messagebox.showwarning("Error de Entrada", "¡El puerto debe ser un número!")
+                return
+            remitente = entrada_emisor.get().strip()
+            asunto = entrada_asunto.get()
+            texto = cuerpo.get("1.0", tk.END)
+            # Sin contraseña no se autentica (servidores SMTP locales de prueba)
+            password = entrada_password.get()
+            configuracion = ConfiguracionSMTP(entrada_servidor.get().strip(), puerto,
+                                              remitente if password else '', password,
+                                              variable_tls.get())
+            if not all([configuracion.servidor, remitente, asunto]):
+                messagebox.showwarning("Error de Entrada", "¡Todos los campos son obligatorios!")
+                return
+            dialogo.destroy()
+            
+            def enviar(progreso, cancelacion):
+                conn = abrir_conexion(self.ruta_bd)
+                try:
+                    if envio is None:
+                        envio_id = crear_envio(conn, remitente, asunto, texto, configuracion)
+                        encolar(conn, envio_id)
+                    else:
+                        envio_id = envio[0]
+                    motor = MotorCorreo(configuracion)
+                    return motor.procesar(conn, envio_id, progreso, cancelacion)
+                finally:
+                    conn.close()
+            
+            def terminar(resumen):
+                mensaje = (f"{resumen.enviados} enviados, {resumen.fallidos} fallidos, "
+                           f"{resumen.pendientes} pendientes.")
+                if resumen.pendientes:
+                    mensaje += "\nPuede reanudarlo desde Correo > Reanudar Envío Pendiente."
+                messagebox.showinfo("Envío de Correos", mensaje)
+            
+            self.ejecutar_con_progreso("Enviando Correos", enviar, terminar)
         
-        ttk.Button(dialogo, text="Enviar", command=enviar_correos).grid(row=6, column=1, pady=10)
+        ttk.Button(dialogo, text="Enviar", command=enviar_correos).grid(row=8, column=1, pady=10)
 
-if __name__ == "__main__":
+def main(mostrar_tiempos=False, ruta_bd=RUTA_BD):
+    """Arrancar la interfaz; con ``mostrar_tiempos`` informa del tiempo de arranque"""
     root = tk.Tk()
-    app = ClientDatabaseApp(root)
+    app = ClientDatabaseApp(root, ruta_bd)
+    if mostrar_tiempos:
+        root.after_idle(lambda: print(
+            f"Interfaz lista en {(time.perf_counter() - _INICIO) * 1000:.0f} ms", file=sys.stderr))
     root.mainloop()
 
 
+if __name__ == "__main__":
+    main('--tiempos' in sys.argv[1:])
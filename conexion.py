@@ -0,0 +1,122 @@
+"""Apertura y ajuste de las conexiones a la base de datos de clientes
+
+Todas las conexiones (interfaz, búsquedas en segundo plano, importación y
+exportación) se abren con ``abrir_conexion`` para que compartan los mismos
+PRAGMA. Los valores por defecto se pueden sobrescribir con un archivo JSON
+(``conexion.json`` junto a la aplicación), por ejemplo::
+
+    {"synchronous": "full", "mmap_size": 0}
+
+Con ``"instrumentacion": true`` (o la variable de entorno
+``CARTRONIC_INSTRUMENTACION=1``) las conexiones miden cada consulta; ver
+``instrumentacion.py``. ``"registro_instrumentacion"`` es el archivo JSON
+Lines donde se guardan las mediciones.
+
+Uso desde la línea de comandos para ver qué se aplica:
+
+    python conexion.py [--bd clientes.db]
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+import instrumentacion
+
+
+RUTA_BD = 'clientes.db'
+ARCHIVO_CONFIGURACION = 'conexion.json'
+
+# WAL permite que las búsquedas lean mientras se guardan cambios o se importa
+CONFIGURACION_POR_DEFECTO = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -65536,  # KiB (64 MiB)
+    'mmap_size': 268435456,  # 256 MiB
+    'temp_store': 'memory',
+    'foreign_keys': 1,
+    'cached_statements': 256,
+    'instrumentacion': False,
+    'registro_instrumentacion': None,
+}
+
+# Orden en que se aplican: journal_mode debe ir antes que synchronous
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'foreign_keys')
+
+_VALOR_VALIDO = re.compile(r'^-?\w+$')
+
+
+def cargar_configuracion(ruta=ARCHIVO_CONFIGURACION):
+    """Combinar la configuración por defecto con la del archivo JSON, si existe"""
+    configuracion = dict(CONFIGURACION_POR_DEFECTO)
+    if os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as archivo:
+            configuracion.update(json.load(archivo))
+    return configuracion
+
+
+def aplicar_pragmas(conn, configuracion):
+    """Aplicar los PRAGMA de la configuración a una conexión abierta"""
+    for pragma in PRAGMAS:
+        if pragma not in configuracion:
+            continue
+        valor = str(configuracion[pragma])
+        if not _VALOR_VALIDO.match(valor):
+            raise ValueError(f"Valor no válido para PRAGMA {pragma}: {valor!r}")
+        conn.execute(f"PRAGMA {pragma} = {valor}").fetchall()
+
+
+class Conexion(sqlite3.Connection):
+    """Conexión de la aplicación; a diferencia de ``sqlite3.Connection``
+    admite referencias débiles (la caché de búsquedas las usa como clave)"""
+
+
+def abrir_conexion(ruta=RUTA_BD, configuracion=None, **opciones):
+    """Abrir una conexión SQLite con la configuración de la aplicación
+
+    ``opciones`` se pasan tal cual a ``sqlite3.connect`` (por ejemplo
+    ``check_same_thread=False`` para las conexiones de los hilos de trabajo).
+    """
+    if configuracion is None:
+        configuracion = cargar_configuracion()
+    opciones.setdefault('cached_statements', configuracion.get('cached_statements', 128))
+    if configuracion.get('instrumentacion') or os.environ.get('CARTRONIC_INSTRUMENTACION', '0') != '0':
+        instrumentacion.activar(ruta_registro=configuracion.get('registro_instrumentacion'))
+    if instrumentacion.activa() is not None:
+        opciones.setdefault('factory', instrumentacion.ConexionInstrumentada)
+    opciones.setdefault('factory', Conexion)
+    conn = sqlite3.connect(ruta, **opciones)
+    aplicar_pragmas(conn, configuracion)
+    return conn
+
+
+def informe_conexion(conn):
+    """Leer de la conexión los valores efectivos de cada PRAGMA"""
+    informe = {}
+    for pragma in PRAGMAS:
+        fila = conn.execute(f"PRAGMA {pragma}").fetchone()
+        informe[pragma] = fila[0] if fila else None
+    informe['sqlite_version'] = sqlite3.sqlite_version
+    return informe
+
+
+def formatear_informe(informe):
+    """Presentar el informe de conexión como texto"""
+    return "\n".join(f"{clave} = {valor}" for clave, valor in informe.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mostrar la configuración aplicada a la base de datos")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    args = parser.parse_args(argv)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        print(formatear_informe(informe_conexion(conn)))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
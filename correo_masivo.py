@@ -0,0 +1,351 @@
+"""Envío masivo de correos con cola persistente en SQLite
+
+Cada destinatario recibe su propio mensaje (nadie ve al resto de la lista).
+Los envíos se reparten entre varios hilos, cada uno con su conexión SMTP
+autenticada que reutiliza entre mensajes, con un límite de mensajes por
+segundo y reintentos con espera exponencial ante errores transitorios. El
+estado de cada destinatario se guarda en ``cola_correos``, de modo que un
+envío interrumpido se puede reanudar sin repetir los ya enviados.
+
+Uso desde la línea de comandos:
+
+    python correo_masivo.py estado
+    python correo_masivo.py reanudar ENVIO_ID   (contraseña en SMTP_CONTRASENA)
+
+Para probar sin un servidor real basta un servidor SMTP local sin TLS ni
+autenticación (por ejemplo ``python -m aiosmtpd -n -l localhost:8025``) y un
+envío creado con ``starttls=False`` y usuario vacío.
+"""
+import argparse
+import getpass
+import os
+import smtplib
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+from conexion import RUTA_BD, abrir_conexion
+from migraciones import preparar_base_datos
+
+
+PENDIENTE = 'pendiente'
+ENVIADO = 'enviado'
+FALLIDO = 'fallido'
+
+HILOS = 4
+MENSAJES_POR_SEGUNDO = 5
+REINTENTOS = 3
+ESPERA_INICIAL = 2.0
+TAMANO_LOTE = 200
+# Cada cuántos resultados se guarda el estado en la cola
+RESULTADOS_POR_COMMIT = 25
+
+
+class ConfiguracionSMTP(namedtuple(
+        'ConfiguracionSMTP', ['servidor', 'puerto', 'usuario', 'contrasena', 'starttls'])):
+    """Datos de conexión al servidor SMTP; sin usuario no se autentica"""
+    __slots__ = ()
+
+
+class ResumenEnvio(namedtuple(
+        'ResumenEnvio', ['enviados', 'fallidos', 'pendientes', 'cancelado'])):
+    """Estado de un envío al terminar de procesarlo"""
+    __slots__ = ()
+
+
+def crear_envio(conn, remitente, asunto, cuerpo, configuracion):
+    """Registrar un envío nuevo (sin destinatarios) y devolver su id"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO envios
+        (remitente, asunto, cuerpo, servidor, puerto, usuario, starttls)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (remitente, asunto, cuerpo, configuracion.servidor, configuracion.puerto,
+         configuracion.usuario or '', int(configuracion.starttls)))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def encolar_correos(conn, envio_id, correos):
+    """Añadir destinatarios a la cola de un envío (los repetidos se ignoran)"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO cola_correos (envio_id, correo) VALUES (?, ?)",
+        ((envio_id, correo) for correo in correos))
+    conn.commit()
+
+
+def encolar_categoria(conn, envio_id, nombre_categoria):
+    """Añadir a la cola todos los clientes de una categoría sin pasar por Python"""
+    conn.execute("""
+        INSERT OR IGNORE INTO cola_correos (envio_id, correo)
+        SELECT ?, correo FROM clientes
+        WHERE categoria_id = (SELECT id FROM categorias WHERE nombre = ?)
+    """, (envio_id, nombre_categoria))
+    conn.commit()
+
+
+def encolar_seleccion(conn, envio_id, seleccion_id):
+    """Añadir a la cola todos los clientes de una selección guardada"""
+    conn.execute("""
+        INSERT OR IGNORE INTO cola_correos (envio_id, correo)
+        SELECT ?, c.correo FROM selecciones_clientes s
+        JOIN clientes c ON c.id = s.cliente_id
+        WHERE s.seleccion_id = ?
+    """, (envio_id, seleccion_id))
+    conn.commit()
+
+
+def leer_envio(conn, envio_id):
+    """Devolver (remitente, asunto, cuerpo, ConfiguracionSMTP sin contraseña)"""
+    fila = conn.execute(
+        """SELECT remitente, asunto, cuerpo, servidor, puerto, usuario, starttls
+        FROM envios WHERE id = ?""", (envio_id,)).fetchone()
+    if fila is None:
+        raise ValueError(f"No existe el envío {envio_id}")
+    remitente, asunto, cuerpo, servidor, puerto, usuario, starttls = fila
+    return remitente, asunto, cuerpo, ConfiguracionSMTP(servidor, puerto, usuario, '', bool(starttls))
+
+
+def estado_envios(conn, solo_pendientes=False):
+    """Listar (id, asunto, creado, pendientes, enviados, fallidos) por envío"""
+    query = f"""
+        SELECT e.id, e.asunto, e.creado,
+               COALESCE(SUM(q.estado = '{PENDIENTE}'), 0),
+               COALESCE(SUM(q.estado = '{ENVIADO}'), 0),
+               COALESCE(SUM(q.estado = '{FALLIDO}'), 0)
+        FROM envios e
+        LEFT JOIN cola_correos q ON q.envio_id = e.id
+        GROUP BY e.id
+    """
+    if solo_pendientes:
+        query += f" HAVING SUM(q.estado = '{PENDIENTE}') > 0"
+    return conn.execute(query + " ORDER BY e.id DESC").fetchall()
+
+
+def construir_mensaje(remitente, destinatario, asunto, cuerpo):
+    """Mensaje individual para un único destinatario"""
+    mensaje = MIMEText(cuerpo, 'plain', 'utf-8')
+    mensaje['Subject'] = asunto
+    mensaje['From'] = remitente
+    mensaje['To'] = destinatario
+    mensaje['Date'] = formatdate(localtime=True)
+    mensaje['Message-ID'] = make_msgid()
+    return mensaje.as_string()
+
+
+class LimitadorTasa:
+    """Espaciar los envíos de todos los hilos a ``por_segundo`` mensajes por segundo"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0.0
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class MotorCorreo:
+    """Despachar la cola de un envío con un grupo de conexiones SMTP"""
+
+    def __init__(self, configuracion, hilos=HILOS, por_segundo=MENSAJES_POR_SEGUNDO,
+                 reintentos=REINTENTOS, espera_inicial=ESPERA_INICIAL, timeout=30):
+        self.configuracion = configuracion
+        self.hilos = hilos
+        self.reintentos = reintentos
+        self.espera_inicial = espera_inicial
+        self.timeout = timeout
+        self.limitador = LimitadorTasa(por_segundo)
+        self._local = threading.local()
+        self._conexiones = []
+        self._lock = threading.Lock()
+
+    def _smtp(self):
+        """Conexión SMTP del hilo actual, abierta y autenticada la primera vez"""
+        servidor = getattr(self._local, 'servidor', None)
+        if servidor is None:
+            config = self.configuracion
+            servidor = smtplib.SMTP(config.servidor, int(config.puerto), timeout=self.timeout)
+            try:
+                if config.starttls:
+                    servidor.starttls()
+                if config.usuario:
+                    servidor.login(config.usuario, config.contrasena)
+            except Exception:
+                # Sin esto cada reintento dejaría abierto un socket más
+                self._local.servidor = None
+                servidor.close()
+                raise
+            self._local.servidor = servidor
+            with self._lock:
+                self._conexiones.append(servidor)
+        return servidor
+
+    def _descartar_smtp(self):
+        """Olvidar la conexión del hilo actual para abrir otra en el próximo intento"""
+        servidor = getattr(self._local, 'servidor', None)
+        self._local.servidor = None
+        if servidor is not None:
+            with self._lock:
+                if servidor in self._conexiones:
+                    self._conexiones.remove(servidor)
+            try:
+                servidor.close()
+            except OSError:
+                pass
+
+    def _cerrar_conexiones(self):
+        with self._lock:
+            conexiones, self._conexiones = self._conexiones, []
+        for servidor in conexiones:
+            try:
+                servidor.quit()
+            except (smtplib.SMTPException, OSError):
+                servidor.close()
+
+    def enviar_uno(self, remitente, destinatario, asunto, cuerpo, cancelacion=None):
+        """Enviar un mensaje con reintentos; devuelve (estado, intentos, error)"""
+        mensaje = construir_mensaje(remitente, destinatario, asunto, cuerpo)
+        error = None
+        for intento in range(1, self.reintentos + 2):
+            self.limitador.esperar()
+            try:
+                self._smtp().sendmail(remitente, [destinatario], mensaje)
+                return ENVIADO, intento, None
+            except smtplib.SMTPAuthenticationError:
+                # Sin credenciales válidas no tiene sentido seguir con la cola
+                raise
+            except smtplib.SMTPRecipientsRefused as e:
+                codigo, respuesta = e.recipients.get(destinatario, (550, b''))
+                if codigo >= 500:
+                    return FALLIDO, intento, f"{codigo} {respuesta!r}"
+                error = e
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    return FALLIDO, intento, f"{e.smtp_code} {e.smtp_error!r}"
+                error = e
+            except (smtplib.SMTPException, OSError) as e:
+                self._descartar_smtp()
+                error = e
+            if cancelacion is not None and cancelacion.is_set():
+                return PENDIENTE, intento, str(error)
+            if intento <= self.reintentos:
+                time.sleep(self.espera_inicial * 2 ** (intento - 1))
+        return FALLIDO, self.reintentos + 1, str(error)
+
+    def procesar(self, conn, envio_id, progreso=None, cancelacion=None):
+        """Enviar los destinatarios pendientes de ``envio_id``
+
+        Sólo este hilo escribe en SQLite: los hilos de envío devuelven su
+        resultado y aquí se guarda por lotes. ``progreso(procesados,
+        fraccion)`` se llama tras cada resultado guardado.
+        """
+        remitente, asunto, cuerpo, _ = leer_envio(conn, envio_id)
+        total = conn.execute(
+            "SELECT COUNT(*) FROM cola_correos WHERE envio_id = ? AND estado = ?",
+            (envio_id, PENDIENTE)).fetchone()[0]
+        procesados = 0
+        cancelado = False
+        ultimo_id = 0
+        resultados = []
+
+        def guardar():
+            conn.executemany("""
+                UPDATE cola_correos
+                SET estado = ?, intentos = intentos + ?, ultimo_error = ?,
+                    actualizado = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, resultados)
+            conn.commit()
+            resultados.clear()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.hilos) as ejecutor:
+                while not cancelado:
+                    lote = conn.execute("""
+                        SELECT id, correo FROM cola_correos
+                        WHERE envio_id = ? AND estado = ? AND id > ?
+                        ORDER BY id LIMIT ?
+                    """, (envio_id, PENDIENTE, ultimo_id, TAMANO_LOTE)).fetchall()
+                    if not lote:
+                        break
+                    ultimo_id = lote[-1][0]
+                    futuros = {
+                        ejecutor.submit(self.enviar_uno, remitente, correo, asunto, cuerpo,
+                                        cancelacion): cola_id
+                        for cola_id, correo in lote
+                    }
+                    for futuro in as_completed(futuros):
+                        if cancelacion is not None and cancelacion.is_set() and not cancelado:
+                            cancelado = True
+                            for pendiente in futuros:
+                                pendiente.cancel()
+                        if futuro.cancelled():
+                            continue
+                        estado, intentos, error = futuro.result()
+                        resultados.append((estado, intentos, error, futuros[futuro]))
+                        procesados += 1
+                        if len(resultados) >= RESULTADOS_POR_COMMIT:
+                            guardar()
+                        if progreso is not None:
+                            progreso(procesados, procesados / total if total else 1.0)
+        finally:
+            if resultados:
+                guardar()
+            self._cerrar_conexiones()
+
+        fila = conn.execute(f"""
+            SELECT COALESCE(SUM(estado = '{ENVIADO}'), 0),
+                   COALESCE(SUM(estado = '{FALLIDO}'), 0),
+                   COALESCE(SUM(estado = '{PENDIENTE}'), 0)
+            FROM cola_correos WHERE envio_id = ?
+        """, (envio_id,)).fetchone()
+        return ResumenEnvio(*fila, cancelado)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gestionar los envíos masivos de correo")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    subparsers.add_parser('estado', help="Listar los envíos y su progreso")
+    reanudar = subparsers.add_parser('reanudar', help="Enviar los destinatarios pendientes")
+    reanudar.add_argument('envio_id', type=int)
+    reanudar.add_argument('--hilos', type=int, default=HILOS)
+    reanudar.add_argument('--por-segundo', type=float, default=MENSAJES_POR_SEGUNDO)
+    args = parser.parse_args(argv)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        preparar_base_datos(conn)
+        if args.comando == 'estado':
+            for envio_id, asunto, creado, pendientes, enviados, fallidos in estado_envios(conn):
+                print(f"{envio_id}\t{creado}\t{asunto}\t"
+                      f"pendientes={pendientes} enviados={enviados} fallidos={fallidos}")
+            return
+
+        _, _, _, configuracion = leer_envio(conn, args.envio_id)
+        if configuracion.usuario:
+            contrasena = os.environ.get('SMTP_CONTRASENA') or getpass.getpass("Contraseña SMTP: ")
+            configuracion = configuracion._replace(contrasena=contrasena)
+        motor = MotorCorreo(configuracion, hilos=args.hilos, por_segundo=args.por_segundo)
+        resumen = motor.procesar(
+            conn, args.envio_id,
+            progreso=lambda n, f: print(f"\r{n} correos procesados ({f:.0%})", end="", file=sys.stderr))
+        print(file=sys.stderr)
+        print(f"{resumen.enviados} enviados, {resumen.fallidos} fallidos, "
+              f"{resumen.pendientes} pendientes")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Exportación masiva de clientes a CSV, JSONL o Parquet
+
+Uso desde la línea de comandos:
+
+    python exportacion.py salida.csv [--buscar TEXTO] [--filtro-categoria TEXTO]
+    python exportacion.py salida.parquet --categoria Clientes
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import namedtuple
+
+from busqueda import (SELECCION_CLIENTES, construir_filtro, contar_clientes,
+                      filtro_categoria, fts_disponible)
+from conexion import RUTA_BD, abrir_conexion
+
+
+COLUMNAS = ('id', 'nombre', 'contacto', 'telefono', 'correo', 'categoria')
+FORMATOS = ('csv', 'jsonl', 'parquet')
+TAMANO_LOTE = 5000
+
+
+class ResumenExportacion(namedtuple('ResumenExportacion', ['exportadas', 'ruta', 'cancelado'])):
+    """Resultado de una exportación"""
+    __slots__ = ()
+
+
+class EscritorCSV:
+    """Escribir lotes de filas en un CSV (UTF-8 con BOM para Excel)"""
+
+    def __init__(self, ruta):
+        self.archivo = open(ruta, 'w', newline='', encoding='utf-8-sig')
+        self.escritor = csv.writer(self.archivo)
+        self.escritor.writerow(COLUMNAS)
+
+    def escribir(self, filas):
+        self.escritor.writerows(filas)
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+class EscritorJSONL:
+    """Escribir lotes de filas como un objeto JSON por línea"""
+
+    def __init__(self, ruta):
+        self.archivo = open(ruta, 'w', encoding='utf-8')
+
+    def escribir(self, filas):
+        self.archivo.writelines(
+            json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + "\n" for fila in filas)
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+class EscritorParquet:
+    """Escribir lotes de filas como grupos de filas de un Parquet (requiere pyarrow)"""
+
+    def __init__(self, ruta):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Para exportar a Parquet es necesario instalar pyarrow")
+        self.pa = pa
+        self.esquema = pa.schema([('id', pa.int64())] +
+                                 [(columna, pa.string()) for columna in COLUMNAS[1:]])
+        self.escritor = pq.ParquetWriter(ruta, self.esquema)
+
+    def escribir(self, filas):
+        columnas = [list(valores) for valores in zip(*filas)]
+        self.escritor.write_table(self.pa.Table.from_arrays(columnas, schema=self.esquema))
+
+    def cerrar(self):
+        self.escritor.close()
+
+
+ESCRITORES = {
+    'csv': EscritorCSV,
+    'jsonl': EscritorJSONL,
+    'parquet': EscritorParquet,
+}
+
+
+def formato_por_extension(ruta):
+    """Deducir el formato de exportación a partir de la extensión"""
+    extension = os.path.splitext(ruta)[1].lower().lstrip('.')
+    if extension == 'json':
+        return 'jsonl'
+    return extension if extension in FORMATOS else 'csv'
+
+
+def exportar_clientes(conn, filtro, ruta, formato=None, tamano_lote=TAMANO_LOTE,
+                      progreso=None, cancelacion=None):
+    """Volcar a ``ruta`` los clientes que cumplen ``filtro``
+
+    Las filas se leen del cursor con ``fetchmany`` y se escriben lote a lote,
+    así que la memoria no depende del tamaño del resultado. Se escribe en
+    ``ruta + '.parcial'``, que sólo sustituye a ``ruta`` al terminar: si se
+    cancela o falla, se elimina el parcial y un archivo anterior en ``ruta``
+    queda intacto. ``progreso(exportadas, fraccion)`` se llama tras cada lote.
+    """
+    clase_escritor = ESCRITORES[formato or formato_por_extension(ruta)]
+    total = contar_clientes(conn, filtro)
+    exportadas = 0
+    cancelado = False
+    temporal = ruta + '.parcial'
+    cursor = conn.execute(SELECCION_CLIENTES + filtro.sql(), filtro.params)
+    try:
+        escritor = clase_escritor(temporal)
+    except Exception:
+        cursor.close()
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    completado = False
+    try:
+        while True:
+            if cancelacion is not None and cancelacion.is_set():
+                cancelado = True
+                break
+            lote = cursor.fetchmany(tamano_lote)
+            if not lote:
+                break
+            escritor.escribir(lote)
+            exportadas += len(lote)
+            if progreso is not None:
+                progreso(exportadas, exportadas / total if total else 1.0)
+        completado = not cancelado
+    finally:
+        cursor.close()
+        escritor.cerrar()
+        if not completado:
+            os.remove(temporal)
+    if completado:
+        os.replace(temporal, ruta)
+    return ResumenExportacion(exportadas, ruta, cancelado)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportar clientes a CSV, JSONL o Parquet")
+    parser.add_argument('salida', help="Archivo de salida (.csv, .jsonl o .parquet)")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    parser.add_argument('--formato', choices=FORMATOS, help="Forzar el formato de salida")
+    parser.add_argument('--buscar', default='', help="Texto a buscar, como en la aplicación")
+    parser.add_argument('--filtro-categoria', default='',
+                        help="Parte del nombre de la categoría, como en la aplicación")
+    parser.add_argument('--categoria', help="Exportar una categoría completa por su nombre")
+    args = parser.parse_args(argv)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        if args.categoria:
+            filtro = filtro_categoria(args.categoria)
+        else:
+            filtro = construir_filtro(args.buscar, args.filtro_categoria, fts_disponible(conn))
+        resumen = exportar_clientes(
+            conn, filtro, args.salida, args.formato,
+            progreso=lambda n, f: print(f"\r{n} filas exportadas ({f:.0%})", end="", file=sys.stderr))
+    finally:
+        conn.close()
+
+    print(file=sys.stderr)
+    print(f"{resumen.exportadas} clientes exportados a {resumen.ruta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Importación masiva de clientes desde CSV o XLSX
+
+Uso desde la línea de comandos:
+
+    python importacion.py exportacion_crm.csv [--bd clientes.db] [--rechazos rechazos.csv]
+"""
+import argparse
+import csv
+import os
+import sys
+import unicodedata
+from collections import namedtuple
+
+from busqueda import MAXIMO_PARAMETROS
+from conexion import RUTA_BD, abrir_conexion
+from migraciones import CATEGORIA_POR_DEFECTO, preparar_base_datos
+from normalizacion import columnas_normalizadas, normalizar
+
+
+COLUMNAS = ('nombre', 'correo', 'telefono', 'contacto', 'categoria')
+OBLIGATORIAS = ('nombre', 'correo', 'telefono', 'contacto')
+
+TAMANO_BLOQUE = 5000
+FILAS_POR_TRANSACCION = 50000
+
+
+class ResumenImportacion(namedtuple(
+        'ResumenImportacion', ['insertados', 'rechazados', 'ruta_rechazos', 'cancelado'])):
+    """Resultado de una importación"""
+    __slots__ = ()
+
+
+def normalizar_encabezado(texto):
+    """Pasar un encabezado a minúsculas y sin tildes ("Teléfono" -> "telefono")"""
+    sin_tildes = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore')
+    return sin_tildes.decode('ascii').strip().lower()
+
+
+def leer_bloques_csv(ruta, tamano_bloque):
+    """Leer un CSV por bloques de diccionarios, con la fracción leída del archivo"""
+    tamano_archivo = os.path.getsize(ruta) or 1
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        muestra = archivo.read(8192)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(archivo, dialecto)
+        encabezados = [normalizar_encabezado(e) for e in next(lector, [])]
+        bloque = []
+        for fila in lector:
+            bloque.append(dict(zip(encabezados, fila)))
+            if len(bloque) >= tamano_bloque:
+                yield bloque, archivo.buffer.tell() / tamano_archivo
+                bloque = []
+        if bloque:
+            yield bloque, 1.0
+
+
+def leer_bloques_xlsx(ruta, tamano_bloque):
+    """Leer la primera hoja de un XLSX por bloques, sin cargarla entera"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para importar archivos XLSX es necesario instalar openpyxl")
+
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        total = hoja.max_row or 0
+        filas = hoja.iter_rows(values_only=True)
+        encabezados = [normalizar_encabezado(e) for e in next(filas, ())]
+        bloque, leidas = [], 1
+        for fila in filas:
+            leidas += 1
+            valores = ['' if v is None else str(v) for v in fila]
+            bloque.append(dict(zip(encabezados, valores)))
+            if len(bloque) >= tamano_bloque:
+                yield bloque, (leidas / total if total else None)
+                bloque = []
+        if bloque:
+            yield bloque, 1.0
+    finally:
+        libro.close()
+
+
+def leer_bloques(ruta, tamano_bloque=TAMANO_BLOQUE):
+    """Elegir el lector según la extensión del archivo"""
+    if ruta.lower().endswith(('.xlsx', '.xlsm')):
+        return leer_bloques_xlsx(ruta, tamano_bloque)
+    return leer_bloques_csv(ruta, tamano_bloque)
+
+
+def correos_existentes(cursor, correos, hasta_id=None):
+    """Devolver cuáles de los correos ya están en la tabla clientes
+
+    Con ``hasta_id`` sólo cuentan los clientes con un id menor o igual.
+    """
+    existentes = set()
+    correos = list(correos)
+    condicion = "" if hasta_id is None else f" AND id <= {int(hasta_id)}"
+    for i in range(0, len(correos), MAXIMO_PARAMETROS):
+        parte = correos[i:i + MAXIMO_PARAMETROS]
+        marcadores = ", ".join("?" * len(parte))
+        cursor.execute(f"SELECT correo FROM clientes WHERE correo IN ({marcadores}){condicion}",
+                       parte)
+        existentes.update(fila[0] for fila in cursor.fetchall())
+    return existentes
+
+
+def importar_clientes(conn, ruta, ruta_rechazos=None, tamano_bloque=TAMANO_BLOQUE,
+                      filas_por_transaccion=FILAS_POR_TRANSACCION,
+                      progreso=None, cancelacion=None):
+    """Importar clientes desde ``ruta`` en transacciones grandes
+
+    Las categorías se resuelven con un diccionario en memoria (las que no
+    existen se crean). Las filas incompletas o con un correo ya existente se
+    escriben en ``ruta_rechazos`` junto con el motivo en lugar de abortar,
+    también si otro usuario inserta el mismo correo durante la importación.
+    ``progreso(filas_procesadas, fraccion)`` se llama tras cada bloque.
+    """
+    if ruta_rechazos is None:
+        ruta_rechazos = os.path.splitext(ruta)[0] + '.rechazos.csv'
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT nombre, id FROM categorias")
+    categorias = dict(cursor.fetchall())
+
+    insertados = rechazados = procesadas = pendientes = 0
+    archivo_rechazos = escritor_rechazos = None
+    cancelado = False
+
+    def rechazar(fila, motivo):
+        nonlocal archivo_rechazos, escritor_rechazos, rechazados
+        if escritor_rechazos is None:
+            archivo_rechazos = open(ruta_rechazos, 'w', newline='', encoding='utf-8')
+            escritor_rechazos = csv.writer(archivo_rechazos)
+            escritor_rechazos.writerow(COLUMNAS + ('motivo',))
+        escritor_rechazos.writerow([fila.get(c, '') for c in COLUMNAS] + [motivo])
+        rechazados += 1
+
+    try:
+        for bloque, fraccion in leer_bloques(ruta, tamano_bloque):
+            if cancelacion is not None and cancelacion.is_set():
+                cancelado = True
+                break
+
+            validas = {}
+            for fila in bloque:
+                fila = {c: (fila.get(c) or '').strip() for c in COLUMNAS}
+                if not all(fila[c] for c in OBLIGATORIAS):
+                    rechazar(fila, "Faltan campos obligatorios")
+                elif fila['correo'] in validas:
+                    rechazar(fila, "Correo repetido en el archivo")
+                else:
+                    validas[fila['correo']] = fila
+
+            for correo in correos_existentes(cursor, validas):
+                rechazar(validas.pop(correo), "El correo ya existe en la base de datos")
+
+            registros = []
+            for fila in validas.values():
+                nombre_categoria = fila['categoria'] or CATEGORIA_POR_DEFECTO
+                if nombre_categoria not in categorias:
+                    cursor.execute("INSERT INTO categorias (nombre, nombre_normalizado) VALUES (?, ?)",
+                                   (nombre_categoria, normalizar(nombre_categoria)))
+                    categorias[nombre_categoria] = cursor.lastrowid
+                registros.append((fila['nombre'], fila['correo'], fila['telefono'],
+                                  fila['contacto'], categorias[nombre_categoria],
+                                  *columnas_normalizadas(fila['nombre'], fila['contacto'],
+                                                         fila['correo'], fila['telefono'])))
+
+            if not conn.in_transaction:
+                # Con la escritura reservada, los ids mayores que este sólo
+                # pueden ser de las filas de este bloque
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT MAX(id) FROM clientes")
+            ultimo_previo = cursor.fetchone()[0] or 0
+            cursor.executemany(
+                """INSERT INTO clientes
+                (nombre, correo, telefono, contacto, categoria_id,
+                 texto_normalizado, nombre_orden, contacto_orden)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (correo) DO NOTHING""",
+                registros)
+            nuevos = max(cursor.rowcount, 0)
+            insertados += nuevos
+            pendientes += nuevos
+            if nuevos < len(registros):
+                # La comprobación previa no ve los correos que otra conexión
+                # insertó después: esas filas se omitieron y se rechazan
+                for correo in correos_existentes(cursor, validas, ultimo_previo):
+                    rechazar(validas[correo], "El correo ya existe en la base de datos")
+            procesadas += len(bloque)
+
+            if pendientes >= filas_por_transaccion:
+                conn.commit()
+                pendientes = 0
+            if progreso is not None:
+                progreso(procesadas, fraccion)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if archivo_rechazos is not None:
+            archivo_rechazos.close()
+
+    return ResumenImportacion(insertados, rechazados,
+                              ruta_rechazos if rechazados else None, cancelado)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importar clientes desde CSV o XLSX")
+    parser.add_argument('archivo', help="Archivo CSV o XLSX con encabezados")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    parser.add_argument('--rechazos', help="Archivo CSV para las filas rechazadas")
+    parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE,
+                        help="Filas leídas por bloque")
+    args = parser.parse_args(argv)
+
+    def mostrar_progreso(procesadas, fraccion):
+        porcentaje = f" ({fraccion:.0%})" if fraccion is not None else ""
+        print(f"\r{procesadas} filas procesadas{porcentaje}", end="", file=sys.stderr)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        preparar_base_datos(conn)
+        resumen = importar_clientes(conn, args.archivo, args.rechazos,
+                                    tamano_bloque=args.bloque, progreso=mostrar_progreso)
+    finally:
+        conn.close()
+
+    print(file=sys.stderr)
+    print(f"{resumen.insertados} clientes importados, {resumen.rechazados} rechazados")
+    if resumen.ruta_rechazos:
+        print(f"Filas rechazadas en {resumen.ruta_rechazos}")
+
+
+if __name__ == "__main__":
+    main()
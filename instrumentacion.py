@@ -0,0 +1,211 @@
+"""Instrumentación opcional de consultas SQL y de los pasos de la interfaz
+
+Se activa con ``"instrumentacion": true`` en ``conexion.json`` o con la
+variable de entorno ``CARTRONIC_INSTRUMENTACION=1``. Entonces todas las
+conexiones que abre ``conexion.abrir_conexion`` usan ``ConexionInstrumentada``:
+cada ``execute`` y cada ``fetch*`` se cronometran por separado, las sentencias
+que realmente ejecuta SQLite (incluidas las de los triggers) se capturan con
+``set_trace_callback`` y se guarda el ``EXPLAIN QUERY PLAN`` de cada consulta.
+Los pasos de la interfaz se miden con el decorador ``instrumentar_ui``.
+
+Los registros se guardan en un búfer circular en memoria (ventana de
+depuración) y, si se indica, se añaden como JSON Lines a un archivo.
+"""
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+CAPACIDAD = 2000
+# Planes guardados (texto SQL distinto); se descartan los menos usados
+MAXIMO_PLANES = 500
+PREFIJOS_CON_PLAN = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+_instancia = None
+_lock_instancia = threading.Lock()
+
+
+class Instrumentacion:
+    """Búfer circular de mediciones, con volcado opcional a JSON Lines"""
+
+    def __init__(self, capacidad=CAPACIDAD, ruta_registro=None, maximo_planes=MAXIMO_PLANES):
+        self.registros = deque(maxlen=capacidad)
+        self.ruta_registro = ruta_registro
+        self.maximo_planes = maximo_planes
+        self._planes = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def registrar(self, tipo, etiqueta, inicio, **datos):
+        """Guardar una medición que empezó en ``inicio`` (perf_counter)"""
+        registro = {
+            'momento': time.time(),
+            'tipo': tipo,
+            'etiqueta': etiqueta,
+            'duracion_ms': round((time.perf_counter() - inicio) * 1000, 3),
+            'hilo': threading.current_thread().name,
+        }
+        registro.update(datos)
+        with self._lock:
+            self.registros.append(registro)
+            if self.ruta_registro:
+                with open(self.ruta_registro, 'a', encoding='utf-8') as archivo:
+                    archivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+        return registro
+
+    def instantanea(self):
+        """Copia de los registros actuales, del más antiguo al más reciente"""
+        with self._lock:
+            return list(self.registros)
+
+    def limpiar(self):
+        with self._lock:
+            self.registros.clear()
+
+    def plan(self, conn, sql, parametros):
+        """EXPLAIN QUERY PLAN de una consulta, cacheado por texto SQL (LRU)"""
+        with self._lock:
+            if sql in self._planes:
+                self._planes.move_to_end(sql)
+                return self._planes[sql]
+        try:
+            # Cursor sin instrumentar para no medir la propia consulta del plan
+            cursor = sqlite3.Cursor(conn)
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, parametros)
+            plan = [fila[3] for fila in cursor.fetchall()]
+        except sqlite3.Error:
+            plan = None
+        # El EXPLAIN se hace fuera del lock: usa la conexión de este hilo
+        with self._lock:
+            self._planes[sql] = plan
+            self._planes.move_to_end(sql)
+            while len(self._planes) > self.maximo_planes:
+                self._planes.popitem(last=False)
+        return plan
+
+    def sentencias_ejecutadas(self):
+        """Lista (por hilo) donde el trace callback acumula las sentencias"""
+        if not hasattr(self._local, 'sentencias'):
+            self._local.sentencias = []
+        return self._local.sentencias
+
+
+def activa():
+    """Instancia global de instrumentación, o None si está desactivada"""
+    return _instancia
+
+
+def activar(capacidad=CAPACIDAD, ruta_registro=None):
+    """Activar la instrumentación global (una sola vez por proceso)"""
+    global _instancia
+    with _lock_instancia:
+        if _instancia is None:
+            _instancia = Instrumentacion(capacidad, ruta_registro)
+        return _instancia
+
+
+def es_escaneo_completo(plan):
+    """True si algún paso del plan recorre una tabla entera sin índice"""
+    return any(paso.startswith('SCAN') and 'INDEX' not in paso and 'VIRTUAL TABLE' not in paso
+               for paso in plan or ())
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que cronometra la ejecución y la lectura de filas por separado"""
+
+    def _medir(self, metodo, sql, parametros, varias=False):
+        instrumentacion = _instancia
+        sentencias = instrumentacion.sentencias_ejecutadas()
+        sentencias.clear()
+        inicio = time.perf_counter()
+        error = None
+        try:
+            return metodo(sql, parametros)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            # Antes de pedir el plan: su EXPLAIN también pasa por el trace
+            # callback y no debe contar en la duración ni en las sentencias
+            duracion_ms = round((time.perf_counter() - inicio) * 1000, 3)
+            ejecutadas = list(sentencias)
+            filas_afectadas = self.rowcount
+            plan = None
+            if not varias and sql.lstrip().upper().startswith(PREFIJOS_CON_PLAN):
+                plan = instrumentacion.plan(self.connection, sql, parametros)
+            instrumentacion.registrar(
+                'sql', " ".join(sql.split())[:120], inicio, duracion_ms=duracion_ms,
+                sql=sql, plan=plan, escaneo_completo=es_escaneo_completo(plan),
+                filas_afectadas=filas_afectadas, sentencias=ejecutadas, error=error)
+
+    def execute(self, sql, parametros=()):
+        return self._medir(super().execute, sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self._medir(super().executemany, sql, secuencia, varias=True)
+
+    def _leer(self, etiqueta, metodo, *args):
+        inicio = time.perf_counter()
+        filas = metodo(*args)
+        cantidad = len(filas) if isinstance(filas, list) else int(filas is not None)
+        _instancia.registrar('fetch', etiqueta, inicio, filas=cantidad)
+        return filas
+
+    def fetchall(self):
+        return self._leer('fetchall', super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self._leer('fetchmany', super().fetchmany, size or self.arraysize)
+
+    def fetchone(self):
+        return self._leer('fetchone', super().fetchone)
+
+
+class ConexionInstrumentada(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de ``execute``) están instrumentados"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        instrumentacion = _instancia
+        self.set_trace_callback(
+            lambda sentencia: instrumentacion.sentencias_ejecutadas().append(sentencia))
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    # sqlite3 ejecuta los atajos de la conexión sin pasar por Cursor.execute
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+
+def instrumentar_ui(etiqueta):
+    """Decorador que mide un paso de la interfaz si la instrumentación está activa
+
+    Si el primer argumento posicional tras ``self`` tiene longitud, se anota
+    como número de filas.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltorio(*args, **kwargs):
+            instrumentacion = _instancia
+            if instrumentacion is None:
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                filas = None
+                if len(args) > 1:
+                    try:
+                        filas = len(getattr(args[1], 'filas', args[1]))
+                    except TypeError:
+                        pass
+                instrumentacion.registrar('ui', etiqueta, inicio, filas=filas)
+        return envoltorio
+    return decorador
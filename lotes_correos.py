@@ -0,0 +1,178 @@
+"""Reparto de listas de destinatarios muy grandes en lotes
+
+Los clientes de correo y los campos CCO rechazan listas de miles de
+direcciones, y copiar 40 000 correos de una vez al portapapeles es lento.
+Aquí los destinatarios de una categoría o de una selección se leen por
+lotes de tamaño configurable, de uno en uno y sólo cuando se piden: cada
+lote es una consulta por clave (la última dirección o el último id del lote
+anterior), así que no se mantiene ninguna transacción abierta entre lote y
+lote y el recorrido se puede retomar con ``DistribucionCorreos.cursor``.
+
+    python -m cartronic lotes --categoria NOMBRE|--seleccion ID [--tamano 500] [--directorio lotes/]
+"""
+import argparse
+import html
+import os
+import sys
+from collections import namedtuple
+from urllib.parse import quote
+
+from conexion import RUTA_BD, abrir_conexion
+from migraciones import preparar_base_datos
+
+
+TAMANO_LOTE = 500
+
+
+class OrigenCorreos(namedtuple('OrigenCorreos', ['descripcion', 'consulta', 'conteo', 'params', 'inicio'])):
+    """Destinatarios a repartir
+
+    ``consulta`` devuelve (clave, correo) ordenados por clave a partir de un
+    cursor y con un límite; ``inicio`` es el cursor antes del primer lote.
+    """
+    __slots__ = ()
+
+
+def origen_categoria(nombre_categoria):
+    """Correos de una categoría, recorridos por el índice (categoria_id, correo)"""
+    categoria = "categoria_id = (SELECT id FROM categorias WHERE nombre = ?)"
+    return OrigenCorreos(
+        f"Categoría {nombre_categoria}",
+        f"SELECT correo, correo FROM clientes WHERE {categoria} AND correo > ? "
+        "ORDER BY correo LIMIT ?",
+        f"SELECT COUNT(*) FROM clientes WHERE {categoria}",
+        (nombre_categoria,), '')
+
+
+def origen_seleccion(seleccion_id, nombre_seleccion=None):
+    """Correos de una selección guardada, por id de cliente"""
+    return OrigenCorreos(
+        f"Selección {nombre_seleccion or seleccion_id}",
+        """SELECT s.cliente_id, c.correo FROM selecciones_clientes s
+           JOIN clientes c ON c.id = s.cliente_id
+           WHERE s.seleccion_id = ? AND s.cliente_id > ?
+           ORDER BY s.cliente_id LIMIT ?""",
+        "SELECT COUNT(*) FROM selecciones_clientes WHERE seleccion_id = ?",
+        (seleccion_id,), 0)
+
+
+def contar_destinatarios(conn, origen):
+    return conn.execute(origen.conteo, origen.params).fetchone()[0]
+
+
+def leer_lote(conn, origen, cursor, tamano=TAMANO_LOTE):
+    """(correos, cursor siguiente) del lote posterior a ``cursor``"""
+    filas = conn.execute(origen.consulta, (*origen.params, cursor, tamano)).fetchall()
+    return [correo for _, correo in filas], filas[-1][0] if filas else cursor
+
+
+def lotes_correos(conn, origen, tamano=TAMANO_LOTE, cursor=None):
+    """Generar las listas de correos lote a lote, leyendo cada una al pedirla"""
+    cursor = origen.inicio if cursor is None else cursor
+    while True:
+        correos, cursor = leer_lote(conn, origen, cursor, tamano)
+        if not correos:
+            return
+        yield correos
+        if len(correos) < tamano:
+            return
+
+
+def texto_lote(correos, separador=", "):
+    return separador.join(correos)
+
+
+def enlace_mailto(correos, asunto=''):
+    """Enlace mailto: con los correos en CCO (para no mostrarlos a todos)"""
+    enlace = "mailto:?bcc=" + ",".join(quote(correo, safe='@') for correo in correos)
+    if asunto:
+        enlace += "&subject=" + quote(asunto)
+    return enlace
+
+
+class DistribucionCorreos:
+    """Recorrido de un origen lote a lote, con el cursor del siguiente lote
+
+    Lo usa la ventana "Correos por Lotes": cada ``siguiente()`` lee sólo el
+    lote pedido, aunque entre tanto la base de datos haya cambiado.
+    """
+
+    def __init__(self, conn, origen, tamano=TAMANO_LOTE):
+        self.conn = conn
+        self.origen = origen
+        self.tamano = tamano
+        self.total = contar_destinatarios(conn, origen)
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.cursor = self.origen.inicio
+        self.lote = 0
+        self.entregados = 0
+        self.terminado = False
+
+    def siguiente(self):
+        """Correos del siguiente lote, o una lista vacía si ya no quedan"""
+        if self.terminado:
+            return []
+        correos, self.cursor = leer_lote(self.conn, self.origen, self.cursor, self.tamano)
+        if len(correos) < self.tamano:
+            self.terminado = True
+        if correos:
+            self.lote += 1
+            self.entregados += len(correos)
+        return correos
+
+    @property
+    def lotes_totales(self):
+        return max(1, -(-self.total // self.tamano))
+
+
+def escribir_lotes(conn, origen, directorio, tamano=TAMANO_LOTE, prefijo='lote', asunto=''):
+    """Guardar cada lote en ``prefijo_001.txt``... y un HTML con un mailto por lote
+
+    Devuelve la lista de archivos de texto escritos.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    archivos = []
+    with open(os.path.join(directorio, f"{prefijo}_mailto.html"), 'w', encoding='utf-8') as indice:
+        indice.write(f"<!DOCTYPE html>\n<meta charset=\"utf-8\">\n"
+                     f"<h1>{html.escape(origen.descripcion)}</h1>\n<ol>\n")
+        for numero, correos in enumerate(lotes_correos(conn, origen, tamano), 1):
+            ruta = os.path.join(directorio, f"{prefijo}_{numero:03d}.txt")
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                archivo.write("\n".join(correos) + "\n")
+            archivos.append(ruta)
+            indice.write(f"<li><a href=\"{html.escape(enlace_mailto(correos, asunto))}\">"
+                         f"Lote {numero} ({len(correos)} correos)</a></li>\n")
+        indice.write("</ol>\n")
+    return archivos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repartir los correos de una categoría o selección en lotes")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--categoria', help="Nombre de la categoría")
+    grupo.add_argument('--seleccion', type=int, help="Id de la selección guardada")
+    parser.add_argument('--tamano', type=int, default=TAMANO_LOTE, help="Correos por lote")
+    parser.add_argument('--directorio', help="Guardar un .txt por lote y un HTML con enlaces mailto")
+    parser.add_argument('--asunto', default='', help="Asunto de los enlaces mailto")
+    args = parser.parse_args(argv)
+
+    origen = origen_categoria(args.categoria) if args.categoria else origen_seleccion(args.seleccion)
+    conn = abrir_conexion(args.bd)
+    try:
+        preparar_base_datos(conn)
+        if args.directorio:
+            archivos = escribir_lotes(conn, origen, args.directorio, args.tamano, asunto=args.asunto)
+            print(f"{len(archivos)} lotes guardados en {args.directorio}", file=sys.stderr)
+            return
+        # Sin directorio: un lote por línea, para procesarlo con otras herramientas
+        for correos in lotes_correos(conn, origen, args.tamano):
+            print(texto_lote(correos))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Respaldo en caliente, compactación y comprobación de la base de datos
+
+Copiar ``clientes.db`` mientras la aplicación está abierta puede dar un
+archivo a medias. ``respaldar`` usa ``Connection.backup`` por pasos de unas
+pocas páginas, con una pausa entre pasos para que la interfaz pueda seguir
+escribiendo. Las demás tareas (VACUUM, ANALYZE, PRAGMA optimize) se anotan en
+la tabla ``mantenimiento`` y ``ejecutar_programadas`` lanza las que tocan
+según ``INTERVALOS_DIAS``. Al arrancar, la interfaz sólo ejecuta por su cuenta
+las baratas (``TAREAS_DESATENDIDAS``); el respaldo y VACUUM, que bloquean o
+cargan el disco, quedan para el menú o para ``mantenimiento programado``.
+
+    python -m cartronic mantenimiento respaldar [--destino copia.db]
+    python -m cartronic mantenimiento integridad [--rapida]
+    python -m cartronic mantenimiento compactar|analizar|optimizar|programado
+"""
+import argparse
+import datetime
+import glob
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+from conexion import RUTA_BD, abrir_conexion
+from migraciones import preparar_base_datos
+
+
+DIRECTORIO_RESPALDOS = 'respaldos'
+MAXIMO_RESPALDOS = 10
+PAGINAS_POR_PASO = 256
+PAUSA_ENTRE_PASOS = 0.005  # segundos
+
+# Tarea -> días entre ejecuciones programadas
+INTERVALOS_DIAS = {
+    'respaldo': 1,
+    'optimizar': 1,
+    'analizar': 7,
+    'compactar': 30,
+}
+# VACUUM reescribe todo el archivo: sólo compensa con bastante espacio libre
+FRACCION_LIBRE_COMPACTAR = 0.1
+# Tareas que la interfaz puede lanzar sin preguntar: no bloquean a los demás
+TAREAS_DESATENDIDAS = ('optimizar', 'analizar')
+
+
+class ResumenRespaldo(namedtuple('ResumenRespaldo', ['ruta', 'paginas', 'cancelado'])):
+    """Resultado de un respaldo; ``ruta`` es None si se canceló"""
+    __slots__ = ()
+
+
+class RespaldoCancelado(Exception):
+    """Interrumpe ``Connection.backup`` desde el callback de progreso"""
+
+
+def ruta_respaldo(ruta_bd, momento=None):
+    """Ruta por defecto de un respaldo: respaldos/clientes-AAAAMMDD-HHMMSS.db"""
+    momento = momento or datetime.datetime.now()
+    base = os.path.splitext(os.path.basename(ruta_bd))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_bd)), DIRECTORIO_RESPALDOS,
+                        f"{base}-{momento:%Y%m%d-%H%M%S}.db")
+
+
+def purgar_respaldos(ruta_bd, conservar=MAXIMO_RESPALDOS):
+    """Borrar los respaldos por defecto más antiguos y dejar ``conservar``"""
+    base = os.path.splitext(os.path.basename(ruta_bd))[0]
+    patron = os.path.join(os.path.dirname(os.path.abspath(ruta_bd)), DIRECTORIO_RESPALDOS,
+                          f"{base}-????????-??????.db")
+    # El nombre lleva la fecha, así que el orden alfabético es el cronológico
+    antiguos = sorted(glob.glob(patron))[:-conservar] if conservar > 0 else []
+    for ruta in antiguos:
+        os.remove(ruta)
+    return antiguos
+
+
+def respaldar(ruta_bd, destino=None, paginas=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS,
+              progreso=None, cancelacion=None, conservar=MAXIMO_RESPALDOS):
+    """Copiar la base de datos en uso a ``destino`` sin bloquear a los demás
+
+    Se copian ``paginas`` páginas por paso. En modo WAL la copia se hace
+    dentro de una transacción de lectura: las demás conexiones siguen
+    escribiendo y la copia refleja el estado del principio. Sin WAL, SQLite
+    vuelve a empezar la copia si otra conexión escribe entre dos pasos; en
+    ambos casos el resultado es coherente. Se escribe en un archivo temporal
+    que sólo se renombra a ``destino`` tras pasar ``quick_check``.
+    ``progreso(paginas_copiadas, fraccion)`` se llama tras cada paso. Con el
+    destino por defecto se conservan sólo los ``conservar`` respaldos más
+    recientes.
+    """
+    por_defecto = destino is None
+    destino = destino or ruta_respaldo(ruta_bd)
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    temporal = destino + '.parcial'
+    paginas_totales = 0
+
+    def avanzar(estado, restantes, total):
+        nonlocal paginas_totales
+        paginas_totales = total
+        if progreso is not None:
+            progreso(total - restantes, (total - restantes) / total if total else None)
+        if cancelacion is not None and cancelacion.is_set():
+            raise RespaldoCancelado()
+        # backup() sólo espera con ``sleep`` si la base está ocupada
+        if restantes:
+            time.sleep(pausa)
+
+    origen = abrir_conexion(ruta_bd)
+    copia = sqlite3.connect(temporal)
+    try:
+        try:
+            if origen.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                # Instantánea fija: sin ella, cada escritura ajena reinicia la copia
+                origen.execute("BEGIN")
+                origen.execute("SELECT COUNT(*) FROM sqlite_master").fetchall()
+            origen.backup(copia, pages=paginas, progress=avanzar)
+            # La copia es un archivo independiente, sin -wal
+            copia.execute("PRAGMA journal_mode = delete").fetchall()
+            comprobacion = copia.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            copia.close()
+            origen.close()
+        if comprobacion != 'ok':
+            raise sqlite3.DatabaseError(f"El respaldo no supera quick_check: {comprobacion}")
+    except RespaldoCancelado:
+        os.remove(temporal)
+        return ResumenRespaldo(None, paginas_totales, True)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    os.replace(temporal, destino)
+    if por_defecto:
+        purgar_respaldos(ruta_bd, conservar)
+    return ResumenRespaldo(destino, paginas_totales, False)
+
+
+def comprobar_integridad(conn, rapida=False):
+    """Problemas de ``integrity_check`` (o ``quick_check``) y de claves foráneas
+
+    Devuelve una lista vacía si la base de datos está bien.
+    """
+    pragma = 'quick_check' if rapida else 'integrity_check'
+    problemas = [fila[0] for fila in conn.execute(f"PRAGMA {pragma}").fetchall() if fila[0] != 'ok']
+    for tabla, fila_id, padre, _ in conn.execute("PRAGMA foreign_key_check").fetchall():
+        problemas.append(f"{tabla} fila {fila_id}: referencia inexistente en {padre}")
+    return problemas
+
+
+def tamano_bd(conn):
+    """(bytes del archivo, fracción de páginas libres)"""
+    paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+    libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    tamano_pagina = conn.execute("PRAGMA page_size").fetchone()[0]
+    return paginas * tamano_pagina, libres / paginas if paginas else 0.0
+
+
+def compactar(conn):
+    """VACUUM: reescribir el archivo sin páginas libres; devuelve (bytes antes, después)
+
+    Bloquea las escrituras de las demás conexiones mientras dura.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    antes, _ = tamano_bd(conn)
+    conn.execute("VACUUM")
+    despues, _ = tamano_bd(conn)
+    return antes, despues
+
+
+def analizar(conn):
+    """ANALYZE: actualizar las estadísticas que usa el planificador"""
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def optimizar(conn):
+    """PRAGMA optimize: ANALYZE sólo de lo que SQLite considera desactualizado"""
+    conn.execute("PRAGMA optimize").fetchall()
+    conn.commit()
+
+
+def registrar_ejecucion(conn, tarea, resultado=''):
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO mantenimiento (tarea, ultima_ejecucion, resultado)
+            VALUES (?, ?, ?)
+        """, (tarea, datetime.datetime.now().isoformat(timespec='seconds'), resultado))
+
+
+def ultimas_ejecuciones(conn):
+    """Diccionario tarea -> (última ejecución, resultado)"""
+    return {tarea: (ultima, resultado) for tarea, ultima, resultado in conn.execute(
+        "SELECT tarea, ultima_ejecucion, resultado FROM mantenimiento").fetchall()}
+
+
+def tareas_vencidas(conn, ahora=None, tareas=None):
+    """Tareas de ``INTERVALOS_DIAS`` (o sólo de ``tareas``) que ya deberían haberse ejecutado"""
+    ahora = ahora or datetime.datetime.now()
+    ultimas = ultimas_ejecuciones(conn)
+    vencidas = []
+    for tarea, dias in INTERVALOS_DIAS.items():
+        if tareas is not None and tarea not in tareas:
+            continue
+        if tarea in ultimas:
+            ultima = datetime.datetime.fromisoformat(ultimas[tarea][0])
+            if ahora - ultima < datetime.timedelta(days=dias):
+                continue
+        if tarea == 'compactar' and tamano_bd(conn)[1] < FRACCION_LIBRE_COMPACTAR:
+            continue
+        vencidas.append(tarea)
+    return vencidas
+
+
+def ejecutar_tarea(conn, ruta_bd, tarea, progreso=None, cancelacion=None):
+    """Ejecutar una tarea de mantenimiento, anotarla y devolver su resultado como texto"""
+    if tarea == 'respaldo':
+        resumen = respaldar(ruta_bd, progreso=progreso, cancelacion=cancelacion)
+        if resumen.cancelado:
+            return "cancelado"
+        resultado = resumen.ruta
+    elif tarea == 'compactar':
+        antes, despues = compactar(conn)
+        resultado = f"{antes / 1024 / 1024:.1f} MiB -> {despues / 1024 / 1024:.1f} MiB"
+    elif tarea == 'analizar':
+        analizar(conn)
+        resultado = "ok"
+    elif tarea == 'optimizar':
+        optimizar(conn)
+        resultado = "ok"
+    elif tarea == 'integridad':
+        problemas = comprobar_integridad(conn)
+        resultado = "ok" if not problemas else f"{len(problemas)} problemas"
+    else:
+        raise ValueError(f"Tarea de mantenimiento desconocida: {tarea}")
+    registrar_ejecucion(conn, tarea, resultado)
+    return resultado
+
+
+def ejecutar_programadas(ruta_bd, tareas=None, progreso=None, cancelacion=None):
+    """Ejecutar las tareas vencidas (de ``tareas``, si se indica) con una conexión propia
+
+    Devuelve una lista de (tarea, resultado).
+    """
+    conn = abrir_conexion(ruta_bd)
+    try:
+        realizadas = []
+        for tarea in tareas_vencidas(conn, tareas=tareas):
+            if cancelacion is not None and cancelacion.is_set():
+                break
+            realizadas.append((tarea, ejecutar_tarea(conn, ruta_bd, tarea, progreso, cancelacion)))
+        return realizadas
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Respaldo y mantenimiento de la base de datos")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    respaldo = subparsers.add_parser('respaldar', help="Copia en caliente de la base de datos")
+    respaldo.add_argument('--destino', help="Archivo de destino (por defecto, en respaldos/)")
+    respaldo.add_argument('--paginas', type=int, default=PAGINAS_POR_PASO,
+                          help="Páginas copiadas por paso")
+    integridad = subparsers.add_parser('integridad', help="PRAGMA integrity_check y foreign_key_check")
+    integridad.add_argument('--rapida', action='store_true', help="Usar quick_check")
+    subparsers.add_parser('compactar', help="VACUUM")
+    subparsers.add_parser('analizar', help="ANALYZE")
+    subparsers.add_parser('optimizar', help="PRAGMA optimize")
+    subparsers.add_parser('programado', help="Ejecutar las tareas que tocan según su intervalo")
+    args = parser.parse_args(argv)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        preparar_base_datos(conn)
+        if args.comando == 'respaldar':
+            resumen = respaldar(
+                args.bd, args.destino, paginas=args.paginas,
+                progreso=lambda n, f: print(f"\r{n} páginas copiadas ({f or 0:.0%})", end="",
+                                            file=sys.stderr))
+            print(file=sys.stderr)
+            registrar_ejecucion(conn, 'respaldo', resumen.ruta)
+            print(f"Respaldo en {resumen.ruta}")
+        elif args.comando == 'integridad':
+            problemas = comprobar_integridad(conn, args.rapida)
+            for problema in problemas:
+                print(problema)
+            print("Integridad correcta" if not problemas else f"{len(problemas)} problemas",
+                  file=sys.stderr)
+            if problemas:
+                sys.exit(1)
+        elif args.comando == 'programado':
+            for tarea in tareas_vencidas(conn):
+                print(f"{tarea}: {ejecutar_tarea(conn, args.bd, tarea)}")
+        else:
+            print(ejecutar_tarea(conn, args.bd, args.comando))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
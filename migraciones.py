@@ -0,0 +1,436 @@
+"""Esquema de la base de datos de clientes y sus migraciones
+
+El esquema evoluciona mediante migraciones numeradas. ``PRAGMA user_version``
+guarda la última aplicada, y cada migración pendiente se ejecuta una sola
+vez dentro de su propia transacción.
+
+Uso desde la línea de comandos:
+
+    python migraciones.py [--bd clientes.db]
+"""
+import argparse
+import sqlite3
+
+from conexion import RUTA_BD, abrir_conexion
+from normalizacion import normalizar, texto_cliente
+
+
+CATEGORIA_POR_DEFECTO = 'Clientes'
+ID_CATEGORIA_POR_DEFECTO = 1
+SELECCION_POR_DEFECTO = 'Selección'
+ID_SELECCION_POR_DEFECTO = 1
+
+def _esquema_base(cursor):
+    """Tablas categorias y clientes, incluidas columnas de versiones antiguas"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categorias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            correo TEXT NOT NULL UNIQUE,
+            telefono TEXT NOT NULL,
+            contacto TEXT NOT NULL,
+            categoria_id INTEGER DEFAULT 1,
+            FOREIGN KEY(categoria_id) REFERENCES categorias(id)
+        )
+    """)
+    # Bases creadas antes de existir estas columnas
+    cursor.execute("PRAGMA table_info(clientes)")
+    columnas = [columna[1] for columna in cursor.fetchall()]
+    if 'contacto' not in columnas:
+        cursor.execute("ALTER TABLE clientes ADD COLUMN contacto TEXT NOT NULL DEFAULT ''")
+    if 'categoria_id' not in columnas:
+        cursor.execute("ALTER TABLE clientes ADD COLUMN categoria_id INTEGER DEFAULT 1")
+
+    cursor.execute("""
+        INSERT OR IGNORE INTO categorias (id, nombre) VALUES (1, 'Clientes')
+    """)
+
+
+def _indices_clientes(cursor):
+    """Índices secundarios para categorías y nombres"""
+    # Cubre "correos de una categoría" sin leer la tabla y sirve también para
+    # el JOIN con categorias y para mover clientes al eliminar una categoría
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_clientes_categoria_correo
+        ON clientes (categoria_id, correo)
+    """)
+    # Búsquedas por prefijo sin distinguir mayúsculas (LIKE 'abc%')
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_clientes_nombre_nocase
+        ON clientes (nombre COLLATE NOCASE)
+    """)
+    cursor.execute("ANALYZE")
+
+
+def _cola_correos(cursor):
+    """Envíos masivos y cola persistente de destinatarios"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS envios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            remitente TEXT NOT NULL,
+            asunto TEXT NOT NULL,
+            cuerpo TEXT NOT NULL,
+            servidor TEXT NOT NULL,
+            puerto INTEGER NOT NULL,
+            usuario TEXT NOT NULL DEFAULT '',
+            starttls INTEGER NOT NULL DEFAULT 1,
+            creado TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cola_correos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            envio_id INTEGER NOT NULL REFERENCES envios(id) ON DELETE CASCADE,
+            correo TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            ultimo_error TEXT,
+            actualizado TEXT,
+            UNIQUE (envio_id, correo)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cola_correos_estado
+        ON cola_correos (envio_id, estado)
+    """)
+
+
+def _selecciones(cursor):
+    """Selecciones de clientes con nombre, guardadas por id de cliente"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS selecciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE,
+            creada TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS selecciones_clientes (
+            seleccion_id INTEGER NOT NULL REFERENCES selecciones(id) ON DELETE CASCADE,
+            cliente_id INTEGER NOT NULL REFERENCES clientes(id) ON DELETE CASCADE,
+            PRIMARY KEY (seleccion_id, cliente_id)
+        ) WITHOUT ROWID
+    """)
+    # Para el borrado en cascada al eliminar clientes
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_selecciones_clientes_cliente
+        ON selecciones_clientes (cliente_id)
+    """)
+    cursor.execute("INSERT OR IGNORE INTO selecciones (id, nombre) VALUES (?, ?)",
+                   (ID_SELECCION_POR_DEFECTO, SELECCION_POR_DEFECTO))
+
+
+def _texto_normalizado(cursor, tamano_lote=10000):
+    """Columnas normalizadas (sin tildes ni mayúsculas) para las búsquedas"""
+    cursor.execute("ALTER TABLE clientes ADD COLUMN texto_normalizado TEXT NOT NULL DEFAULT ''")
+    cursor.execute("ALTER TABLE categorias ADD COLUMN nombre_normalizado TEXT NOT NULL DEFAULT ''")
+
+    cursor.execute("SELECT id, nombre FROM categorias")
+    cursor.executemany("UPDATE categorias SET nombre_normalizado = ? WHERE id = ?",
+                       [(normalizar(nombre), categoria_id) for categoria_id, nombre in cursor.fetchall()])
+
+    # Por lotes de id para no modificar la tabla mientras se recorre
+    ultimo_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, nombre, contacto, correo, telefono FROM clientes
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (ultimo_id, tamano_lote))
+        lote = cursor.fetchall()
+        if not lote:
+            break
+        cursor.executemany("UPDATE clientes SET texto_normalizado = ? WHERE id = ?",
+                           [(texto_cliente(*fila[1:]), fila[0]) for fila in lote])
+        ultimo_id = lote[-1][0]
+
+
+def _calidad_datos(cursor):
+    """Claves de duplicados por cliente, candidatos a revisar y clientes por analizar
+
+    Los triggers anotan en ``calidad_pendientes`` cada cliente nuevo o
+    modificado, de modo que el análisis de ``calidad.py`` sólo recorre lo que
+    cambió desde la última vez. Al crearse, todos los clientes quedan pendientes.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calidad_claves (
+            cliente_id INTEGER PRIMARY KEY REFERENCES clientes(id) ON DELETE CASCADE,
+            telefono TEXT NOT NULL,
+            correo TEXT NOT NULL,
+            empresa TEXT NOT NULL,
+            problemas TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    for clave in ('telefono', 'correo', 'empresa'):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_calidad_claves_{clave} "
+                       f"ON calidad_claves ({clave})")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calidad_duplicados (
+            cliente_a INTEGER NOT NULL REFERENCES clientes(id) ON DELETE CASCADE,
+            cliente_b INTEGER NOT NULL REFERENCES clientes(id) ON DELETE CASCADE,
+            motivo TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            detectado TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (cliente_a, cliente_b, motivo)
+        ) WITHOUT ROWID
+    """)
+    # Para el borrado en cascada y para recalcular los pares de un cliente
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_calidad_duplicados_b ON calidad_duplicados (cliente_b)
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS calidad_pendientes (cliente_id INTEGER PRIMARY KEY)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS calidad_ai AFTER INSERT ON clientes BEGIN
+            INSERT OR IGNORE INTO calidad_pendientes (cliente_id) VALUES (new.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS calidad_au
+        AFTER UPDATE OF nombre, correo, telefono ON clientes BEGIN
+            INSERT OR IGNORE INTO calidad_pendientes (cliente_id) VALUES (new.id);
+        END
+    """)
+    cursor.execute("INSERT OR IGNORE INTO calidad_pendientes (cliente_id) SELECT id FROM clientes")
+
+
+# Columnas registradas en ``cambios`` por tabla (las normalizadas se derivan)
+COLUMNAS_CAMBIOS = {
+    'clientes': ('id', 'nombre', 'correo', 'telefono', 'contacto', 'categoria_id'),
+    'categorias': ('id', 'nombre'),
+}
+
+
+def _cambios(cursor):
+    """Registro de cambios (CDC) de clientes y categorías mantenido por triggers
+
+    Cada inserción, modificación o borrado añade una fila con una secuencia
+    creciente que nunca se reutiliza (AUTOINCREMENT) y los valores anterior y
+    nuevo como JSON. Los cambios previos a esta migración no se registran.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cambios (
+            secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            operacion TEXT NOT NULL,
+            fila_id INTEGER NOT NULL,
+            anterior TEXT,
+            nuevo TEXT,
+            momento TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for tabla, columnas in COLUMNAS_CAMBIOS.items():
+        anterior = "json_object(" + ", ".join(f"'{c}', old.{c}" for c in columnas) + ")"
+        nuevo = "json_object(" + ", ".join(f"'{c}', new.{c}" for c in columnas) + ")"
+        # Sin fila si sólo cambian columnas derivadas (p. ej. texto_normalizado)
+        distintas = " OR ".join(f"old.{c} IS NOT new.{c}" for c in columnas)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS cambios_{tabla}_ai AFTER INSERT ON {tabla} BEGIN
+                INSERT INTO cambios (tabla, operacion, fila_id, nuevo)
+                VALUES ('{tabla}', 'INSERT', new.id, {nuevo});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS cambios_{tabla}_au AFTER UPDATE ON {tabla}
+            WHEN {distintas} BEGIN
+                INSERT INTO cambios (tabla, operacion, fila_id, anterior, nuevo)
+                VALUES ('{tabla}', 'UPDATE', new.id, {anterior}, {nuevo});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS cambios_{tabla}_ad AFTER DELETE ON {tabla} BEGIN
+                INSERT INTO cambios (tabla, operacion, fila_id, anterior)
+                VALUES ('{tabla}', 'DELETE', old.id, {anterior});
+            END
+        """)
+
+
+def _mantenimiento(cursor):
+    """Última ejecución de cada tarea de mantenimiento, para programarlas"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mantenimiento (
+            tarea TEXT PRIMARY KEY,
+            ultima_ejecucion TEXT NOT NULL,
+            resultado TEXT NOT NULL DEFAULT ''
+        )
+    """)
+
+
+def _indices_orden(cursor, tamano_lote=10000):
+    """Claves de ordenación sin tildes e índices para ordenar la tabla de clientes
+
+    NOCASE sólo pliega las mayúsculas ASCII, así que "Álvarez" quedaría
+    detrás de "Zapata": el nombre y el contacto se ordenan por
+    ``nombre_orden`` y ``contacto_orden``, normalizados como
+    ``texto_normalizado``, y la categoría por ``nombre_normalizado``. Los
+    índices siguen ``busqueda.COLUMNAS_ORDEN`` (el correo usa el de UNIQUE) y,
+    como todo índice termina en el rowid, también resuelven el desempate por
+    id. Para la categoría se recorre categorias por su nombre normalizado y
+    los clientes de cada una por ``idx_clientes_categoria`` (categoria_id,
+    rowid) o, si después se ordena por nombre, por ``idx_clientes_categoria_nombre``.
+    """
+    cursor.execute("ALTER TABLE clientes ADD COLUMN nombre_orden TEXT NOT NULL DEFAULT ''")
+    cursor.execute("ALTER TABLE clientes ADD COLUMN contacto_orden TEXT NOT NULL DEFAULT ''")
+    ultimo_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, nombre, contacto FROM clientes
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (ultimo_id, tamano_lote))
+        lote = cursor.fetchall()
+        if not lote:
+            break
+        cursor.executemany("UPDATE clientes SET nombre_orden = ?, contacto_orden = ? WHERE id = ?",
+                           [(normalizar(nombre), normalizar(contacto), cliente_id)
+                            for cliente_id, nombre, contacto in lote])
+        ultimo_id = lote[-1][0]
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nombre_orden ON clientes (nombre_orden)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_contacto_orden ON clientes (contacto_orden)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_telefono ON clientes (telefono)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_categoria ON clientes (categoria_id)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_clientes_categoria_nombre
+        ON clientes (categoria_id, nombre_orden)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_categorias_nombre_normalizado
+        ON categorias (nombre_normalizado)
+    """)
+    cursor.execute("ANALYZE")
+
+
+def _sin_indice_nombre_nocase(cursor):
+    """Quitar ``idx_clientes_nombre_nocase`` (migración 2)
+
+    Desde la migración 9 el nombre se ordena por ``nombre_orden`` y las
+    búsquedas van por ``texto_normalizado``: ninguna consulta lo usa y cada
+    escritura lo seguía manteniendo.
+    """
+    cursor.execute("DROP INDEX IF EXISTS idx_clientes_nombre_nocase")
+
+
+# (versión, descripción, función) en orden; nunca se reescribe una publicada
+MIGRACIONES = [
+    (1, "Esquema base", _esquema_base),
+    (2, "Índices de clientes", _indices_clientes),
+    (3, "Cola de correos", _cola_correos),
+    (4, "Selecciones guardadas", _selecciones),
+    (5, "Texto normalizado para búsquedas", _texto_normalizado),
+    (6, "Calidad de datos y duplicados", _calidad_datos),
+    (7, "Registro de cambios", _cambios),
+    (8, "Registro de mantenimiento", _mantenimiento),
+    (9, "Índices de ordenación", _indices_orden),
+    (10, "Sin el índice NOCASE de nombre", _sin_indice_nombre_nocase),
+]
+
+
+def version_actual(conn):
+    """Leer la versión del esquema guardada en PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn):
+    """Aplicar las migraciones pendientes y devolver las versiones aplicadas"""
+    if conn.in_transaction:
+        conn.commit()
+    aplicadas = []
+    version = version_actual(conn)
+    for numero, descripcion, funcion in MIGRACIONES:
+        if numero <= version:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            funcion(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(numero)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas.append(numero)
+    return aplicadas
+
+
+def crear_indice_texto(cursor):
+    """Crear el índice FTS5 de clientes y reconstruirlo la primera vez
+
+    Indexa ``texto_normalizado``, así que las búsquedas no distinguen tildes.
+    Un índice de versiones anteriores (sobre las columnas originales) se
+    elimina y se vuelve a crear. Si SQLite no incluye FTS5 la búsqueda sigue
+    funcionando con LIKE.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'clientes_fts'")
+    fila = cursor.fetchone()
+    existia = fila is not None
+    if existia and 'texto_normalizado' not in fila[0]:
+        for trigger in ('clientes_fts_ai', 'clientes_fts_ad', 'clientes_fts_au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE clientes_fts")
+        existia = False
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+                texto_normalizado,
+                content='clientes', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+
+    # Mantener el índice sincronizado con la tabla clientes
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+            INSERT INTO clientes_fts (rowid, texto_normalizado)
+            VALUES (new.id, new.texto_normalizado);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, texto_normalizado)
+            VALUES ('delete', old.id, old.texto_normalizado);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_au
+        AFTER UPDATE OF texto_normalizado ON clientes BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, texto_normalizado)
+            VALUES ('delete', old.id, old.texto_normalizado);
+            INSERT INTO clientes_fts (rowid, texto_normalizado)
+            VALUES (new.id, new.texto_normalizado);
+        END
+    """)
+    if not existia:
+        cursor.execute("INSERT INTO clientes_fts (clientes_fts) VALUES ('rebuild')")
+
+
+def preparar_base_datos(conn):
+    """Dejar la base de datos lista para usar: migraciones e índice FTS5"""
+    aplicadas = migrar(conn)
+    crear_indice_texto(conn.cursor())
+    conn.commit()
+    return aplicadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aplicar las migraciones pendientes")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    args = parser.parse_args(argv)
+
+    conn = abrir_conexion(args.bd)
+    try:
+        aplicadas = preparar_base_datos(conn)
+        for numero, descripcion, _ in MIGRACIONES:
+            if numero in aplicadas:
+                print(f"Aplicada migración {numero}: {descripcion}")
+        print(f"Versión del esquema: {version_actual(conn)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
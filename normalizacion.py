@@ -0,0 +1,89 @@
+"""Normalización de texto para buscar sin distinguir mayúsculas ni tildes
+
+Los datos se normalizan una sola vez, al escribirlos, en las columnas
+``clientes.texto_normalizado`` y ``categorias.nombre_normalizado`` (y en las
+claves de ordenación ``nombre_orden`` y ``contacto_orden``); los
+términos de búsqueda pasan por la misma función, de modo que "Gomez"
+encuentra "Gómez" y "ÑANDU" encuentra "ñandú". También incluye la medida de
+similitud que ordena los resultados de la búsqueda aproximada.
+"""
+import unicodedata
+
+
+# Separa los campos dentro de texto_normalizado; nunca aparece en un término
+SEPARADOR = "\n"
+
+
+def normalizar(texto):
+    """Texto en minúsculas, sin tildes ni diacríticos y con espacios simples"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto or '').casefold())
+    sin_marcas = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_marcas.split())
+
+
+def texto_cliente(nombre, contacto, correo, telefono):
+    """Valor de ``clientes.texto_normalizado`` para los campos de un cliente"""
+    return SEPARADOR.join(normalizar(campo) for campo in (nombre, contacto, correo, telefono))
+
+
+def columnas_normalizadas(nombre, contacto, correo, telefono):
+    """Valores de ``texto_normalizado``, ``nombre_orden`` y ``contacto_orden`` de un cliente"""
+    return texto_cliente(nombre, contacto, correo, telefono), normalizar(nombre), normalizar(contacto)
+
+
+def trigramas(texto):
+    """Conjunto de trigramas de un texto (ya normalizado)"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def distancia_levenshtein(a, b, maximo=None):
+    """Número mínimo de inserciones, borrados o sustituciones entre dos textos
+
+    Con ``maximo`` el cálculo se abandona en cuanto la distancia lo supera y
+    se devuelve ``maximo + 1``.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if maximo is not None and len(a) - len(b) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, caracter_a in enumerate(a, 1):
+        actual = [i]
+        for j, caracter_b in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1,
+                              anterior[j - 1] + (caracter_a != caracter_b)))
+        if maximo is not None and min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+
+def similitud(termino, texto, minima=0.0):
+    """Parecido (0 a 1) entre un término y el fragmento más parecido del texto
+
+    El texto se recorre en ventanas de tantas palabras como tenga el término
+    y se compara con Levenshtein normalizado por la longitud. También se
+    compara el prefijo de cada ventana, para que "garci" puntúe alto con "garcía".
+    Los parecidos menores que ``minima`` se devuelven como 0.
+    """
+    palabras_termino = len(termino.split())
+    mejor = 0.0
+    for campo in texto.split(SEPARADOR):
+        palabras = campo.split()
+        for i in range(max(1, len(palabras) - palabras_termino + 1)):
+            ventana = " ".join(palabras[i:i + palabras_termino])
+            # Un prefijo que coincide puntúa algo menos que la palabra entera
+            for candidato, peso in ((ventana, 1.0), (ventana[:len(termino)], 0.95)):
+                if not candidato:
+                    continue
+                # Distancia máxima que aún mejoraría el resultado
+                longitud = max(len(termino), len(candidato))
+                maximo = int((1 - max(mejor, minima) / peso) * longitud + 1e-9)
+                if maximo < 0 or (maximo == 0 and mejor >= peso):
+                    continue
+                distancia = distancia_levenshtein(termino, candidato, maximo)
+                if distancia <= maximo:
+                    mejor = max(mejor, peso * (1 - distancia / longitud))
+                if mejor == 1:
+                    return mejor
+    return mejor
@@ -0,0 +1,319 @@
+"""Acceso a clientes y categorías sin dependencias de la interfaz
+
+``ClientRepository`` agrupa las operaciones que antes vivían dentro de
+``ClientDatabaseApp`` para que la interfaz, la línea de comandos y los
+scripts compartan el mismo código. No importa tkinter ni pyperclip.
+"""
+import os
+
+from busqueda import (MAXIMO_PARAMETROS, buscar, construir_filtro, consultar_cliente,
+                      consultar_clientes_por_id, consultar_pagina, contar_clientes,
+                      fts_disponible)
+from conexion import RUTA_BD, abrir_conexion
+from normalizacion import columnas_normalizadas, normalizar
+from migraciones import (CATEGORIA_POR_DEFECTO, ID_CATEGORIA_POR_DEFECTO,
+                         ID_SELECCION_POR_DEFECTO, preparar_base_datos, version_actual)
+
+
+class ClientRepository:
+    """Operaciones sobre clientes y categorías de una conexión SQLite
+
+    Los métodos que modifican datos confirman la transacción al terminar y
+    la deshacen si algo falla; los errores de SQLite (por ejemplo
+    ``sqlite3.IntegrityError`` por un correo repetido) llegan al llamador.
+    Con ``cache`` (una ``CacheBusquedas``) las búsquedas pasan por la caché y
+    cada escritura confirmada la invalida.
+    """
+
+    def __init__(self, conn, ruta=RUTA_BD, cache=None):
+        self.conn = conn
+        self.ruta = ruta
+        self.cache = cache
+        self.usar_fts = fts_disponible(conn)
+
+    @classmethod
+    def abrir(cls, ruta=RUTA_BD, preparar=True, cache=None):
+        """Abrir la base de datos y, si se pide, aplicar las migraciones pendientes"""
+        conn = abrir_conexion(ruta)
+        if preparar:
+            preparar_base_datos(conn)
+        return cls(conn, ruta, cache)
+
+    def cerrar(self):
+        self.conn.close()
+
+    def _transaccion(self, funcion, *args):
+        """Ejecutar ``funcion(cursor, *args)`` y confirmar, o deshacer si falla
+
+        Tras confirmar se invalida la caché de búsquedas, si la hay.
+        """
+        try:
+            resultado = funcion(self.conn.cursor(), *args)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if self.cache is not None:
+            self.cache.invalidar()
+        return resultado
+
+    # Búsqueda
+
+    def filtro(self, termino_nombre='', termino_categoria=''):
+        """Filtro de búsqueda con los mismos criterios que la interfaz"""
+        return construir_filtro(termino_nombre, termino_categoria, self.usar_fts)
+
+    def buscar(self, termino_nombre='', termino_categoria='', difusa=False, orden=(),
+               seleccion_id=None):
+        """Buscar clientes; los resultados grandes devuelven sólo la primera página"""
+        buscar_clientes = self.cache.buscar if self.cache is not None else buscar
+        return buscar_clientes(self.conn, termino_nombre, termino_categoria, self.usar_fts,
+                               difusa, orden, seleccion_id)
+
+    def contar(self, filtro):
+        return contar_clientes(self.conn, filtro)
+
+    def pagina(self, filtro, limite, **posicion):
+        """Leer una página del filtro (ver ``busqueda.consultar_pagina``)"""
+        return consultar_pagina(self.conn, filtro, limite, **posicion)
+
+    def cliente_en_filtro(self, filtro, cliente_id):
+        """Devolver el cliente si cumple el filtro, o None"""
+        return consultar_cliente(self.conn, filtro, cliente_id)
+
+    def clientes_en_filtro(self, filtro, cliente_ids, seleccion_id=None):
+        """Devolver los clientes indicados que cumplen el filtro"""
+        return consultar_clientes_por_id(self.conn, filtro, cliente_ids, seleccion_id)
+
+    # Clientes
+
+    def id_categoria(self, nombre_categoria):
+        """Id de una categoría por su nombre; ValueError si no existe"""
+        fila = self.conn.execute(
+            "SELECT id FROM categorias WHERE nombre = ?", (nombre_categoria,)).fetchone()
+        if fila is None:
+            raise ValueError(f"No existe la categoría '{nombre_categoria}'")
+        return fila[0]
+
+    def agregar_cliente(self, nombre, correo, telefono, contacto, categoria):
+        """Insertar un cliente y devolver su id"""
+        def insertar(cursor):
+            cursor.execute(
+                """INSERT INTO clientes
+                (nombre, correo, telefono, contacto, categoria_id,
+                 texto_normalizado, nombre_orden, contacto_orden)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (nombre, correo, telefono, contacto, self.id_categoria(categoria),
+                 *columnas_normalizadas(nombre, contacto, correo, telefono)))
+            return cursor.lastrowid
+        return self._transaccion(insertar)
+
+    def actualizar_cliente(self, cliente_id, nombre, correo, telefono, contacto, categoria):
+        """Modificar todos los datos de un cliente"""
+        def actualizar(cursor):
+            cursor.execute("""
+                UPDATE clientes
+                SET nombre=?, correo=?, telefono=?, contacto=?, categoria_id=?,
+                    texto_normalizado=?, nombre_orden=?, contacto_orden=?
+                WHERE id=?
+            """, (nombre, correo, telefono, contacto, self.id_categoria(categoria),
+                  *columnas_normalizadas(nombre, contacto, correo, telefono), cliente_id))
+        self._transaccion(actualizar)
+
+    # Operaciones en lote
+
+    def _leer_por_id(self, cursor, columnas, cliente_ids):
+        """Filas (id, *columnas) de los clientes indicados, por bloques de ids"""
+        filas = []
+        cliente_ids = list(cliente_ids)
+        for i in range(0, len(cliente_ids), MAXIMO_PARAMETROS):
+            parte = cliente_ids[i:i + MAXIMO_PARAMETROS]
+            marcadores = ", ".join("?" * len(parte))
+            cursor.execute(f"SELECT id, {columnas} FROM clientes WHERE id IN ({marcadores})", parte)
+            filas.extend(cursor.fetchall())
+        return filas
+
+    def mover_clientes(self, cliente_ids, categoria):
+        """Pasar varios clientes a otra categoría y devolver cuántos cambiaron"""
+        def mover(cursor):
+            categoria_id = self.id_categoria(categoria)
+            cursor.executemany("UPDATE clientes SET categoria_id = ? WHERE id = ?",
+                               [(categoria_id, cliente_id) for cliente_id in cliente_ids])
+            return cursor.rowcount
+        return self._transaccion(mover)
+
+    def eliminar_clientes(self, cliente_ids):
+        """Eliminar varios clientes y devolver los correos eliminados"""
+        def eliminar(cursor):
+            correos = [correo for _, correo in self._leer_por_id(cursor, "correo", cliente_ids)]
+            cursor.executemany("DELETE FROM clientes WHERE id = ?",
+                               [(cliente_id,) for cliente_id in cliente_ids])
+            return correos
+        return self._transaccion(eliminar)
+
+    def fusionar_clientes(self, id_conservado, ids_duplicados):
+        """Fusionar duplicados en ``id_conservado`` y devolver los correos eliminados
+
+        El cliente conservado mantiene su correo y su categoría; su nombre,
+        contacto o teléfono vacíos se completan con los del primer duplicado
+        que los tenga, y pasa a estar en las selecciones de todos ellos.
+        """
+        ids_duplicados = [i for i in ids_duplicados if i != id_conservado]
+
+        def fusionar(cursor):
+            filas = {fila[0]: fila[1:] for fila in self._leer_por_id(
+                cursor, "nombre, contacto, telefono, correo", [id_conservado, *ids_duplicados])}
+            if id_conservado not in filas:
+                raise ValueError(f"No existe el cliente {id_conservado}")
+            duplicados = [filas[i] for i in ids_duplicados if i in filas]
+            valores = [
+                actual or next((fila[columna] for fila in duplicados if fila[columna]), actual)
+                for columna, actual in enumerate(filas[id_conservado][:3])]
+            correo = filas[id_conservado][3]
+            cursor.execute("""
+                UPDATE clientes SET nombre = ?, contacto = ?, telefono = ?,
+                    texto_normalizado = ?, nombre_orden = ?, contacto_orden = ?
+                WHERE id = ?
+            """, (*valores, *columnas_normalizadas(*valores[:2], correo, valores[2]), id_conservado))
+            cursor.executemany("""
+                INSERT OR IGNORE INTO selecciones_clientes (seleccion_id, cliente_id)
+                SELECT seleccion_id, ? FROM selecciones_clientes WHERE cliente_id = ?
+            """, [(id_conservado, cliente_id) for cliente_id in ids_duplicados])
+            cursor.executemany("DELETE FROM clientes WHERE id = ?",
+                               [(cliente_id,) for cliente_id in ids_duplicados])
+            return [fila[3] for fila in duplicados]
+        return self._transaccion(fusionar)
+
+    # Categorías
+
+    def listar_categorias(self):
+        """Lista de (id, nombre) de todas las categorías"""
+        return self.conn.execute("SELECT id, nombre FROM categorias").fetchall()
+
+    def agregar_categoria(self, nombre):
+        """Crear una categoría y devolver su id"""
+        def insertar(cursor):
+            cursor.execute("INSERT INTO categorias (nombre, nombre_normalizado) VALUES (?, ?)",
+                           (nombre, normalizar(nombre)))
+            return cursor.lastrowid
+        return self._transaccion(insertar)
+
+    def eliminar_categoria(self, nombre):
+        """Eliminar una categoría moviendo sus clientes a la categoría por defecto
+
+        Devuelve cuántos clientes se movieron.
+        """
+        if nombre == CATEGORIA_POR_DEFECTO:
+            raise ValueError("No se puede eliminar la categoría por defecto")
+
+        def eliminar(cursor):
+            categoria_id = self.id_categoria(nombre)
+            cursor.execute("UPDATE clientes SET categoria_id = ? WHERE categoria_id = ?",
+                           (ID_CATEGORIA_POR_DEFECTO, categoria_id))
+            movidos = cursor.rowcount
+            cursor.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
+            return movidos
+        return self._transaccion(eliminar)
+
+    # Selecciones guardadas
+
+    def listar_selecciones(self):
+        """Lista de (id, nombre, clientes) de todas las selecciones"""
+        return self.conn.execute("""
+            SELECT s.id, s.nombre,
+                   (SELECT COUNT(*) FROM selecciones_clientes sc WHERE sc.seleccion_id = s.id)
+            FROM selecciones s
+            ORDER BY s.id
+        """).fetchall()
+
+    def crear_seleccion(self, nombre):
+        """Crear una selección vacía y devolver su id"""
+        def insertar(cursor):
+            cursor.execute("INSERT INTO selecciones (nombre) VALUES (?)", (nombre,))
+            return cursor.lastrowid
+        return self._transaccion(insertar)
+
+    def eliminar_seleccion(self, seleccion_id):
+        """Eliminar una selección (los clientes no se tocan)"""
+        if seleccion_id == ID_SELECCION_POR_DEFECTO:
+            raise ValueError("No se puede eliminar la selección por defecto")
+
+        def eliminar(cursor):
+            cursor.execute("DELETE FROM selecciones_clientes WHERE seleccion_id = ?", (seleccion_id,))
+            cursor.execute("DELETE FROM selecciones WHERE id = ?", (seleccion_id,))
+        self._transaccion(eliminar)
+
+    def contar_seleccion(self, seleccion_id):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM selecciones_clientes WHERE seleccion_id = ?",
+            (seleccion_id,)).fetchone()[0]
+
+    def anadir_a_seleccion(self, seleccion_id, cliente_ids):
+        """Añadir clientes a una selección y devolver cuántos no estaban ya"""
+        def anadir(cursor):
+            cursor.executemany(
+                "INSERT OR IGNORE INTO selecciones_clientes (seleccion_id, cliente_id) VALUES (?, ?)",
+                [(seleccion_id, cliente_id) for cliente_id in cliente_ids])
+            return cursor.rowcount
+        return self._transaccion(anadir)
+
+    def anadir_filtro_a_seleccion(self, seleccion_id, filtro):
+        """Añadir todos los clientes de un filtro sin pasar por Python"""
+        def anadir(cursor):
+            cursor.execute(
+                "INSERT OR IGNORE INTO selecciones_clientes (seleccion_id, cliente_id) "
+                "SELECT ?, c.id " + filtro.sql(), (seleccion_id, *filtro.params))
+            return cursor.rowcount
+        return self._transaccion(anadir)
+
+    def vaciar_seleccion(self, seleccion_id):
+        """Quitar todos los clientes de una selección"""
+        def vaciar(cursor):
+            cursor.execute("DELETE FROM selecciones_clientes WHERE seleccion_id = ?", (seleccion_id,))
+        self._transaccion(vaciar)
+
+    def ids_seleccion(self, seleccion_id):
+        """Ids de los clientes de una selección"""
+        cursor = self.conn.execute(
+            "SELECT cliente_id FROM selecciones_clientes WHERE seleccion_id = ?", (seleccion_id,))
+        return [fila[0] for fila in cursor.fetchall()]
+
+    # Correos
+
+    def correos_categoria(self, nombre_categoria):
+        """Correos de todos los clientes de una categoría"""
+        cursor = self.conn.execute("""
+            SELECT correo FROM clientes
+            WHERE categoria_id = (
+                SELECT id FROM categorias WHERE nombre = ?
+            )
+        """, (nombre_categoria,))
+        return [fila[0] for fila in cursor.fetchall()]
+
+    def correos_seleccion(self, seleccion_id):
+        """Correos de todos los clientes de una selección"""
+        cursor = self.conn.execute("""
+            SELECT c.correo FROM selecciones_clientes s
+            JOIN clientes c ON c.id = s.cliente_id
+            WHERE s.seleccion_id = ?
+        """, (seleccion_id,))
+        return [fila[0] for fila in cursor.fetchall()]
+
+    # Estadísticas
+
+    def estadisticas(self):
+        """Resumen de la base de datos: totales por categoría y versión del esquema"""
+        por_categoria = self.conn.execute("""
+            SELECT cat.nombre, COUNT(c.id)
+            FROM categorias cat
+            LEFT JOIN clientes c ON c.categoria_id = cat.id
+            GROUP BY cat.id
+            ORDER BY cat.nombre
+        """).fetchall()
+        return {
+            'clientes': self.conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0],
+            'categorias': por_categoria,
+            'version_esquema': version_actual(self.conn),
+            'fts5': self.usar_fts,
+            'tamano_bytes': os.path.getsize(self.ruta) if os.path.exists(self.ruta) else 0,
+        }
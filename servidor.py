@@ -0,0 +1,412 @@
+"""Servicio HTTP/JSON local para compartir la base de datos entre varios usuarios
+
+Con varias instancias de la interfaz abiertas sobre el mismo ``clientes.db``
+las escrituras simultáneas acaban en "database is locked". Este servidor
+(sólo biblioteca estándar) concentra el acceso: las lecturas usan un pool de
+conexiones de sólo lectura que trabajan en paralelo gracias a WAL y todas las
+escrituras pasan, en orden de llegada, por un único hilo escritor.
+
+    python -m cartronic servidor [--host 127.0.0.1] [--puerto 8765] [--lectores 4]
+
+Rutas (cuerpos y respuestas en JSON):
+
+    GET    /clientes?nombre=&categoria=&orden=categoria,-nombre&limite=&despues_de=&aproximada=1&total=1
+    GET    /clientes/ID
+    POST   /clientes            {"nombre", "correo", "telefono", "contacto", "categoria"}
+    PUT    /clientes/ID         (mismos campos)
+    DELETE /clientes/ID
+    GET    /categorias
+    POST   /categorias          {"nombre"}
+    DELETE /categorias/NOMBRE
+    GET    /exportar?formato=csv|jsonl&nombre=&categoria=
+    GET    /estadisticas
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import queue
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from busqueda import SELECCION_CLIENTES, interpretar_orden
+from conexion import RUTA_BD, abrir_conexion
+from exportacion import COLUMNAS, TAMANO_LOTE
+from migraciones import preparar_base_datos
+from repositorio import ClientRepository
+
+
+HOST = '127.0.0.1'
+PUERTO = 8765
+LECTORES = 4
+# Conexiones pendientes de aceptar; con las 5 de socketserver una ráfaga de
+# clientes ve retransmisiones de SYN (un segundo) o conexiones reiniciadas
+COLA_CONEXIONES = 64
+ESPERA_LECTOR = 10.0  # segundos esperando una conexión libre antes de responder 503
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+CAMPOS_CLIENTE = ('nombre', 'correo', 'telefono', 'contacto', 'categoria')
+
+
+class ErrorHTTP(Exception):
+    """Error con su código de estado HTTP"""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class PoolLectura:
+    """Repositorios de sólo lectura, uno por conexión, prestados por petición"""
+
+    def __init__(self, ruta_bd, tamano=LECTORES):
+        self._libres = queue.LifoQueue()
+        for _ in range(tamano):
+            conn = abrir_conexion(ruta_bd, check_same_thread=False)
+            conn.execute("PRAGMA query_only = 1")
+            self._libres.put(ClientRepository(conn, ruta_bd))
+
+    @contextlib.contextmanager
+    def repositorio(self, espera=ESPERA_LECTOR):
+        try:
+            repositorio = self._libres.get(timeout=espera)
+        except queue.Empty:
+            raise ErrorHTTP(503, "No hay conexiones de lectura libres")
+        try:
+            yield repositorio
+        finally:
+            if repositorio.conn.in_transaction:
+                repositorio.conn.rollback()
+            self._libres.put(repositorio)
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().cerrar()
+            except queue.Empty:
+                return
+
+
+class EscritorSerializado:
+    """Hilo único que aplica las escrituras en orden, con su propia conexión
+
+    ``ejecutar(funcion, *args)`` encola ``funcion(repositorio, *args)`` y
+    espera su resultado; al haber un solo escritor no hay bloqueos entre
+    escrituras.
+    """
+
+    def __init__(self, ruta_bd):
+        self.ruta_bd = ruta_bd
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._trabajar, name='escritor', daemon=True)
+        self._hilo.start()
+
+    def ejecutar(self, funcion, *args):
+        futuro = Future()
+        self._cola.put((funcion, args, futuro))
+        return futuro.result()
+
+    def detener(self):
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _trabajar(self):
+        repositorio = ClientRepository.abrir(self.ruta_bd, preparar=False)
+        try:
+            while True:
+                tarea = self._cola.get()
+                if tarea is None:
+                    return
+                funcion, args, futuro = tarea
+                try:
+                    futuro.set_result(funcion(repositorio, *args))
+                except Exception as e:
+                    futuro.set_exception(e)
+        finally:
+            repositorio.cerrar()
+
+
+def cliente_como_dict(fila):
+    return dict(zip(COLUMNAS, fila))
+
+
+def datos_cliente(cuerpo):
+    """Campos de un cliente en el orden de ``ClientRepository.agregar_cliente``"""
+    faltan = [campo for campo in CAMPOS_CLIENTE if not str(cuerpo.get(campo) or '').strip()]
+    if faltan:
+        raise ErrorHTTP(400, "Faltan campos: " + ", ".join(faltan))
+    return [str(cuerpo[campo]).strip() for campo in CAMPOS_CLIENTE]
+
+
+def _modificar_cliente(repositorio, cliente_id, datos):
+    if repositorio.cliente_en_filtro(repositorio.filtro(), cliente_id) is None:
+        raise ErrorHTTP(404, f"No existe el cliente {cliente_id}")
+    repositorio.actualizar_cliente(cliente_id, *datos)
+    return repositorio.cliente_en_filtro(repositorio.filtro(), cliente_id)
+
+
+def _eliminar_categoria(repositorio, nombre):
+    try:
+        repositorio.id_categoria(nombre)
+    except ValueError:
+        raise ErrorHTTP(404, f"No existe la categoría '{nombre}'")
+    return repositorio.eliminar_categoria(nombre)
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    """Despacha cada petición al método de ``RUTAS`` que corresponda"""
+
+    server_version = "CartronicAPI/1.0"
+
+    RUTAS = [
+        ('GET', re.compile(r'^/clientes$'), 'listar_clientes'),
+        ('POST', re.compile(r'^/clientes$'), 'crear_cliente'),
+        ('GET', re.compile(r'^/clientes/(\d+)$'), 'obtener_cliente'),
+        ('PUT', re.compile(r'^/clientes/(\d+)$'), 'modificar_cliente'),
+        ('DELETE', re.compile(r'^/clientes/(\d+)$'), 'eliminar_cliente'),
+        ('GET', re.compile(r'^/categorias$'), 'listar_categorias'),
+        ('POST', re.compile(r'^/categorias$'), 'crear_categoria'),
+        ('DELETE', re.compile(r'^/categorias/([^/]+)$'), 'eliminar_categoria'),
+        ('GET', re.compile(r'^/exportar$'), 'exportar'),
+        ('GET', re.compile(r'^/estadisticas$'), 'estadisticas'),
+    ]
+
+    def do_GET(self):
+        self.despachar('GET')
+
+    def do_POST(self):
+        self.despachar('POST')
+
+    def do_PUT(self):
+        self.despachar('PUT')
+
+    def do_DELETE(self):
+        self.despachar('DELETE')
+
+    def despachar(self, metodo):
+        partes = urlsplit(self.path)
+        self.consulta = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+        try:
+            for metodo_ruta, patron, nombre in self.RUTAS:
+                coincidencia = patron.match(partes.path)
+                if coincidencia and metodo_ruta == metodo:
+                    getattr(self, nombre)(*(unquote(g) for g in coincidencia.groups()))
+                    return
+            raise ErrorHTTP(404, f"Ruta desconocida: {metodo} {partes.path}")
+        except ErrorHTTP as e:
+            self.responder(e.estado, {'error': str(e)})
+        except sqlite3.IntegrityError as e:
+            self.responder(409, {'error': str(e)})
+        except ValueError as e:
+            self.responder(400, {'error': str(e)})
+        except sqlite3.OperationalError as e:
+            self.responder(503 if 'locked' in str(e) else 500, {'error': str(e)})
+        except Exception as e:
+            self.responder(500, {'error': str(e)})
+
+    def responder(self, estado, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def leer_cuerpo(self):
+        longitud = int(self.headers.get('Content-Length') or 0)
+        try:
+            cuerpo = json.loads(self.rfile.read(longitud) or b'{}')
+        except json.JSONDecodeError as e:
+            raise ErrorHTTP(400, f"JSON no válido: {e}")
+        if not isinstance(cuerpo, dict):
+            raise ErrorHTTP(400, "Se esperaba un objeto JSON")
+        return cuerpo
+
+    def entero(self, nombre, por_defecto=None):
+        valor = self.consulta.get(nombre)
+        if valor in (None, ''):
+            return por_defecto
+        try:
+            return int(valor)
+        except ValueError:
+            raise ErrorHTTP(400, f"'{nombre}' debe ser un número entero")
+
+    # Clientes
+
+    def listar_clientes(self):
+        """Página de resultados por clave: ``siguiente`` se pasa como ``despues_de``"""
+        nombre = self.consulta.get('nombre', '')
+        categoria = self.consulta.get('categoria', '')
+        limite = min(max(self.entero('limite', LIMITE_POR_DEFECTO), 1), LIMITE_MAXIMO)
+        orden = interpretar_orden(self.consulta.get('orden', ''))
+        with self.server.pool.repositorio() as repositorio:
+            if self.consulta.get('aproximada') == '1':
+                filas = repositorio.buscar(nombre, categoria, difusa=True, orden=orden).filas[:limite]
+                self.responder(200, {'clientes': [cliente_como_dict(f) for f in filas]})
+                return
+            filtro = repositorio.filtro(nombre, categoria)
+            filas = repositorio.pagina(filtro, limite, orden=orden,
+                                       despues_de_id=self.entero('despues_de', 0) or None)
+            respuesta = {
+                'clientes': [cliente_como_dict(f) for f in filas],
+                'siguiente': filas[-1][0] if len(filas) == limite else None,
+            }
+            if self.consulta.get('total') == '1':
+                respuesta['total'] = repositorio.contar(filtro)
+        self.responder(200, respuesta)
+
+    def obtener_cliente(self, cliente_id):
+        with self.server.pool.repositorio() as repositorio:
+            fila = repositorio.cliente_en_filtro(repositorio.filtro(), int(cliente_id))
+        if fila is None:
+            raise ErrorHTTP(404, f"No existe el cliente {cliente_id}")
+        self.responder(200, cliente_como_dict(fila))
+
+    def crear_cliente(self):
+        datos = datos_cliente(self.leer_cuerpo())
+        cliente_id = self.server.escritor.ejecutar(ClientRepository.agregar_cliente, *datos)
+        self.responder(201, {'id': cliente_id})
+
+    def modificar_cliente(self, cliente_id):
+        datos = datos_cliente(self.leer_cuerpo())
+        fila = self.server.escritor.ejecutar(_modificar_cliente, int(cliente_id), datos)
+        self.responder(200, cliente_como_dict(fila))
+
+    def eliminar_cliente(self, cliente_id):
+        correos = self.server.escritor.ejecutar(ClientRepository.eliminar_clientes, [int(cliente_id)])
+        if not correos:
+            raise ErrorHTTP(404, f"No existe el cliente {cliente_id}")
+        self.responder(200, {'eliminado': int(cliente_id)})
+
+    # Categorías
+
+    def listar_categorias(self):
+        with self.server.pool.repositorio() as repositorio:
+            categorias = repositorio.listar_categorias()
+        self.responder(200, [{'id': categoria_id, 'nombre': nombre} for categoria_id, nombre in categorias])
+
+    def crear_categoria(self):
+        nombre = str(self.leer_cuerpo().get('nombre') or '').strip()
+        if not nombre:
+            raise ErrorHTTP(400, "Falta el nombre de la categoría")
+        categoria_id = self.server.escritor.ejecutar(ClientRepository.agregar_categoria, nombre)
+        self.responder(201, {'id': categoria_id, 'nombre': nombre})
+
+    def eliminar_categoria(self, nombre):
+        movidos = self.server.escritor.ejecutar(_eliminar_categoria, nombre)
+        self.responder(200, {'eliminada': nombre, 'clientes_movidos': movidos})
+
+    # Exportación y estadísticas
+
+    def exportar(self):
+        """Volcar el resultado de una búsqueda como CSV o JSON Lines, por lotes"""
+        formato = self.consulta.get('formato', 'csv')
+        if formato not in ('csv', 'jsonl'):
+            raise ErrorHTTP(400, "Formato no soportado: use csv o jsonl")
+        with self.server.pool.repositorio() as repositorio:
+            filtro = repositorio.filtro(self.consulta.get('nombre', ''),
+                                        self.consulta.get('categoria', ''))
+            cursor = repositorio.conn.execute(SELECCION_CLIENTES + filtro.sql(), filtro.params)
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8' if formato == 'csv'
+                                 else 'application/x-ndjson; charset=utf-8')
+                self.send_header('Content-Disposition', f'attachment; filename="clientes.{formato}"')
+                # Sin Content-Length: el cuerpo termina al cerrar la conexión
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                salida = io.TextIOWrapper(self.wfile, encoding='utf-8', newline='',
+                                          write_through=True)
+                try:
+                    self._volcar(cursor, salida, formato)
+                except Exception as e:
+                    # El 200 ya salió: responder() metería otro estado en mitad
+                    # del cuerpo, así que sólo queda registrarlo y cortar
+                    self.log_error("Exportación interrumpida: %s", e)
+                    self.close_connection = True
+                finally:
+                    with contextlib.suppress(OSError, ValueError):
+                        salida.detach()
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def _volcar(cursor, salida, formato):
+        escritor = csv.writer(salida) if formato == 'csv' else None
+        if escritor is not None:
+            escritor.writerow(COLUMNAS)
+        while True:
+            lote = cursor.fetchmany(TAMANO_LOTE)
+            if not lote:
+                break
+            if escritor is not None:
+                escritor.writerows(lote)
+            else:
+                salida.writelines(json.dumps(cliente_como_dict(fila), ensure_ascii=False)
+                                  + "\n" for fila in lote)
+
+    def estadisticas(self):
+        with self.server.pool.repositorio() as repositorio:
+            estadisticas = repositorio.estadisticas()
+        estadisticas['categorias'] = dict(estadisticas['categorias'])
+        self.responder(200, estadisticas)
+
+    def log_message(self, formato, *args):
+        if self.server.registrar_peticiones:
+            super().log_message(formato, *args)
+
+    def log_error(self, formato, *args):
+        # Los errores se registran aunque no se registren las peticiones
+        super().log_message(formato, *args)
+
+
+class ServidorClientes(ThreadingHTTPServer):
+    """Servidor HTTP con un hilo por petición, pool de lectura y escritor único"""
+
+    daemon_threads = True
+    request_queue_size = COLA_CONEXIONES
+
+    def __init__(self, direccion, ruta_bd=RUTA_BD, lectores=LECTORES, registrar_peticiones=True):
+        conn = abrir_conexion(ruta_bd)
+        try:
+            preparar_base_datos(conn)
+        finally:
+            conn.close()
+        self.pool = PoolLectura(ruta_bd, lectores)
+        self.escritor = EscritorSerializado(ruta_bd)
+        self.registrar_peticiones = registrar_peticiones
+        super().__init__(direccion, ManejadorAPI)
+
+    def server_close(self):
+        super().server_close()
+        self.escritor.detener()
+        self.pool.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servir la base de datos de clientes por HTTP/JSON")
+    parser.add_argument('--bd', default=RUTA_BD, help="Base de datos SQLite")
+    parser.add_argument('--host', default=HOST, help="Dirección de escucha (por defecto sólo local)")
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--lectores', type=int, default=LECTORES,
+                        help="Conexiones de lectura en el pool")
+    args = parser.parse_args(argv)
+
+    servidor = ServidorClientes((args.host, args.puerto), args.bd, args.lectores)
+    print(f"Sirviendo {args.bd} en http://{args.host}:{servidor.server_port}", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
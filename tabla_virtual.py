@@ -0,0 +1,140 @@
+from busqueda import TAMANO_PAGINA
+
+
+class TablaVirtual:
+    """Desplazamiento virtual de un Treeview sobre un resultado paginado
+
+    El Treeview sólo contiene las filas visibles. Las filas se leen por
+    bloques con paginación por clave y se guardan en una ventana de precarga
+    alrededor de la posición actual; la barra de desplazamiento se dimensiona
+    con el total de filas del resultado en lugar de con los items de Tk.
+    """
+
+    def __init__(self, tabla, scrollbar, leer_pagina, pintar, margen=TAMANO_PAGINA):
+        self.tabla = tabla
+        self.scrollbar = scrollbar
+        self.leer_pagina = leer_pagina
+        self.pintar = pintar
+        self.margen = margen
+
+        self.activa = False
+        self.total = 0
+        self.posicion = 0
+        self.filas_visibles = 25
+        self._inicio = 0
+        self._filas = []
+
+        self.tabla.bind("<MouseWheel>", self._rueda, add="+")
+        self.tabla.bind("<Button-4>", lambda e: self._desplazar_filas(-3), add="+")
+        self.tabla.bind("<Button-5>", lambda e: self._desplazar_filas(3), add="+")
+        self.tabla.bind("<Prior>", lambda e: self._desplazar_filas(-self.filas_visibles), add="+")
+        self.tabla.bind("<Next>", lambda e: self._desplazar_filas(self.filas_visibles), add="+")
+        self.tabla.bind("<Configure>", self._medir, add="+")
+
+    def activar(self, total, filas):
+        """Mostrar un resultado de ``total`` filas cuya primera página es ``filas``"""
+        self.activa = True
+        self.total = total
+        self.posicion = 0
+        self._inicio = 0
+        self._filas = list(filas)
+        self.scrollbar.configure(command=self._desplazar)
+        self.tabla.configure(yscrollcommand=lambda *args: None)
+        self._pintar()
+
+    def desactivar(self):
+        """Volver al desplazamiento normal del Treeview"""
+        if not self.activa:
+            return
+        self.activa = False
+        self.total = 0
+        self._filas = []
+        self.scrollbar.configure(command=self.tabla.yview)
+        self.tabla.configure(yscrollcommand=self.scrollbar.set)
+
+    def recargar(self, total):
+        """Releer la ventana actual tras un cambio en el resultado"""
+        self.total = total
+        self._filas = []
+        self.ir_a(self.posicion)
+
+    def ir_a(self, posicion):
+        """Desplazar la ventana visible para que empiece en ``posicion``"""
+        posicion = max(0, min(posicion, self.total - self.filas_visibles))
+        self.posicion = posicion
+        self._asegurar_cache(posicion, min(posicion + self.filas_visibles, self.total))
+        self._pintar()
+
+    def _pintar(self):
+        """Pintar las filas visibles y actualizar la barra de desplazamiento"""
+        desde = self.posicion - self._inicio
+        self.pintar(self._filas[desde:desde + self.filas_visibles])
+        if self.total:
+            self.scrollbar.set(self.posicion / self.total,
+                               min(1.0, (self.posicion + self.filas_visibles) / self.total))
+
+    def _asegurar_cache(self, inicio, fin):
+        """Garantizar que las filas [inicio, fin) estén en la ventana de precarga"""
+        fin_cache = self._inicio + len(self._filas)
+        if self._filas and self._inicio <= inicio and fin <= fin_cache:
+            return
+
+        if self._filas and self._inicio <= inicio <= fin_cache:
+            # Avance contiguo: continuar a partir del último id leído
+            limite = fin + self.margen - fin_cache
+            self._filas.extend(self.leer_pagina(limite, despues_de_id=self._filas[-1][0]))
+        elif self._filas and inicio < self._inicio <= fin:
+            # Retroceso contiguo: leer hacia atrás desde el primer id
+            nuevo_inicio = max(0, inicio - self.margen)
+            anteriores = self.leer_pagina(self._inicio - nuevo_inicio,
+                                          antes_de_id=self._filas[0][0])
+            self._inicio -= len(anteriores)
+            self._filas[:0] = anteriores
+        else:
+            # Salto: se reposiciona una vez y se sigue por clave desde ahí
+            self._inicio = max(0, inicio - self.margen)
+            self._filas = self.leer_pagina(
+                fin - self._inicio + self.margen, posicion=self._inicio)
+
+        # Limitar la memoria de la ventana de precarga
+        maximo = self.filas_visibles + 4 * self.margen
+        if len(self._filas) > maximo:
+            if inicio - self._inicio > self.margen:
+                recorte = min(inicio - self._inicio - self.margen, len(self._filas) - maximo)
+                del self._filas[:recorte]
+                self._inicio += recorte
+            if len(self._filas) > maximo:
+                del self._filas[maximo:]
+
+    def _desplazar(self, accion, cantidad, unidad=None):
+        """Atender los comandos de la barra de desplazamiento"""
+        if accion == "moveto":
+            self.ir_a(int(float(cantidad) * self.total))
+        elif unidad == "pages":
+            self.ir_a(self.posicion + int(cantidad) * self.filas_visibles)
+        else:
+            self.ir_a(self.posicion + int(cantidad))
+
+    def _desplazar_filas(self, cantidad):
+        """Desplazar por filas desde la rueda o el teclado"""
+        if not self.activa:
+            return None
+        self.ir_a(self.posicion + cantidad)
+        return "break"
+
+    def _rueda(self, event):
+        """Rueda del ratón en Windows/macOS"""
+        return self._desplazar_filas(-3 if event.delta > 0 else 3)
+
+    def _medir(self, event=None):
+        """Recalcular cuántas filas caben en el Treeview"""
+        hijos = self.tabla.get_children()
+        caja = self.tabla.bbox(hijos[0]) if hijos else None
+        if not caja:
+            return
+        _, y, _, alto = caja
+        visibles = max(1, (self.tabla.winfo_height() - y) // alto)
+        if visibles != self.filas_visibles:
+            self.filas_visibles = visibles
+            if self.activa:
+                self.ir_a(self.posicion)
@@ -0,0 +1,70 @@
+import queue
+import threading
+
+
+class TareaSegundoPlano:
+    """Ejecutar una función larga en un hilo e informar al hilo de Tk
+
+    ``funcion`` recibe dos argumentos: una función ``progreso(*datos)`` que
+    puede llamar desde el hilo de trabajo y un ``threading.Event`` que se
+    activa al cancelar. Las notificaciones llegan a Tk por una cola que se
+    sondea con ``after()``, así que los callbacks siempre se ejecutan en el
+    hilo de la interfaz y sólo se entrega el último progreso pendiente.
+    """
+
+    def __init__(self, root, funcion, al_progresar, al_terminar, al_fallar,
+                 intervalo_ms=100):
+        self.root = root
+        self.funcion = funcion
+        self.al_progresar = al_progresar
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.intervalo_ms = intervalo_ms
+        self.cancelacion = threading.Event()
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+
+    def iniciar(self):
+        """Lanzar el hilo de trabajo y empezar a sondear sus mensajes"""
+        self._hilo.start()
+        self.root.after(self.intervalo_ms, self._sondear)
+
+    def cancelar(self):
+        """Pedir a la función que se detenga en cuanto pueda"""
+        self.cancelacion.set()
+
+    def _ejecutar(self):
+        """Cuerpo del hilo de trabajo"""
+        try:
+            resultado = self.funcion(self._progreso, self.cancelacion)
+        except Exception as e:
+            self._cola.put(('error', e))
+        else:
+            self._cola.put(('fin', resultado))
+
+    def _progreso(self, *datos):
+        """Encolar un aviso de progreso (hilo de trabajo)"""
+        self._cola.put(('progreso', datos))
+
+    def _sondear(self):
+        """Atender los mensajes del hilo de trabajo (hilo de Tk)"""
+        progreso = None
+        while True:
+            try:
+                tipo, dato = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == 'progreso':
+                progreso = dato
+                continue
+            if progreso is not None:
+                self.al_progresar(*progreso)
+            if tipo == 'fin':
+                self.al_terminar(dato)
+            else:
+                self.al_fallar(dato)
+            return
+
+        if progreso is not None:
+            self.al_progresar(*progreso)
+        self.root.after(self.intervalo_ms, self._sondear)
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conexion import abrir_conexion  # noqa: E402
+from migraciones import preparar_base_datos  # noqa: E402
+from repositorio import ClientRepository  # noqa: E402
+
+
+@pytest.fixture
+def ruta_bd(tmp_path):
+    """Base de datos vacía con el esquema actual"""
+    ruta = str(tmp_path / 'clientes.db')
+    conn = abrir_conexion(ruta)
+    preparar_base_datos(conn)
+    conn.close()
+    return ruta
+
+
+@pytest.fixture
+def conn(ruta_bd):
+    conn = abrir_conexion(ruta_bd)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def repositorio(ruta_bd):
+    repositorio = ClientRepository.abrir(ruta_bd, preparar=False)
+    yield repositorio
+    repositorio.cerrar()
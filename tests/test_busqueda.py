@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from busqueda import (SELECCION_CLIENTES, buscar, clausula_orden, construir_filtro,
+                      consultar_pagina, interpretar_orden)
+from normalizacion import normalizar
+
+
+NOMBRES = ["Álvarez", "alba", "Zapata", "Íñigo", "ibarra", "Ñandú", "nuñez", "Órdenes",
+           "oliva", "Éter", "Ébano", "Úbeda", "uribe", "García", "garcia"]
+CATEGORIAS = ["Óptica", "Agro", "zona", "Éxito"]
+
+# Claves de referencia en Python para cada columna de una fila de SELECCION_CLIENTES
+CLAVES = {
+    'nombre': lambda fila: normalizar(fila[1]),
+    'contacto': lambda fila: normalizar(fila[2]),
+    'telefono': lambda fila: fila[3],
+    'correo': lambda fila: fila[4],
+    'categoria': lambda fila: normalizar(fila[5]),
+}
+
+ORDENES = ["nombre", "-nombre", "contacto", "telefono", "-correo", "categoria",
+           "-categoria", "categoria,-nombre", "-categoria,correo", "contacto,-telefono"]
+
+
+@pytest.fixture
+def clientes(repositorio):
+    for categoria in CATEGORIAS:
+        repositorio.agregar_categoria(categoria)
+    azar = random.Random(0)
+    for i in range(120):
+        repositorio.agregar_cliente(
+            f"{azar.choice(NOMBRES)} {azar.choice(NOMBRES)}", f"cliente{i:03d}@ejemplo.com",
+            str(azar.randint(100, 140)), azar.choice(NOMBRES), azar.choice(CATEGORIAS))
+    return repositorio.conn
+
+
+def ordenar(filas, orden):
+    """Orden esperado: el id desempata en el sentido de la última columna"""
+    resultado = sorted(filas, key=lambda fila: fila[0], reverse=orden[-1][1])
+    for columna, descendente in reversed(orden):
+        resultado.sort(key=CLAVES[columna], reverse=descendente)
+    return [fila[0] for fila in resultado]
+
+
+def ids(filas):
+    return [fila[0] for fila in filas]
+
+
+@pytest.mark.parametrize('texto', ORDENES)
+def test_paginas_por_clave_siguen_el_orden(clientes, texto):
+    orden = interpretar_orden(texto)
+    filtro = construir_filtro('', '', usar_fts=True)
+    esperado = ordenar(buscar(clientes, '', '', True).filas, orden)
+
+    # Hacia delante, página a página desde la última fila leída
+    leidos = ids(consultar_pagina(clientes, filtro, 7, orden=orden))
+    while True:
+        pagina = ids(consultar_pagina(clientes, filtro, 7, despues_de_id=leidos[-1], orden=orden))
+        if not pagina:
+            break
+        leidos += pagina
+    assert leidos == esperado
+
+    # Hacia atrás desde la última página
+    leidos = esperado[-7:]
+    while True:
+        pagina = ids(consultar_pagina(clientes, filtro, 7, antes_de_id=leidos[0], orden=orden))
+        if not pagina:
+            break
+        leidos = pagina + leidos
+    assert leidos == esperado
+
+    # Saltos de la barra de desplazamiento
+    for posicion in (1, 50, 115):
+        pagina = consultar_pagina(clientes, filtro, 7, posicion=posicion, orden=orden)
+        assert ids(pagina) == esperado[posicion:posicion + 7]
+
+
+@pytest.mark.parametrize('termino,categoria', [('garcia', ''), ('', 'optica'), ('nandu', 'exito')])
+def test_orden_con_filtro(clientes, termino, categoria):
+    orden = interpretar_orden("-categoria,nombre")
+    filtro = construir_filtro(termino, categoria, usar_fts=True)
+    esperado = ordenar(buscar(clientes, termino, categoria, True).filas, orden)
+    assert esperado
+
+    leidos = ids(consultar_pagina(clientes, filtro, 5, orden=orden))
+    while len(leidos) < len(esperado):
+        leidos += ids(consultar_pagina(clientes, filtro, 5, despues_de_id=leidos[-1], orden=orden))
+    assert leidos == esperado
+
+
+def test_tildes_no_alteran_el_orden(repositorio):
+    for i, nombre in enumerate(["Zapata", "Íñigo", "Álvarez", "ñandú", "Ébano", "abril"]):
+        repositorio.agregar_cliente(nombre, f"c{i}@ejemplo.com", "1", "x", "Clientes")
+    filas = buscar(repositorio.conn, '', '', True, orden=interpretar_orden("nombre")).filas
+    assert [fila[1] for fila in filas] == ["abril", "Álvarez", "Ébano", "Íñigo", "ñandú", "Zapata"]
+
+
+@pytest.mark.parametrize('texto', ORDENES)
+def test_orden_por_indice_sin_ordenar_en_memoria(conn, texto):
+    conn.executemany("INSERT INTO categorias (nombre, nombre_normalizado) VALUES (?, ?)",
+                     [(f"Categoría {i}", f"categoria {i}") for i in range(5)])
+    conn.executemany("""
+        INSERT INTO clientes (nombre, correo, telefono, contacto, categoria_id,
+                              nombre_orden, contacto_orden)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(f"Cliente {i}", f"c{i}@ejemplo.com", str(i), "Ana", 1 + i % 6, f"cliente {i}", "ana")
+          for i in range(3000)])
+    conn.commit()
+    conn.execute("ANALYZE")
+    filtro = construir_filtro('', '', usar_fts=True)
+
+    query = (SELECCION_CLIENTES + filtro.sql() + clausula_orden(interpretar_orden(texto))
+             + " LIMIT 200")
+    plan = [fila[3] for fila in conn.execute("EXPLAIN QUERY PLAN " + query, filtro.params)]
+
+    # La primera columna sale de un índice; como mucho se ordenan los empates
+    # ("RIGHT PART OF ORDER BY"), nunca el resultado entero
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+
+def test_pagina_sin_fila_de_referencia(clientes):
+    orden = interpretar_orden("nombre")
+    filtro = construir_filtro('', '', usar_fts=True)
+    assert consultar_pagina(clientes, filtro, 5, despues_de_id=10_000, orden=orden) == []
+
+
+def test_orden_desconocido():
+    with pytest.raises(ValueError):
+        interpretar_orden("nombre,edad")
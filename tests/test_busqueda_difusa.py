@@ -0,0 +1,72 @@
+import pytest
+
+from busqueda import buscar, fts_disponible
+from normalizacion import distancia_levenshtein, normalizar, similitud, texto_cliente
+
+
+@pytest.mark.parametrize("a, b, distancia", [
+    ("", "", 0),
+    ("gomez", "gomez", 0),
+    ("gomes", "gomez", 1),
+    ("gmez", "gomez", 1),
+    ("gomezz", "gomez", 1),
+    ("kitten", "sitting", 3),
+    ("", "abc", 3),
+])
+def test_distancia_levenshtein(a, b, distancia):
+    assert distancia_levenshtein(a, b) == distancia
+    assert distancia_levenshtein(b, a) == distancia
+
+
+def test_distancia_con_maximo_se_abandona():
+    assert distancia_levenshtein("kitten", "sitting", maximo=1) == 2
+    assert distancia_levenshtein("a", "abcdef", maximo=2) == 3
+    assert distancia_levenshtein("gomes", "gomez", maximo=1) == 1
+
+
+def test_similitud_compara_con_el_fragmento_mas_parecido():
+    texto = texto_cliente("Construcciones Gómez", "Ana", "ana@ejemplo.com", "1")
+    assert similitud("gomez", texto) == 1.0
+    assert similitud("gomes", texto) == pytest.approx(0.8)
+    assert similitud("garci", texto_cliente("García", "", "", "")) == pytest.approx(0.95)
+    assert similitud("xyzxy", texto, minima=0.6) == 0.0
+
+
+def test_normalizar_quita_tildes_y_mayusculas():
+    assert normalizar("  ÑANDÚ   Gómez ") == "nandu gomez"
+
+
+@pytest.fixture
+def clientes(repositorio):
+    for i, (nombre, contacto) in enumerate([("Construcciones Gómez", "Ana"),
+                                            ("Gómara S.L.", "Luis"),
+                                            ("Ferretería Ortega", "Pía"),
+                                            ("Talleres Norte", "Óscar Gomes")]):
+        repositorio.agregar_cliente(nombre, f"c{i}@ejemplo.com", str(i), contacto, "Clientes")
+    return repositorio
+
+
+@pytest.mark.parametrize("usar_fts", [False, True])
+def test_busqueda_difusa_tolera_errores(clientes, usar_fts):
+    if usar_fts and not fts_disponible(clientes.conn):
+        pytest.skip("SQLite sin FTS5")
+
+    resultado = buscar(clientes.conn, "gomz", "", usar_fts, difusa=True)
+
+    assert resultado.difusa and resultado.total is None
+    nombres = [fila[1] for fila in resultado.filas]
+    assert set(nombres) == {"Construcciones Gómez", "Talleres Norte", "Gómara S.L."}
+    assert "Ferretería Ortega" not in nombres
+    # Sin orden, del más al menos parecido
+    assert nombres[0] == "Construcciones Gómez"
+
+
+def test_busqueda_exacta_no_distingue_tildes(clientes):
+    filas = buscar(clientes.conn, "GOMEZ", "", fts_disponible(clientes.conn)).filas
+    assert [fila[1] for fila in filas] == ["Construcciones Gómez"]
+
+
+def test_busqueda_difusa_con_orden(clientes):
+    resultado = buscar(clientes.conn, "gomz", "", difusa=True, orden=(('nombre', False),))
+    assert [fila[1] for fila in resultado.filas] == [
+        "Construcciones Gómez", "Gómara S.L.", "Talleres Norte"]
@@ -0,0 +1,70 @@
+import pytest
+
+from busqueda import buscar, fts_disponible
+from cache_busquedas import CacheBusquedas
+from conexion import abrir_conexion
+from repositorio import ClientRepository
+
+
+NOMBRES = ["García Hnos.", "Garcés", "Gargallo", "Ortega", "García López", "Gardel"]
+
+
+@pytest.fixture
+def repositorio_cache(ruta_bd):
+    repositorio = ClientRepository.abrir(ruta_bd, preparar=False, cache=CacheBusquedas())
+    for i, nombre in enumerate(NOMBRES):
+        repositorio.agregar_cliente(nombre, f"c{i}@ejemplo.com", str(i), "Ana", "Clientes")
+    repositorio.cache.invalidar()
+    yield repositorio
+    repositorio.cerrar()
+
+
+def contadores(cache):
+    return cache.aciertos, cache.refinados, cache.fallos
+
+
+def test_refina_en_memoria_el_resultado_anterior(repositorio_cache):
+    repositorio, cache = repositorio_cache, repositorio_cache.cache
+    orden = (('nombre', False),)
+
+    repositorio.buscar("gar", orden=orden)
+    refinado = repositorio.buscar("garc", orden=orden)
+    assert contadores(cache) == (0, 1, 1)
+    assert refinado == buscar(repositorio.conn, "garc", "", repositorio.usar_fts, orden=orden)
+    assert [fila[1] for fila in refinado.filas] == ["Garcés", "García Hnos.", "García López"]
+
+    assert repositorio.buscar("garc", orden=orden) == refinado
+    assert contadores(cache) == (1, 1, 1)
+
+
+def test_escribir_invalida_la_cache(repositorio_cache):
+    repositorio, cache = repositorio_cache, repositorio_cache.cache
+    repositorio.buscar("gar")
+    repositorio.agregar_cliente("Garrido", "garrido@ejemplo.com", "9", "Luis", "Clientes")
+
+    assert "Garrido" in [fila[1] for fila in repositorio.buscar("garr").filas]
+    assert contadores(cache) == (0, 0, 2)
+
+
+def test_escritura_de_otra_conexion_invalida_la_cache(repositorio_cache, ruta_bd):
+    repositorio = repositorio_cache
+    assert len(repositorio.buscar("gar").filas) == 5
+
+    otra = abrir_conexion(ruta_bd)
+    with otra:
+        otra.execute("DELETE FROM clientes WHERE nombre = 'Gardel'")
+    otra.close()
+
+    assert len(repositorio.buscar("gar").filas) == 4
+    assert repositorio.cache.aciertos == 0
+
+
+def test_no_refina_resultados_ordenados_por_rango(repositorio_cache):
+    repositorio, cache = repositorio_cache, repositorio_cache.cache
+    if not fts_disponible(repositorio.conn):
+        pytest.skip("SQLite sin FTS5")
+
+    repositorio.buscar("gar")
+    resultado = repositorio.buscar("garcia")
+    assert contadores(cache) == (0, 0, 2)
+    assert resultado == buscar(repositorio.conn, "garcia", "", True)
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from calidad import (MAXIMO_GRUPO, analizar_calidad, candidatos_duplicados, clave_empresa,
+                     descartar_duplicado, normalizar_correo, normalizar_telefono,
+                     problemas_calidad)
+
+
+def pendientes(conn):
+    return {fila[0] for fila in conn.execute("SELECT cliente_id FROM calidad_pendientes")}
+
+
+def pares(conn):
+    return {(a, b): set(motivos.split(", ")) for a, b, motivos, *_ in candidatos_duplicados(conn)}
+
+
+@pytest.mark.parametrize("telefono, clave", [
+    ("+54 9 341 555-1234", "3415551234"),
+    ("(341) 555 1234", "3415551234"),
+    ("555-12", ""),
+    (None, ""),
+])
+def test_normalizar_telefono(telefono, clave):
+    assert normalizar_telefono(telefono) == clave
+
+
+@pytest.mark.parametrize("correo, clave", [
+    (" Ana.Perez+ofertas@Gmail.com", "anaperez@gmail.com"),
+    ("ana.perez@googlemail.com", "anaperez@gmail.com"),
+    ("ana.perez+x@empresa.com", "ana.perez@empresa.com"),
+    ("sin-arroba", ""),
+])
+def test_normalizar_correo(correo, clave):
+    assert normalizar_correo(correo) == clave
+
+
+def test_clave_empresa_sin_forma_juridica():
+    assert clave_empresa("Construcciones Gómez S.R.L.") == clave_empresa("construcciones gomez")
+    assert clave_empresa("Ábaco, S.A.") == "abaco"
+
+
+@pytest.fixture
+def clientes(repositorio):
+    agregar = repositorio.agregar_cliente
+    return [
+        agregar("Gómez S.A.", "ana.perez@gmail.com", "+54 341 555-1234", "Ana", "Clientes"),
+        agregar("Gomez", "anaperez+feria@gmail.com", "(341) 555 1234", "Ana", "Clientes"),
+        agregar("Ortega", "ortega@ejemplo.com", "341 555 9999", "Luis", "Clientes"),
+        agregar("Ferretería Ortega", "ventas@ortega.com", "341 555 9999", "Pía", "Clientes"),
+        agregar("Sin relación", "nadie@ejemplo", "12", "Eva", "Clientes"),
+    ]
+
+
+def test_duplicados_por_clave_de_bloqueo(repositorio, clientes):
+    a, b, c, d, e = clientes
+    assert pendientes(repositorio.conn) == set(clientes)
+
+    resumen = analizar_calidad(repositorio.conn, tamano_lote=2)
+
+    assert (resumen.analizados, resumen.candidatos, resumen.problemas) == (5, 2, 1)
+    assert pendientes(repositorio.conn) == set()
+    # Primero los pares que coinciden en más claves
+    assert list(pares(repositorio.conn).items()) == [
+        ((a, b), {"mismo teléfono", "mismo correo", "misma empresa"}),
+        ((c, d), {"mismo teléfono"}),
+    ]
+    assert problemas_calidad(repositorio.conn) == [
+        (e, "Sin relación", "nadie@ejemplo", "12", "correo mal formado, teléfono incompleto")]
+
+
+def test_solo_se_analizan_los_clientes_modificados(repositorio, clientes):
+    a, b, c, d, e = clientes
+    analizar_calidad(repositorio.conn)
+
+    repositorio.actualizar_cliente(d, "Ferretería Ortega", "ventas@ortega.com", "341 555 0000",
+                                   "Pía", "Clientes")
+    assert pendientes(repositorio.conn) == {d}
+
+    resumen = analizar_calidad(repositorio.conn)
+
+    assert (resumen.analizados, resumen.candidatos) == (1, 1)
+    assert list(pares(repositorio.conn)) == [(a, b)]
+
+
+def test_par_descartado_no_se_vuelve_a_proponer(repositorio, clientes):
+    a, b, c, d, e = clientes
+    analizar_calidad(repositorio.conn)
+
+    descartar_duplicado(repositorio.conn, d, c)
+    assert list(pares(repositorio.conn)) == [(a, b)]
+
+    # Ni siquiera cuando uno de los dos se modifica y se vuelve a analizar
+    repositorio.actualizar_cliente(c, "Ortega Hnos.", "ortega@ejemplo.com", "341 555 9999",
+                                   "Luis", "Clientes")
+    resumen = analizar_calidad(repositorio.conn)
+    assert (resumen.analizados, resumen.candidatos) == (1, 1)
+    assert list(pares(repositorio.conn)) == [(a, b)]
+
+
+def test_clave_demasiado_repetida_no_propone_pares(repositorio):
+    for i in range(MAXIMO_GRUPO + 1):
+        repositorio.agregar_cliente(f"Cliente {i}", f"c{i}@ejemplo.com", "000 000 0000", "Ana",
+                                    "Clientes")
+
+    assert analizar_calidad(repositorio.conn).candidatos == 0
+
+
+def test_analisis_cancelado_continua_donde_quedo(repositorio, clientes):
+    cancelacion = threading.Event()
+
+    def progreso(analizados, fraccion):
+        cancelacion.set()
+
+    resumen = analizar_calidad(repositorio.conn, tamano_lote=2, progreso=progreso,
+                               cancelacion=cancelacion)
+
+    assert (resumen.analizados, resumen.cancelado) == (2, True)
+    assert len(pendientes(repositorio.conn)) == 3
+    assert analizar_calidad(repositorio.conn).analizados == 3
@@ -0,0 +1,68 @@
+from cambios import leer_cambios, purgar_cambios, ultima_secuencia
+
+
+def test_triggers_registran_cada_operacion(repositorio):
+    desde = ultima_secuencia(repositorio.conn)
+    cliente_id = repositorio.agregar_cliente("Ábaco", "abaco@ejemplo.com", "1", "Ana", "Clientes")
+    repositorio.actualizar_cliente(cliente_id, "Ábaco S.A.", "abaco@ejemplo.com", "1", "Ana",
+                                   "Clientes")
+    repositorio.agregar_categoria("Óptica")
+    repositorio.eliminar_clientes([cliente_id])
+
+    cambios = list(leer_cambios(repositorio.conn, desde))
+
+    assert [(c.tabla, c.operacion, c.fila_id) for c in cambios] == [
+        ('clientes', 'INSERT', cliente_id),
+        ('clientes', 'UPDATE', cliente_id),
+        ('categorias', 'INSERT', cambios[2].fila_id),
+        ('clientes', 'DELETE', cliente_id),
+    ]
+    assert [c.secuencia for c in cambios] == sorted(c.secuencia for c in cambios)
+    alta, modificacion, categoria, baja = cambios
+    assert alta.anterior is None
+    assert alta.nuevo == {'id': cliente_id, 'nombre': "Ábaco", 'correo': "abaco@ejemplo.com",
+                          'telefono': "1", 'contacto': "Ana", 'categoria_id': 1}
+    assert (modificacion.anterior['nombre'], modificacion.nuevo['nombre']) == ("Ábaco", "Ábaco S.A.")
+    assert categoria.nuevo['nombre'] == "Óptica"
+    assert (baja.anterior['nombre'], baja.nuevo) == ("Ábaco S.A.", None)
+    assert ultima_secuencia(repositorio.conn) == baja.secuencia
+
+
+def test_sin_cambios_reales_no_se_registra_nada(repositorio):
+    cliente_id = repositorio.agregar_cliente("Ábaco", "abaco@ejemplo.com", "1", "Ana", "Clientes")
+    desde = ultima_secuencia(repositorio.conn)
+
+    repositorio.actualizar_cliente(cliente_id, "Ábaco", "abaco@ejemplo.com", "1", "Ana", "Clientes")
+    repositorio.conn.execute("UPDATE clientes SET texto_normalizado = '' WHERE id = ?", (cliente_id,))
+    repositorio.conn.commit()
+
+    assert list(leer_cambios(repositorio.conn, desde)) == []
+
+
+def test_lectura_por_lotes_y_por_tabla(repositorio):
+    desde = ultima_secuencia(repositorio.conn)
+    for i in range(7):
+        repositorio.agregar_cliente(f"Cliente {i}", f"c{i}@ejemplo.com", str(i), "Ana", "Clientes")
+    repositorio.agregar_categoria("Óptica")
+
+    cambios = list(leer_cambios(repositorio.conn, desde, tamano_lote=3))
+    assert len(cambios) == 8
+    assert len({c.secuencia for c in cambios}) == 8
+    assert [c.tabla for c in leer_cambios(repositorio.conn, desde, 'categorias', 3)] == [
+        'categorias']
+    # Continuar desde una secuencia intermedia devuelve sólo lo posterior
+    assert list(leer_cambios(repositorio.conn, cambios[4].secuencia)) == cambios[5:]
+
+
+def test_purgar_no_reutiliza_secuencias(repositorio):
+    for i in range(3):
+        repositorio.agregar_cliente(f"Cliente {i}", f"c{i}@ejemplo.com", str(i), "Ana", "Clientes")
+    hasta = ultima_secuencia(repositorio.conn)
+    total = repositorio.conn.execute("SELECT COUNT(*) FROM cambios").fetchone()[0]
+
+    assert purgar_cambios(repositorio.conn, hasta) == total
+    assert list(leer_cambios(repositorio.conn)) == []
+
+    repositorio.agregar_cliente("Nuevo", "nuevo@ejemplo.com", "9", "Eva", "Clientes")
+    cambios = list(leer_cambios(repositorio.conn, hasta))
+    assert [c.secuencia for c in cambios] == [hasta + 1]
@@ -0,0 +1,171 @@
+import socketserver
+import threading
+import time
+from email import message_from_string
+
+import pytest
+from smtplib import SMTPAuthenticationError
+
+from correo_masivo import (ENVIADO, FALLIDO, ConfiguracionSMTP, MotorCorreo, crear_envio,
+                           encolar_correos)
+
+
+class ManejadorSMTP(socketserver.StreamRequestHandler):
+    """SMTP mínimo: los destinatarios "rechazado" dan 550 y "temporal" un 451 la primera vez
+
+    Si el servidor tiene ``autenticacion`` anuncia AUTH y rechaza cualquier credencial.
+    """
+
+    def responder(self, linea):
+        self.wfile.write(linea.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.abiertas += 1
+        try:
+            self.conversar()
+        finally:
+            with self.server.lock:
+                self.server.abiertas -= 1
+
+    def conversar(self):
+        servidor = self.server
+        remitente, destinatarios = None, []
+        self.responder("220 prueba ESMTP")
+        for linea in self.rfile:
+            comando = linea.decode('utf-8').strip()
+            verbo = comando.split(' ', 1)[0].upper()
+            if verbo == 'EHLO' and servidor.autenticacion:
+                self.responder("250-prueba")
+                self.responder("250 AUTH PLAIN LOGIN")
+            elif verbo in ('EHLO', 'HELO'):
+                self.responder("250 prueba")
+            elif verbo == 'AUTH':
+                self.responder("535 Credenciales incorrectas")
+            elif verbo == 'MAIL':
+                remitente, destinatarios = comando.split(':', 1)[1].strip('<> '), []
+                self.responder("250 OK")
+            elif verbo == 'RCPT':
+                destinatario = comando.split(':', 1)[1].strip('<> ')
+                with servidor.lock:
+                    temporal = (destinatario.startswith('temporal')
+                                and destinatario not in servidor.diferidos)
+                    servidor.diferidos.add(destinatario)
+                if destinatario.startswith('rechazado'):
+                    self.responder("550 Buzon inexistente")
+                elif temporal:
+                    self.responder("451 Intentelo mas tarde")
+                else:
+                    destinatarios.append(destinatario)
+                    self.responder("250 OK")
+            elif verbo == 'DATA':
+                self.responder("354 Fin con <CRLF>.<CRLF>")
+                datos = []
+                for linea_datos in self.rfile:
+                    if linea_datos in (b".\r\n", b".\n"):
+                        break
+                    datos.append(linea_datos.decode('utf-8'))
+                with servidor.lock:
+                    servidor.recibidos.append(
+                        (time.monotonic(), remitente, destinatarios, "".join(datos)))
+                self.responder("250 OK")
+            elif verbo in ('RSET', 'NOOP'):
+                remitente, destinatarios = None, []
+                self.responder("250 OK")
+            elif verbo == 'QUIT':
+                self.responder("221 Adios")
+                return
+            else:
+                self.responder("502 No implementado")
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ManejadorSMTP)
+        self.lock = threading.Lock()
+        self.recibidos = []
+        self.diferidos = set()
+        self.abiertas = 0
+        self.autenticacion = False
+
+
+@pytest.fixture
+def smtp():
+    servidor = ServidorSMTP()
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def enviar(conn, smtp, correos, usuario='', **opciones):
+    configuracion = ConfiguracionSMTP('127.0.0.1', smtp.server_address[1], usuario, 'clave', False)
+    envio_id = crear_envio(conn, 'ventas@cartronic.com', 'Novedades', 'Hola', configuracion)
+    encolar_correos(conn, envio_id, correos)
+    opciones.setdefault('por_segundo', 0)
+    motor = MotorCorreo(configuracion, espera_inicial=0.01, timeout=5, **opciones)
+    return envio_id, motor.procesar(conn, envio_id)
+
+
+def estados(conn, envio_id):
+    return {correo: (estado, intentos, error) for correo, estado, intentos, error in conn.execute(
+        "SELECT correo, estado, intentos, ultimo_error FROM cola_correos WHERE envio_id = ?",
+        (envio_id,))}
+
+
+def test_un_mensaje_por_destinatario(conn, smtp):
+    correos = [f"cliente{i}@ejemplo.com" for i in range(6)]
+    envio_id, resumen = enviar(conn, smtp, correos)
+
+    assert (resumen.enviados, resumen.fallidos, resumen.pendientes) == (6, 0, 0)
+    assert sorted(destinatarios[0] for _, _, destinatarios, _ in smtp.recibidos) == correos
+    for _, remitente, destinatarios, datos in smtp.recibidos:
+        assert remitente == 'ventas@cartronic.com'
+        assert len(destinatarios) == 1
+        assert message_from_string(datos)['To'] == destinatarios[0]
+    assert {estado for estado, _, _ in estados(conn, envio_id).values()} == {ENVIADO}
+
+
+def test_rechazo_550_marca_fallido_sin_reintentar(conn, smtp):
+    envio_id, resumen = enviar(conn, smtp, ['rechazado@ejemplo.com', 'bien@ejemplo.com'])
+
+    assert (resumen.enviados, resumen.fallidos) == (1, 1)
+    estado, intentos, error = estados(conn, envio_id)['rechazado@ejemplo.com']
+    assert (estado, intentos) == (FALLIDO, 1)
+    assert error.startswith('550')
+    assert [destinatarios for _, _, destinatarios, _ in smtp.recibidos] == [['bien@ejemplo.com']]
+
+
+def test_error_temporal_se_reintenta(conn, smtp):
+    envio_id, resumen = enviar(conn, smtp, ['temporal@ejemplo.com'], reintentos=2)
+
+    assert resumen.enviados == 1
+    assert estados(conn, envio_id)['temporal@ejemplo.com'][:2] == (ENVIADO, 2)
+
+
+def test_limite_de_mensajes_por_segundo(conn, smtp):
+    por_segundo = 20
+    correos = [f"cliente{i}@ejemplo.com" for i in range(10)]
+    _, resumen = enviar(conn, smtp, correos, hilos=4, por_segundo=por_segundo)
+
+    assert resumen.enviados == len(correos)
+    llegadas = sorted(llegada for llegada, _, _, _ in smtp.recibidos)
+    # Aunque haya cuatro hilos, los envíos se espacian 1/por_segundo entre sí
+    assert llegadas[-1] - llegadas[0] >= (len(correos) - 1) / por_segundo * 0.9
+
+
+def test_fallo_de_autenticacion_cierra_la_conexion(conn, smtp):
+    smtp.autenticacion = True
+    with pytest.raises(SMTPAuthenticationError):
+        enviar(conn, smtp, ['cliente@ejemplo.com'], usuario='ventas', hilos=1)
+
+    for _ in range(50):
+        if smtp.abiertas == 0:
+            break
+        time.sleep(0.02)
+    assert smtp.abiertas == 0
+    assert smtp.recibidos == []
@@ -0,0 +1,89 @@
+import csv
+import json
+import threading
+
+import pytest
+
+from busqueda import construir_filtro
+from exportacion import COLUMNAS, exportar_clientes
+
+
+CLIENTES = [
+    ("Ábaco S.A.", "abaco@ejemplo.com", "341 555 0101", "Óscar", "Clientes"),
+    ("Bravo", "bravo@ejemplo.com", "341 555 0102", "Inés", "Flotas"),
+    ("Carrera", "carrera@ejemplo.com", "341 555 0103", "Pía", "Flotas"),
+    ("Durán", "duran@ejemplo.com", "341 555 0104", "Luis", "Clientes"),
+    ("Espinosa", "espinosa@ejemplo.com", "341 555 0105", "Eva", "Flotas"),
+]
+
+
+@pytest.fixture
+def clientes(repositorio):
+    repositorio.agregar_categoria("Flotas")
+    for nombre, correo, telefono, contacto, categoria in CLIENTES:
+        repositorio.agregar_cliente(nombre, correo, telefono, contacto, categoria)
+    return repositorio.conn
+
+
+def esperadas(categoria=None):
+    return [[str(i), nombre, contacto, telefono, correo, cat]
+            for i, (nombre, correo, telefono, contacto, cat) in enumerate(CLIENTES, 1)
+            if categoria in (None, cat)]
+
+
+def test_csv(clientes, tmp_path):
+    ruta = str(tmp_path / 'clientes.csv')
+    resumen = exportar_clientes(clientes, construir_filtro('', 'flotas'), ruta, tamano_lote=2)
+
+    assert (resumen.exportadas, resumen.ruta, resumen.cancelado) == (3, ruta, False)
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        encabezado, *filas = csv.reader(archivo)
+    assert encabezado == list(COLUMNAS)
+    assert sorted(filas) == esperadas("Flotas")
+    assert not (tmp_path / 'clientes.csv.parcial').exists()
+
+
+def test_jsonl(clientes, tmp_path):
+    ruta = str(tmp_path / 'clientes.jsonl')
+    exportar_clientes(clientes, construir_filtro('', ''), ruta, tamano_lote=2)
+
+    with open(ruta, encoding='utf-8') as archivo:
+        filas = [json.loads(linea) for linea in archivo]
+    assert sorted([str(fila['id'])] + [fila[c] for c in COLUMNAS[1:]] for fila in filas) == esperadas()
+
+
+def test_parquet(clientes, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    ruta = str(tmp_path / 'clientes.parquet')
+    exportar_clientes(clientes, construir_filtro('', ''), ruta, tamano_lote=2)
+
+    tabla = pq.read_table(ruta)
+    assert tabla.column_names == list(COLUMNAS)
+    assert sorted([str(fila['id'])] + [fila[c] for c in COLUMNAS[1:]]
+                  for fila in tabla.to_pylist()) == esperadas()
+
+
+def test_cancelar_conserva_el_archivo_anterior(clientes, tmp_path):
+    ruta = tmp_path / 'clientes.csv'
+    ruta.write_text("exportación anterior\n", encoding='utf-8')
+    cancelacion = threading.Event()
+
+    resumen = exportar_clientes(clientes, construir_filtro('', ''), str(ruta), tamano_lote=2,
+                                progreso=lambda n, f: cancelacion.set(), cancelacion=cancelacion)
+
+    assert (resumen.exportadas, resumen.cancelado) == (2, True)
+    assert ruta.read_text(encoding='utf-8') == "exportación anterior\n"
+    assert not (tmp_path / 'clientes.csv.parcial').exists()
+
+
+def test_error_conserva_el_archivo_anterior(clientes, tmp_path):
+    ruta = tmp_path / 'clientes.jsonl'
+    ruta.write_text("{}\n", encoding='utf-8')
+
+    def fallar(exportadas, fraccion):
+        raise OSError("Disco lleno")
+
+    with pytest.raises(OSError):
+        exportar_clientes(clientes, construir_filtro('', ''), str(ruta), progreso=fallar)
+    assert ruta.read_text(encoding='utf-8') == "{}\n"
+    assert not (tmp_path / 'clientes.jsonl.parcial').exists()
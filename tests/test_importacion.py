@@ -0,0 +1,78 @@
+import csv
+
+import importacion
+from importacion import importar_clientes
+
+
+def escribir_csv(ruta, filas):
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        csv.writer(archivo).writerows(filas)
+
+
+def leer_csv(ruta):
+    with open(ruta, newline='', encoding='utf-8') as archivo:
+        return list(csv.reader(archivo))
+
+
+def test_filas_rechazadas_van_al_archivo_de_rechazos(repositorio, tmp_path):
+    repositorio.agregar_cliente("Existente", "existe@ejemplo.com", "1", "Ana", "Clientes")
+    ruta = str(tmp_path / 'clientes.csv')
+    escribir_csv(ruta, [
+        ["Nombre", "Correo", "Teléfono", "Contacto", "Categoría"],
+        ["Ábaco S.A.", "abaco@ejemplo.com", "2", "Óscar", "Óptica"],
+        ["Repetido", "abaco@ejemplo.com", "3", "Eva", ""],
+        ["Sin teléfono", "sin@ejemplo.com", "", "Luis", ""],
+        ["Otro", "existe@ejemplo.com", "4", "Juan", ""],
+        ["Bravo", "bravo@ejemplo.com", "5", "Inés", ""],
+    ])
+
+    resumen = importar_clientes(repositorio.conn, ruta, tamano_bloque=2)
+
+    assert (resumen.insertados, resumen.rechazados, resumen.cancelado) == (2, 3, False)
+    assert resumen.ruta_rechazos == str(tmp_path / 'clientes.rechazos.csv')
+    assert leer_csv(resumen.ruta_rechazos) == [
+        ["nombre", "correo", "telefono", "contacto", "categoria", "motivo"],
+        ["Repetido", "abaco@ejemplo.com", "3", "Eva", "", "Correo repetido en el archivo"],
+        ["Sin teléfono", "sin@ejemplo.com", "", "Luis", "", "Faltan campos obligatorios"],
+        ["Otro", "existe@ejemplo.com", "4", "Juan", "", "El correo ya existe en la base de datos"],
+    ]
+    assert repositorio.conn.execute("""
+        SELECT c.nombre, cat.nombre, c.nombre_orden, c.contacto_orden
+        FROM clientes c JOIN categorias cat ON cat.id = c.categoria_id
+        WHERE c.correo = 'abaco@ejemplo.com'
+    """).fetchone() == ("Ábaco S.A.", "Óptica", "abaco s.a.", "oscar")
+
+
+def test_sin_rechazos_no_crea_archivo(repositorio, tmp_path):
+    ruta = str(tmp_path / 'clientes.csv')
+    escribir_csv(ruta, [
+        ["nombre", "correo", "telefono", "contacto", "categoria"],
+        ["Bravo", "bravo@ejemplo.com", "5", "Inés", ""],
+    ])
+
+    resumen = importar_clientes(repositorio.conn, ruta)
+
+    assert (resumen.insertados, resumen.rechazados, resumen.ruta_rechazos) == (1, 0, None)
+    assert not (tmp_path / 'clientes.rechazos.csv').exists()
+
+
+def test_correo_insertado_durante_la_importacion(repositorio, tmp_path, monkeypatch):
+    # Otra conexión inserta el correo después de la comprobación previa
+    ruta = str(tmp_path / 'clientes.csv')
+    escribir_csv(ruta, [
+        ["nombre", "correo", "telefono", "contacto", "categoria"],
+        ["Antes", "antes@ejemplo.com", "5", "Ana", ""],
+        ["Carrera", "carrera@ejemplo.com", "6", "Pía", ""],
+        ["Después", "despues@ejemplo.com", "7", "Luis", ""],
+    ])
+    comprobar = importacion.correos_existentes
+    monkeypatch.setattr(importacion, 'correos_existentes', lambda cursor, correos, hasta_id=None: (
+        set() if hasta_id is None else comprobar(cursor, correos, hasta_id)))
+    repositorio.agregar_cliente("Carrera", "carrera@ejemplo.com", "6", "Pía", "Clientes")
+
+    resumen = importar_clientes(repositorio.conn, ruta, ruta_rechazos=str(tmp_path / 'r.csv'))
+
+    assert (resumen.insertados, resumen.rechazados) == (2, 1)
+    assert leer_csv(tmp_path / 'r.csv')[1:] == [
+        ["Carrera", "carrera@ejemplo.com", "6", "Pía", "", "El correo ya existe en la base de datos"]]
+    assert repositorio.conn.execute("SELECT COUNT(*) FROM clientes").fetchone() == (3,)
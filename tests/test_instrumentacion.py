@@ -0,0 +1,21 @@
+import sqlite3
+
+from instrumentacion import Instrumentacion
+
+
+def test_planes_limitados_a_los_mas_recientes():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (a INTEGER PRIMARY KEY, b TEXT)")
+    instrumentacion = Instrumentacion(maximo_planes=3)
+
+    for i in range(5):
+        instrumentacion.plan(conn, f"SELECT b FROM t WHERE a = {i}", ())
+    # Usar el más antiguo que queda lo pasa al final
+    instrumentacion.plan(conn, "SELECT b FROM t WHERE a = 2", ())
+    instrumentacion.plan(conn, "SELECT b FROM t WHERE a = 5", ())
+
+    assert list(instrumentacion._planes) == [
+        "SELECT b FROM t WHERE a = 4", "SELECT b FROM t WHERE a = 2", "SELECT b FROM t WHERE a = 5"]
+    assert instrumentacion.plan(conn, "SELECT b FROM t WHERE a = 5", ()) == [
+        'SEARCH t USING INTEGER PRIMARY KEY (rowid=?)']
+    conn.close()
@@ -0,0 +1,68 @@
+import pytest
+
+from lotes_correos import (DistribucionCorreos, enlace_mailto, escribir_lotes, lotes_correos,
+                           origen_categoria, origen_seleccion)
+
+
+@pytest.fixture
+def clientes(repositorio):
+    repositorio.agregar_categoria("Óptica")
+    ids = [repositorio.agregar_cliente(f"Cliente {i}", f"c{i:02d}@ejemplo.com", str(i), "Ana",
+                                       "Óptica" if i < 7 else "Clientes")
+           for i in range(10)]
+    return ids
+
+
+@pytest.mark.parametrize("tamano, tamanos", [(3, [3, 3, 1]), (7, [7]), (10, [7])])
+def test_lotes_de_una_categoria(repositorio, clientes, tamano, tamanos):
+    lotes = list(lotes_correos(repositorio.conn, origen_categoria("Óptica"), tamano))
+
+    assert [len(lote) for lote in lotes] == tamanos
+    assert [correo for lote in lotes for correo in lote] == [f"c{i:02d}@ejemplo.com"
+                                                            for i in range(7)]
+
+
+def test_lotes_de_una_seleccion_por_id(repositorio, clientes):
+    seleccion_id = repositorio.crear_seleccion("Feria")
+    repositorio.anadir_a_seleccion(seleccion_id, clientes[::3])
+
+    lotes = list(lotes_correos(repositorio.conn, origen_seleccion(seleccion_id), 2))
+
+    assert lotes == [["c00@ejemplo.com", "c03@ejemplo.com"], ["c06@ejemplo.com", "c09@ejemplo.com"]]
+
+
+def test_distribucion_lee_cada_lote_al_pedirlo(repositorio, clientes):
+    distribucion = DistribucionCorreos(repositorio.conn, origen_categoria("Óptica"), 3)
+    assert (distribucion.total, distribucion.lotes_totales) == (7, 3)
+
+    assert distribucion.siguiente() == ["c00@ejemplo.com", "c01@ejemplo.com", "c02@ejemplo.com"]
+    # Un alta entre lote y lote se recoge si cae detrás del cursor
+    repositorio.agregar_cliente("Nuevo", "c99@ejemplo.com", "99", "Eva", "Óptica")
+    assert len(distribucion.siguiente()) == 3
+    assert distribucion.siguiente() == ["c06@ejemplo.com", "c99@ejemplo.com"]
+    assert distribucion.terminado and distribucion.siguiente() == []
+    assert (distribucion.lote, distribucion.entregados) == (3, 8)
+
+    distribucion.reiniciar()
+    assert distribucion.siguiente()[0] == "c00@ejemplo.com"
+
+
+def test_enlace_mailto_en_cco():
+    enlace = enlace_mailto(["ana+ofertas@ejemplo.com", "luis@ejemplo.com"], "Ofertas & más")
+
+    assert enlace == ("mailto:?bcc=ana%2Bofertas@ejemplo.com,luis@ejemplo.com"
+                      "&subject=Ofertas%20%26%20m%C3%A1s")
+
+
+def test_escribir_lotes(repositorio, clientes, tmp_path):
+    archivos = escribir_lotes(repositorio.conn, origen_categoria("Óptica"), str(tmp_path), 4,
+                              asunto="Novedades")
+
+    assert archivos == [str(tmp_path / 'lote_001.txt'), str(tmp_path / 'lote_002.txt')]
+    assert (tmp_path / 'lote_002.txt').read_text(encoding='utf-8').splitlines() == [
+        "c04@ejemplo.com", "c05@ejemplo.com", "c06@ejemplo.com"]
+    pagina = (tmp_path / 'lote_mailto.html').read_text(encoding='utf-8')
+    assert "<h1>Categoría Óptica</h1>" in pagina
+    assert pagina.count("<li>") == 2
+    assert 'href="mailto:?bcc=c00@ejemplo.com,c01@ejemplo.com,c02@ejemplo.com,c03@ejemplo.com' \
+           '&amp;subject=Novedades"' in pagina
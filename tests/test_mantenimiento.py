@@ -0,0 +1,111 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+from conexion import abrir_conexion
+from mantenimiento import (TAREAS_DESATENDIDAS, comprobar_integridad, ejecutar_programadas,
+                           ejecutar_tarea, purgar_respaldos, respaldar, ruta_respaldo,
+                           tareas_vencidas, ultimas_ejecuciones)
+
+
+def poblar(conn, cantidad, desde=0):
+    with conn:
+        conn.executemany(
+            "INSERT INTO clientes (nombre, correo, telefono, contacto, categoria_id) "
+            "VALUES (?, ?, ?, '', 1)",
+            [(f"Cliente {i}", f"c{i}@ejemplo.com", str(i)) for i in range(desde, desde + cantidad)])
+
+
+def contar(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_respaldo_mientras_otra_conexion_escribe(conn, ruta_bd, tmp_path):
+    poblar(conn, 3000)
+    destino = str(tmp_path / 'copia.db')
+    escribiendo, detener = threading.Event(), threading.Event()
+    escritas = []
+
+    def escribir():
+        otra = abrir_conexion(ruta_bd, check_same_thread=False)
+        try:
+            while not detener.is_set():
+                poblar(otra, 10, 100000 + 10 * len(escritas))
+                escritas.append(10)
+                escribiendo.set()
+        finally:
+            otra.close()
+
+    hilo = threading.Thread(target=escribir)
+    hilo.start()
+    escribiendo.wait(5)
+    try:
+        resumen = respaldar(ruta_bd, destino, paginas=4, pausa=0.001)
+    finally:
+        detener.set()
+        hilo.join()
+
+    assert not resumen.cancelado and resumen.ruta == destino
+    assert escritas
+    assert not (tmp_path / 'copia.db.parcial').exists()
+    # La copia es un archivo independiente, sin -wal
+    copia = sqlite3.connect(destino)
+    assert copia.execute("PRAGMA journal_mode").fetchone() == ('delete',)
+    # y una instantánea coherente de algún momento de la escritura
+    assert comprobar_integridad(copia) == []
+    copiados = copia.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+    copia.close()
+    assert 3000 <= copiados <= contar(ruta_bd)
+    assert (copiados - 3000) % 10 == 0
+
+
+def test_respaldo_cancelado_no_deja_archivos(conn, ruta_bd, tmp_path):
+    poblar(conn, 2000)
+    destino = tmp_path / 'copia.db'
+    cancelacion = threading.Event()
+
+    resumen = respaldar(ruta_bd, str(destino), paginas=1, pausa=0,
+                        progreso=lambda copiadas, fraccion: cancelacion.set(),
+                        cancelacion=cancelacion)
+
+    assert resumen.cancelado and resumen.ruta is None
+    assert list(tmp_path.glob('copia.db*')) == []
+
+
+def test_purgar_respaldos_conserva_los_mas_recientes(ruta_bd):
+    rutas = [ruta_respaldo(ruta_bd, datetime.datetime(2024, 1, dia)) for dia in range(1, 5)]
+    for ruta in rutas:
+        respaldar(ruta_bd, ruta)
+
+    assert purgar_respaldos(ruta_bd, conservar=2) == rutas[:2]
+    assert [ruta for ruta in rutas if os.path.exists(ruta)] == rutas[2:]
+
+
+def test_integridad_detecta_referencias_rotas(conn):
+    poblar(conn, 2)
+    assert comprobar_integridad(conn) == []
+
+    conn.execute("PRAGMA foreign_keys = OFF")
+    with conn:
+        conn.execute("UPDATE clientes SET categoria_id = 99 WHERE id = 1")
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    assert comprobar_integridad(conn) == ["clientes fila 1: referencia inexistente en categorias"]
+    assert ejecutar_tarea(conn, None, 'integridad') == "1 problemas"
+
+
+def test_tareas_programadas(conn, ruta_bd):
+    assert set(tareas_vencidas(conn)) == {'respaldo', 'optimizar', 'analizar'}
+
+    realizadas = ejecutar_programadas(ruta_bd, tareas=TAREAS_DESATENDIDAS)
+
+    assert sorted(realizadas) == [('analizar', 'ok'), ('optimizar', 'ok')]
+    assert set(ultimas_ejecuciones(conn)) == {'analizar', 'optimizar'}
+    assert tareas_vencidas(conn) == ['respaldo']
+    dentro_de_un_mes = datetime.datetime.now() + datetime.timedelta(days=31)
+    assert set(tareas_vencidas(conn, dentro_de_un_mes)) == {'respaldo', 'optimizar', 'analizar'}
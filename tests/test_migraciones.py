@@ -0,0 +1,154 @@
+import sqlite3
+
+import pytest
+
+import migraciones
+from busqueda import fts_disponible
+from conexion import abrir_conexion
+from migraciones import MIGRACIONES, migrar, preparar_base_datos, version_actual
+from normalizacion import texto_cliente
+
+
+def columnas(conn, tabla):
+    return {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+
+
+def indices(conn):
+    return {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def base_antigua(ruta):
+    """Base anterior a las migraciones: clientes sin contacto ni categoria_id"""
+    antigua = sqlite3.connect(ruta)
+    antigua.execute("""
+        CREATE TABLE clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            correo TEXT NOT NULL UNIQUE,
+            telefono TEXT NOT NULL
+        )
+    """)
+    antigua.executemany("INSERT INTO clientes (nombre, correo, telefono) VALUES (?, ?, ?)",
+                        [("Álvarez Hnos.", "alvarez@ejemplo.com", "341 555 0101"),
+                         ("Zapata S.A.", "zapata@ejemplo.com", "341 555 0102")])
+    antigua.commit()
+    antigua.close()
+
+
+def test_base_nueva_llega_a_la_ultima_version(tmp_path):
+    conn = abrir_conexion(str(tmp_path / 'nueva.db'))
+    aplicadas = preparar_base_datos(conn)
+
+    assert aplicadas == [numero for numero, _, _ in MIGRACIONES]
+    assert version_actual(conn) == MIGRACIONES[-1][0]
+    assert {'categorias', 'clientes', 'envios', 'cola_correos', 'selecciones'} <= {
+        fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'idx_clientes_categoria_correo' in indices(conn)
+    assert conn.execute("SELECT nombre FROM categorias WHERE id = 1").fetchone() == ('Clientes',)
+    # Volver a migrar no aplica nada
+    assert migrar(conn) == []
+    conn.close()
+
+
+def test_base_antigua_conserva_los_datos(tmp_path):
+    ruta = str(tmp_path / 'antigua.db')
+    base_antigua(ruta)
+
+    conn = abrir_conexion(ruta)
+    preparar_base_datos(conn)
+
+    assert version_actual(conn) == MIGRACIONES[-1][0]
+    assert {'contacto', 'categoria_id'} <= columnas(conn, 'clientes')
+    assert conn.execute(
+        "SELECT nombre, correo, telefono, contacto, categoria_id FROM clientes ORDER BY id"
+    ).fetchall() == [
+        ("Álvarez Hnos.", "alvarez@ejemplo.com", "341 555 0101", "", 1),
+        ("Zapata S.A.", "zapata@ejemplo.com", "341 555 0102", "", 1),
+    ]
+    conn.close()
+
+
+def test_migracion_parcial_continua_desde_su_version(tmp_path):
+    conn = abrir_conexion(str(tmp_path / 'parcial.db'))
+    cursor = conn.cursor()
+    for numero, _, funcion in MIGRACIONES[:4]:
+        funcion(cursor)
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+
+    assert migrar(conn) == [numero for numero, _, _ in MIGRACIONES[4:]]
+    assert version_actual(conn) == MIGRACIONES[-1][0]
+    conn.close()
+
+
+def test_migracion_fallida_no_cambia_la_version(tmp_path, monkeypatch):
+    conn = abrir_conexion(str(tmp_path / 'fallida.db'))
+    cursor = conn.cursor()
+    for numero, _, funcion in MIGRACIONES[:1]:
+        funcion(cursor)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+
+    def fallar(cursor):
+        cursor.execute("CREATE TABLE a_medias (id INTEGER)")
+        raise sqlite3.OperationalError("fallo simulado")
+
+    monkeypatch.setattr(migraciones, 'MIGRACIONES', [MIGRACIONES[0], (2, "Fallida", fallar)])
+    with pytest.raises(sqlite3.OperationalError):
+        migrar(conn)
+    assert version_actual(conn) == 1
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'a_medias'").fetchone() is None
+    conn.close()
+
+
+def test_indice_nocase_de_nombre_eliminado(tmp_path):
+    conn = abrir_conexion(str(tmp_path / 'indices.db'))
+    cursor = conn.cursor()
+    for numero, _, funcion in MIGRACIONES[:2]:
+        funcion(cursor)
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    assert 'idx_clientes_nombre_nocase' in indices(conn)
+
+    migrar(conn)
+    assert 'idx_clientes_nombre_nocase' not in indices(conn)
+    conn.close()
+
+
+def test_texto_normalizado_de_los_clientes_existentes(tmp_path):
+    ruta = str(tmp_path / 'antigua.db')
+    base_antigua(ruta)
+
+    conn = abrir_conexion(ruta)
+    preparar_base_datos(conn)
+
+    assert conn.execute("SELECT texto_normalizado FROM clientes ORDER BY id").fetchall() == [
+        (texto_cliente("Álvarez Hnos.", "", "alvarez@ejemplo.com", "341 555 0101"),),
+        (texto_cliente("Zapata S.A.", "", "zapata@ejemplo.com", "341 555 0102"),),
+    ]
+    assert conn.execute("SELECT nombre_normalizado FROM categorias WHERE id = 1").fetchone() == (
+        'clientes',)
+    # Los clientes existentes quedan en el índice de texto
+    if fts_disponible(conn):
+        assert conn.execute("SELECT rowid FROM clientes_fts WHERE clientes_fts MATCH '\"alvarez\"'"
+                            ).fetchall() == [(1,)]
+    conn.close()
+
+
+def test_claves_de_orden_de_los_clientes_existentes(tmp_path):
+    conn = abrir_conexion(str(tmp_path / 'orden.db'))
+    cursor = conn.cursor()
+    for numero, _, funcion in MIGRACIONES[:8]:
+        funcion(cursor)
+    conn.execute("PRAGMA user_version = 8")
+    conn.execute("INSERT INTO clientes (nombre, correo, telefono, contacto) "
+                 "VALUES ('Íñigo Ruiz', 'inigo@ejemplo.com', '1', 'Óscar')")
+    conn.commit()
+
+    migrar(conn)
+
+    assert conn.execute("SELECT nombre_orden, contacto_orden FROM clientes").fetchone() == (
+        "inigo ruiz", "oscar")
+    assert {'idx_clientes_nombre_orden', 'idx_clientes_contacto_orden', 'idx_clientes_telefono',
+            'idx_clientes_categoria_nombre', 'idx_categorias_nombre_normalizado'} <= indices(conn)
+    conn.close()
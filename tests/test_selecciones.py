@@ -0,0 +1,44 @@
+from busqueda import consultar_pagina
+from cache_busquedas import CacheBusquedas
+from repositorio import ClientRepository
+
+
+def poblar(repositorio, cantidad):
+    return [repositorio.agregar_cliente(f"Cliente {i:02d}", f"c{i}@ejemplo.com", str(i), "Ana",
+                                        "Clientes")
+            for i in range(cantidad)]
+
+
+def test_la_pagina_trae_la_marca_de_la_seleccion(repositorio):
+    ids = poblar(repositorio, 6)
+    seleccion_id = repositorio.crear_seleccion("Feria")
+    repositorio.anadir_a_seleccion(seleccion_id, ids[1::2])
+    filtro = repositorio.filtro()
+
+    for orden in ((), (('nombre', True),)):
+        filas = consultar_pagina(repositorio.conn, filtro, 10, orden=orden,
+                                 seleccion_id=seleccion_id)
+        assert {fila[0]: fila[6] for fila in filas} == {i: int(i in ids[1::2]) for i in ids}
+        siguientes = consultar_pagina(repositorio.conn, filtro, 2, despues_de_id=filas[1][0],
+                                      orden=orden, seleccion_id=seleccion_id)
+        assert siguientes == filas[2:4]
+
+    assert all(len(fila) == 6 for fila in consultar_pagina(repositorio.conn, filtro, 10))
+
+
+def test_busqueda_marca_segun_la_seleccion_pedida(ruta_bd):
+    repositorio = ClientRepository.abrir(ruta_bd, preparar=False, cache=CacheBusquedas())
+    ids = poblar(repositorio, 3)
+    feria = repositorio.crear_seleccion("Feria")
+    repositorio.anadir_a_seleccion(feria, ids[:1])
+
+    resultado = repositorio.buscar("Cliente", seleccion_id=feria)
+    assert [fila[6] for fila in resultado.filas] == [1, 0, 0]
+
+    otra = repositorio.crear_seleccion("Otra")
+    assert [fila[6] for fila in repositorio.buscar("Cliente", seleccion_id=otra).filas] == [0, 0, 0]
+    # Añadir a la selección invalida también lo guardado en la caché
+    repositorio.anadir_a_seleccion(otra, ids[2:])
+    assert [fila[6] for fila in repositorio.buscar("Cliente", seleccion_id=otra).filas] == [0, 0, 1]
+    assert [fila[6] for fila in repositorio.buscar("Cliente", seleccion_id=feria).filas] == [1, 0, 0]
+    repositorio.cerrar()
@@ -0,0 +1,180 @@
+import csv
+import http.client
+import io
+import json
+import socket
+import struct
+import threading
+import time
+from urllib.parse import quote
+
+import pytest
+
+from servidor import EscritorSerializado, ServidorClientes
+
+
+@pytest.fixture
+def servidor(ruta_bd):
+    servidor = ServidorClientes(('127.0.0.1', 0), ruta_bd, lectores=2, registrar_peticiones=False)
+    hilo = threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def peticion(servidor, metodo, ruta, cuerpo=None, crudo=None):
+    conexion = http.client.HTTPConnection('127.0.0.1', servidor.server_address[1], timeout=10)
+    try:
+        datos = crudo if crudo is not None else (
+            json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None)
+        conexion.request(metodo, ruta, body=datos,
+                         headers={'Content-Type': 'application/json'} if datos else {})
+        respuesta = conexion.getresponse()
+        contenido = respuesta.read()
+        if respuesta.getheader('Content-Type', '').startswith('application/json'):
+            contenido = json.loads(contenido)
+        return respuesta.status, contenido
+    finally:
+        conexion.close()
+
+
+def cliente(i, categoria="Clientes"):
+    return {'nombre': f"Cliente {i}", 'correo': f"c{i}@ejemplo.com", 'telefono': str(i),
+            'contacto': "Ana", 'categoria': categoria}
+
+
+def test_alta_consulta_modificacion_y_baja(servidor):
+    estado, creado = peticion(servidor, 'POST', '/clientes', cliente(1))
+    assert estado == 201
+    ruta = f"/clientes/{creado['id']}"
+
+    assert peticion(servidor, 'GET', ruta) == (200, {
+        'id': creado['id'], 'nombre': "Cliente 1", 'contacto': "Ana", 'telefono': "1",
+        'correo': "c1@ejemplo.com", 'categoria': "Clientes"})
+    estado, modificado = peticion(servidor, 'PUT', ruta, {**cliente(1), 'nombre': "Ábaco"})
+    assert (estado, modificado['nombre']) == (200, "Ábaco")
+    assert peticion(servidor, 'DELETE', ruta) == (200, {'eliminado': creado['id']})
+    assert peticion(servidor, 'GET', ruta)[0] == 404
+
+
+@pytest.mark.parametrize("metodo, ruta, cuerpo, crudo, estado", [
+    ('GET', '/clientes/999', None, None, 404),
+    ('PUT', '/clientes/999', cliente(9), None, 404),
+    ('DELETE', '/clientes/999', None, None, 404),
+    ('DELETE', '/categorias/' + quote("No existe"), None, None, 404),
+    ('GET', '/desconocida', None, None, 404),
+    ('POST', '/clientes', {'nombre': "Sin correo"}, None, 400),
+    ('POST', '/clientes', None, b'{no es json', 400),
+    ('POST', '/clientes', None, b'[1, 2]', 400),
+    ('POST', '/clientes', cliente(9, "No existe"), None, 400),
+    ('POST', '/categorias', {'nombre': " "}, None, 400),
+    ('GET', '/clientes?limite=diez', None, None, 400),
+    ('GET', '/exportar?formato=xml', None, None, 400),
+])
+def test_codigos_de_error(servidor, metodo, ruta, cuerpo, crudo, estado):
+    respuesta_estado, respuesta = peticion(servidor, metodo, ruta, cuerpo, crudo)
+    assert respuesta_estado == estado
+    assert 'error' in respuesta
+
+
+def test_conflictos_dan_409(servidor):
+    assert peticion(servidor, 'POST', '/clientes', cliente(1))[0] == 201
+    assert peticion(servidor, 'POST', '/clientes', cliente(1))[0] == 409
+    assert peticion(servidor, 'POST', '/categorias', {'nombre': "Óptica"})[0] == 201
+    assert peticion(servidor, 'POST', '/categorias', {'nombre': "Óptica"})[0] == 409
+
+
+def test_eliminar_categoria_mueve_sus_clientes(servidor):
+    peticion(servidor, 'POST', '/categorias', {'nombre': "Óptica"})
+    peticion(servidor, 'POST', '/clientes', cliente(1, "Óptica"))
+
+    estado, respuesta = peticion(servidor, 'DELETE', '/categorias/' + quote("Óptica"))
+
+    assert (estado, respuesta) == (200, {'eliminada': "Óptica", 'clientes_movidos': 1})
+
+
+def test_paginacion_por_clave(servidor):
+    for i in range(5):
+        peticion(servidor, 'POST', '/clientes', cliente(i))
+
+    estado, primera = peticion(servidor, 'GET', '/clientes?limite=3&total=1&orden=-nombre')
+    assert (estado, primera['total']) == (200, 5)
+    assert [c['nombre'] for c in primera['clientes']] == ["Cliente 4", "Cliente 3", "Cliente 2"]
+    _, segunda = peticion(servidor, 'GET',
+                          f"/clientes?limite=3&orden=-nombre&despues_de={primera['siguiente']}")
+    assert [c['nombre'] for c in segunda['clientes']] == ["Cliente 1", "Cliente 0"]
+    assert segunda['siguiente'] is None
+
+
+def test_altas_simultaneas_pasan_por_el_escritor(servidor):
+    estados = []
+
+    def alta(i):
+        estados.append(peticion(servidor, 'POST', '/clientes', cliente(i))[0])
+
+    hilos = [threading.Thread(target=alta, args=(i,)) for i in range(30)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert estados == [201] * 30
+    assert peticion(servidor, 'GET', '/estadisticas')[1]['clientes'] == 30
+
+
+def test_escritor_serializado_usa_un_solo_hilo(ruta_bd):
+    escritor = EscritorSerializado(ruta_bd)
+    try:
+        nombres = set()
+        hilos = [threading.Thread(target=lambda: nombres.add(escritor.ejecutar(
+            lambda repositorio: threading.current_thread().name))) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert nombres == {'escritor'}
+
+        with pytest.raises(ValueError):
+            escritor.ejecutar(lambda repositorio: repositorio.id_categoria("No existe"))
+    finally:
+        escritor.detener()
+
+
+def test_exportar_csv_y_jsonl(servidor):
+    for i in range(3):
+        peticion(servidor, 'POST', '/clientes', cliente(i))
+
+    estado, contenido = peticion(servidor, 'GET', '/exportar?formato=csv&nombre=cliente')
+    filas = list(csv.reader(io.StringIO(contenido.decode('utf-8'))))
+    assert estado == 200
+    assert filas[0] == ['id', 'nombre', 'contacto', 'telefono', 'correo', 'categoria']
+    assert sorted(fila[1] for fila in filas[1:]) == ["Cliente 0", "Cliente 1", "Cliente 2"]
+
+    estado, contenido = peticion(servidor, 'GET', '/exportar?formato=jsonl')
+    lineas = [json.loads(linea) for linea in contenido.decode('utf-8').splitlines()]
+    assert estado == 200
+    assert sorted(linea['correo'] for linea in lineas) == [f"c{i}@ejemplo.com" for i in range(3)]
+
+
+def test_exportacion_cortada_por_el_cliente(servidor, conn):
+    with conn:
+        conn.executemany(
+            "INSERT INTO clientes (nombre, correo, telefono, contacto, categoria_id) "
+            "VALUES (?, ?, ?, '', 1)",
+            [(f"Cliente {i}", f"c{i}@ejemplo.com", str(i)) for i in range(20000)])
+
+    conexion = socket.create_connection(('127.0.0.1', servidor.server_address[1]))
+    conexion.sendall(b"GET /exportar HTTP/1.1\r\nHost: prueba\r\n\r\n")
+    assert conexion.recv(1024).startswith(b"HTTP/1.0 200")
+    # Cierre abrupto (RST) a mitad del cuerpo
+    conexion.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    conexion.close()
+
+    # El lector vuelve al pool y el servidor sigue atendiendo
+    for _ in range(100):
+        if servidor.pool._libres.qsize() == 2:
+            break
+        time.sleep(0.02)
+    assert servidor.pool._libres.qsize() == 2
+    assert peticion(servidor, 'GET', '/estadisticas')[0] == 200